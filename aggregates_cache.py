@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from typing import Dict, Any, Awaitable, Callable, Hashable, Optional, Tuple
+import copy
+import threading
+import time
+
+
+# Версии данных по лигам (таблица data_version, см. README): running_script.py увеличивает
+# версию своей лиги; строки с tournament_id = 0 относятся ко всем лигам
+DATA_VERSION_QUERY = """
+SELECT tournament_id, season_id, max(version)
+FROM data_version
+GROUP BY tournament_id, season_id
+"""
+
+
+async def fetch_data_versions(ch_client) -> Dict[Tuple[int, int], int]:
+    """(tournament_id, season_id) -> последняя версия данных"""
+    result = await ch_client.execute(DATA_VERSION_QUERY, query_name='data_version')
+    return {(int(tournament_id), int(season_id)): int(version) for tournament_id, season_id, version in result}
+
+
+def league_version(versions: Dict[Tuple[int, int], int], tournament_id: Optional[int] = None,
+                   season_id: Optional[int] = None) -> int:
+    """Версия данных лиги: последняя из загрузок лиги и общих для всех лиг.
+
+    Без tournament_id / season_id учитываются загрузки всех турниров / сезонов
+    (season_id Sofascore уникален, поэтому его одного достаточно для лиги).
+    """
+    return max((
+        version for (version_tournament, version_season), version in versions.items()
+        if version_tournament == 0 or (
+            (tournament_id is None or version_tournament == tournament_id)
+            and (season_id is None or version_season == season_id)
+        )
+    ), default=0)
+
+
+class AggregatesCache:
+    """Кэш командных агрегатов в памяти процесса.
+
+    Ключ включает версию данных лиги, которую running_script.py увеличивает
+    после каждой загрузки тура этой лиги: между загрузками запросы попадают в
+    кэш, после новой загрузки записи лиги старой версии перестают находиться
+    и вытесняются (записи других лиг остаются). Размер ограничен max_size
+    (вытеснение LRU), TTL ограничивает срок жизни записи, если версия по
+    какой-то причине не обновилась. Версии данных запрашиваются не чаще
+    version_check_interval - в том числе после ошибки запроса: пока
+    ClickHouse недоступен, используются последние полученные версии, а
+    каждое обращение к кэшу не добавляет к основному запросу еще один
+    неудачный запрос версии.
+    """
+
+    # Признак промаха в get(): None может быть закэшированным значением
+    MISSING = object()
+
+    def __init__(self, max_size: int = 2048, ttl_seconds: float = 6 * 3600,
+                 version_check_interval: float = 2.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.version_check_interval = version_check_interval
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at), последний - самый свежий
+        self._versions = None  # (tournament_id, season_id) -> версия
+        self._version_checked_at = None  # время последней проверки версий (успешной или нет)
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evicted_lru': 0,
+            'expired': 0,
+            'version_changes': 0,
+            'version_errors': 0
+        }
+
+    async def data_version(self, ch_client, tournament_id: Optional[int] = None,
+                           season_id: Optional[int] = None) -> Optional[int]:
+        """Текущая версия данных лиги; None - версия недоступна, кэш не используется"""
+        now = time.monotonic()
+        if self._version_checked_at is None or now - self._version_checked_at >= self.version_check_interval:
+            try:
+                versions = await fetch_data_versions(ch_client)
+            except Exception as e:
+                print(f"❌ Ошибка получения версии данных: {e}")
+                # Следующая проверка - через интервал; до нее действуют последние известные версии
+                with self._lock:
+                    self._version_checked_at = now
+                    self._stats['version_errors'] += 1
+            else:
+                with self._lock:
+                    if self._versions is not None:
+                        self._stats['version_changes'] += sum(
+                            1 for league, version in versions.items() if self._versions.get(league) != version
+                        )
+                    self._versions = versions
+                    self._version_checked_at = now
+        if self._versions is None:
+            return None
+        return league_version(self._versions, tournament_id, season_id)
+
+    def get(self, key: Hashable) -> Any:
+        """Значение из кэша или AggregatesCache.MISSING"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return self.MISSING
+            value, expires_at = entry
+            if expires_at < now:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return self.MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+        # Копия защищает закэшированное значение от изменений вызывающим кодом
+        return copy.deepcopy(value)
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(value), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evicted_lru'] += 1
+
+    async def get_or_load(self, ch_client, name: str, key: tuple, loader: Callable[[], Awaitable[Any]],
+                          tournament_id: Optional[int] = None, season_id: Optional[int] = None) -> Any:
+        """Возвращает значение по ключу (name, *key, версия данных лиги), загружая его при промахе.
+
+        Исключения loader не кэшируются и передаются вызывающему коду.
+        """
+        version = await self.data_version(ch_client, tournament_id, season_id)
+        if version is None:
+            return await loader()
+
+        cache_key = (name, *key, version)
+        value = self.get(cache_key)
+        if value is not self.MISSING:
+            return value
+
+        value = await loader()
+        self.set(cache_key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Размер кэша, версия данных и счетчики попаданий/вытеснений"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'leagues': len(self._versions or {}),
+                'hit_rate': round(self._stats['hits'] / lookups * 100, 1) if lookups else 0.0,
+                **self._stats
+            }
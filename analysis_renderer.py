@@ -0,0 +1,373 @@
+from typing import Dict, Any, List, Optional, Callable
+from match_analysis import MatchAnalysis, SECTION_ORDER
+
+
+def _render_positions(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    lines = [
+        "🏆 ПОЗИЦИЯ В ТАБЛИЦЕ:",
+        f"   {a.team1_name}: {d['team1_position']} место {d['team1_trend']}",
+        f"   {a.team2_name}: {d['team2_position']} место {d['team2_trend']}"
+    ]
+    if d['has_positions']:
+        lines.append(f"   Разница в классе: {d['position_diff']} позиций ({d['class_analysis']})")
+    return lines
+
+
+def _render_goals(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        f"⚽ РЕЗУЛЬТАТИВНОСТЬ (на основе {d['matches']} матчей):",
+        f"   {a.team1_name}: {d['team1_goals_pm']:.1f} голов за матч",
+        f"   {a.team2_name}: {d['team2_goals_pm']:.1f} голов за матч"
+    ]
+
+
+def _render_shots(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🎯 УДАРЫ:",
+        f"   {a.team1_name}: {d['team1_shots_pm']:.1f} ударов ({d['team1_shots_on_target_pm']:.1f} в створ) за матч",
+        f"   {a.team2_name}: {d['team2_shots_pm']:.1f} ударов ({d['team2_shots_on_target_pm']:.1f} в створ) за матч"
+    ]
+
+
+def _render_xg(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "📈 РЕАЛЬНЫЙ xG АНАЛИЗ:",
+        f"   {a.team1_name}: {d['team1_xg']:.2f} xG",
+        f"   {a.team2_name}: {d['team2_xg']:.2f} xG"
+    ]
+
+
+def _render_efficiency(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🎯 ЭФФЕКТИВНОСТЬ РЕАЛИЗАЦИИ:",
+        f"   {a.team1_name}: {d['team1_goals_pm']:.1f} голов при {d['team1_xg']:.1f} xG ({d['team1_efficiency']:+.2f})",
+        f"   {a.team2_name}: {d['team2_goals_pm']:.1f} голов при {d['team2_xg']:.1f} xG ({d['team2_efficiency']:+.2f})"
+    ]
+
+
+def _render_possession(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "📊 КОНТРОЛЬ ИГРЫ:",
+        f"   {a.team1_name}: {d['team1_possession']:.1f}% владения",
+        f"   {a.team2_name}: {d['team2_possession']:.1f}% владения"
+    ]
+
+
+def _render_passing(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🔄 ТОЧНОСТЬ ПЕРЕДАЧ:",
+        f"   {a.team1_name}: {d['team1_pass_accuracy']:.1f}%",
+        f"   {a.team2_name}: {d['team2_pass_accuracy']:.1f}%"
+    ]
+
+
+def _render_crosses(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🔄 АКТИВНОСТЬ ФЛАНГОВ:",
+        f"   {a.team1_name}: {d['team1_total']:.1f} кроссов ({d['team1_accuracy']:.1f}% точность)",
+        f"   {a.team2_name}: {d['team2_total']:.1f} кроссов ({d['team2_accuracy']:.1f}% точность)"
+    ]
+
+
+def _render_long_balls(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🎯 ДАЛЬНИЕ АТАКИ:",
+        f"   {a.team1_name}: {d['team1_total']:.1f} длинных передач ({d['team1_accuracy']:.1f}% точность)",
+        f"   {a.team2_name}: {d['team2_total']:.1f} длинных передач ({d['team2_accuracy']:.1f}% точность)"
+    ]
+
+
+def _render_defense(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🛡️ ОБОРОНА:",
+        f"   {a.team1_name}: {d['team1_goals_conceded_pm']:.1f} пропущенных за матч",
+        f"   {a.team2_name}: {d['team2_goals_conceded_pm']:.1f} пропущенных за матч"
+    ]
+
+
+def _corners_lines(title: str, stats: Dict[str, Any]) -> List[str]:
+    return [
+        f"   {title}:",
+        f"      • Атака: {stats['avg_corners_for']} угловых за матч",
+        f"      • Оборона: {stats['avg_corners_against']} пропускает",
+        f"      • Баланс: {stats['corners_balance']:+.1f}"
+    ]
+
+
+def _render_corners(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return (
+        ["🎯 СТАТИСТИКА УГЛОВЫХ:"]
+        + _corners_lines(f"{a.team1_name} (общие)", d['team1_total'])
+        + _corners_lines(f"{a.team2_name} (общие)", d['team2_total'])
+        + _corners_lines(f"{a.team1_name} (дома)", d['team1_home'])
+        + _corners_lines(f"{a.team2_name} (в гостях)", d['team2_away'])
+    )
+
+
+def _render_expected_activity(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    total_corners = d['total_corners']
+    intensity = '🔴 Высокая' if total_corners > 10 else '🟡 Средняя' if total_corners > 7 else '🟢 Низкая'
+    return [
+        "📊 ОЖИДАЕМАЯ АКТИВНОСТЬ:",
+        f"   • Всего угловых за матч: {total_corners:.1f}",
+        f"   • Интенсивность атаки: {intensity}"
+    ]
+
+
+def _render_fouls(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🟨 АГРЕССИВНОСТЬ:",
+        f"   {a.team1_name}: {d['team1_fouls_pm']:.1f} фолов за матч",
+        f"   {a.team2_name}: {d['team2_fouls_pm']:.1f} фолов за матч"
+    ]
+
+
+def _render_yellow_cards(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🟨 ЖЕЛТЫЕ КАРТОЧКИ:",
+        f"   {a.team1_name}: {d['team1_avg_yellows']} в среднем за матч",
+        f"   {a.team2_name}: {d['team2_avg_yellows']} в среднем за матч"
+    ]
+
+
+def _render_opponent_cards(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🟨 КАРТОЧКИ У СОПЕРНИКОВ:",
+        f"   Против {a.team1_name}: {d['team1_avg_opponent_yellows']} в среднем за матч",
+        f"   Против {a.team2_name}: {d['team2_avg_opponent_yellows']} в среднем за матч"
+    ]
+
+
+def _render_aggression(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "📊 АНАЛИЗ АГРЕССИВНОСТИ:",
+        f"   Всего карточек в матчах {a.team1_name}: {d['team1_total_yellows']:.1f} за матч",
+        f"   Всего карточек в матчах {a.team2_name}: {d['team2_total_yellows']:.1f} за матч"
+    ]
+
+
+def _render_chances_quality(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return [
+        "🎪 КАЧЕСТВО МОМЕНТОВ:",
+        f"   {a.team1_name}: {d['team1_big_chances_pm']:.1f} больших шансов ({d['team1_big_chances_missed_pm']:.1f} пропущено)",
+        f"   {a.team2_name}: {d['team2_big_chances_pm']:.1f} больших шансов ({d['team2_big_chances_missed_pm']:.1f} пропущено)"
+    ]
+
+
+def _render_attack_zones(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    lines = ["🎯 АНАЛИЗ ЗОН АТАК И УЯЗВИМОСТЕЙ:"]
+    for team_name, zones in ((a.team1_name, d['team1']), (a.team2_name, d['team2'])):
+        lines += [
+            "",
+            f"🏹 {team_name} АТАКУЕТ:",
+            f"   • {zones['inside']:.0f}% голов изнутри штрафной",
+            f"   • {zones['outside']:.0f}% голов издали",
+            f"   • {zones['headed']:.0f}% голов головой"
+        ]
+    return lines
+
+
+def _form_lines(team_name: str, results: List[str], matches_count: int) -> List[str]:
+    if not results:
+        return [f"   {team_name}: нет данных"]
+    form_icons = ''.join(['🟢' if r == 'W' else '🟡' if r == 'D' else '🔴' for r in results])
+    lines = [f"   {team_name}: {form_icons}"]
+    if matches_count > 0:
+        lines.append(f"   Последние результаты: {', '.join(results)}")
+    return lines
+
+
+def _render_form(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    matches_count = d['matches_count']
+    if matches_count == 0:
+        lines = ["📈 ФОРМА (первый тур - матчей нет)"]
+    else:
+        form_text = "матч" if matches_count == 1 else f"последние {matches_count} матча" if matches_count < 5 else "последние 5 матчей"
+        lines = [f"📈 ФОРМА (за {form_text}):"]
+    return (
+        lines
+        + _form_lines(a.team1_name, d['team1_results'], matches_count)
+        + _form_lines(a.team2_name, d['team2_results'], matches_count)
+    )
+
+
+def _render_h2h(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    lines = [f"📊 ИСТОРИЯ ЛИЧНЫХ ВСТРЕЧ ({a.team1_name} vs {a.team2_name}):"]
+    if not d:
+        return lines
+
+    total_matches = d['total_matches']
+    lines += ["", f"🤝 ВСЕГО МАТЧЕЙ: {total_matches}"]
+    if total_matches > 0:
+        lines += [
+            f"   • {a.team1_name}: {d['team1_wins']} побед ({d['team1_win_rate']:.1f}%)",
+            f"   • {a.team2_name}: {d['team2_wins']} побед ({d['team2_win_rate']:.1f}%)",
+            f"   • Ничьих: {d['draws']} ({d['draws'] / total_matches * 100:.1f}%)"
+        ]
+    else:
+        lines += [
+            f"   • {a.team1_name}: {d['team1_wins']} побед (0%)",
+            f"   • {a.team2_name}: {d['team2_wins']} побед (0%)",
+            f"   • Ничьих: {d['draws']} (0%)",
+            "   🤝 Команды ранее не встречались"
+        ]
+
+    lines += [
+        "",
+        "⚽ ОБЩАЯ РЕЗУЛЬТАТИВНОСТЬ:",
+        f"   • {a.team1_name}: {d['team1_goals']} голов",
+        f"   • {a.team2_name}: {d['team2_goals']} голов",
+        f"   • Разница: +{d['team1_goals'] - d['team2_goals']}",
+        "",
+        "📈 СРЕДНИЕ ПОКАЗАТЕЛИ ЗА МАТЧ:",
+        f"   • {a.team1_name}: {d['team1_avg_goals']:.1f} голов",
+        f"   • {a.team2_name}: {d['team2_avg_goals']:.1f} голов",
+        f"   • Всего голов за матч: {d['team1_avg_goals'] + d['team2_avg_goals']:.1f}"
+    ]
+    return lines
+
+
+def _render_position_forecast(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    lines = [
+        "🏆 ПРОГНОЗ С УЧЕТОМ ПОЗИЦИИ В ТАБЛИЦЕ:",
+        f"   • Ожидаемые голы: {d['total_goals']:.1f}"
+    ]
+    if d['position_diff'] > 0:
+        lines.append(f"   • Разница в классе: {d['position_diff']} позиций")
+    return lines
+
+
+def _render_recommendations(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    lines = [
+        "💰 РЕКОМЕНДАЦИИ:",
+        f"   • Тоталы голов: {d['total_prediction']}",
+        f"   • Уверенность: {d['confidence']}"
+    ]
+    if d['position_diff'] > 0:
+        lines.append(f"   • Фактор позиции: {d['class_analysis']}")
+    return lines
+
+
+def _render_insights(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return ["📈 КЛЮЧЕВЫЕ ИНСАЙТЫ:"] + [
+        f"   {i}. {insight}" for i, insight in enumerate(d['insights'], 1)
+    ]
+
+
+def _render_exclusive(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    return ["🎲 ЭКСКЛЮЗИВНЫЕ ПРОГНОЗЫ:", "=" * 40]
+
+
+def _render_cards_forecast(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    lines = ["🟨 АНАЛИЗ ДИСЦИПЛИНЫ С УЧЕТОМ РЕФЕРИ:"]
+    prediction = d['prediction']
+    if not d['referee_available']:
+        lines.append("   ℹ️ Информация о рефери недоступна")
+    elif not prediction:
+        lines.append("   ℹ️ Данные для прогноза карточек недоступны")
+    else:
+        lines.append(f"   👨‍⚖️ Рефери: {prediction['referee_name']}")
+        if prediction['referee_games'] > 0:
+            lines.append(f"   📊 Среднее у рефери: {prediction['referee_avg_yellows']} желтых за матч")
+        lines += [
+            f"   🎯 Прогноз желтых карточек: {prediction['predicted_yellow_cards']}",
+            f"   💰 Рекомендация: {prediction['cards_total_prediction']}",
+            f"   🎯 Уверенность: {prediction['confidence']}"
+        ]
+    return lines
+
+
+def _render_home_away_forecast(a: MatchAnalysis, d: Dict[str, Any]) -> List[str]:
+    lines = ["🏠🛬 ПРОГНОЗ РЕЗУЛЬТАТА С УЧЕТОМ ДОМАШНЕГО СТАДИОНА:"]
+    if not d:
+        return lines
+
+    home_stats = d['home_stats']
+    away_stats = d['away_stats']
+    probs = d['probabilities']
+    lines += [
+        f"   🏠 {a.team1_name} дома:",
+        f"      • Побед: {home_stats['win_rate']:.1f}%",
+        f"      • Забивает: {home_stats['avg_goals_scored']:.1f} голов",
+        f"      • Пропускает: {home_stats['avg_goals_conceded']:.1f} голов",
+        f"   🛬 {a.team2_name} в гостях:",
+        f"      • Побед: {away_stats['win_rate']:.1f}%",
+        f"      • Забивает: {away_stats['avg_goals_scored']:.1f} голов",
+        f"      • Пропускает: {away_stats['avg_goals_conceded']:.1f} голов",
+        f"   🎯 Прогноз счета: {d['predicted_score']}",
+        "   📊 Вероятности исходов:",
+        f"      • П1 ({a.team1_name}): {probs['home_win']}%",
+        f"      • Ничья: {probs['draw']}%",
+        f"      • П2 ({a.team2_name}): {probs['away_win']}%"
+    ]
+    if d.get('totals'):
+        totals = d['totals'][2.5]
+        lines += [
+            f"   🎯 Наиболее вероятный счет: {d['most_likely_score']}",
+            f"   📈 Тотал 2.5: ТБ {totals['over']}% / ТМ {totals['under']}%"
+        ]
+    return lines
+
+
+SECTION_RENDERERS: Dict[str, Callable[[MatchAnalysis, Dict[str, Any]], List[str]]] = {
+    'positions': _render_positions,
+    'goals': _render_goals,
+    'shots': _render_shots,
+    'xg': _render_xg,
+    'efficiency': _render_efficiency,
+    'possession': _render_possession,
+    'passing': _render_passing,
+    'crosses': _render_crosses,
+    'long_balls': _render_long_balls,
+    'defense': _render_defense,
+    'corners': _render_corners,
+    'expected_activity': _render_expected_activity,
+    'fouls': _render_fouls,
+    'yellow_cards': _render_yellow_cards,
+    'opponent_cards': _render_opponent_cards,
+    'aggression': _render_aggression,
+    'chances_quality': _render_chances_quality,
+    'attack_zones': _render_attack_zones,
+    'form': _render_form,
+    'h2h': _render_h2h,
+    'position_forecast': _render_position_forecast,
+    'recommendations': _render_recommendations,
+    'insights': _render_insights,
+    'exclusive': _render_exclusive,
+    'cards_forecast': _render_cards_forecast,
+    'home_away_forecast': _render_home_away_forecast,
+}
+
+
+def render_header(analysis: MatchAnalysis) -> str:
+    """Заголовок полного отчета"""
+    return (
+        f"🎯 РАСШИРЕННЫЙ АНАЛИЗ МАТЧА: {analysis.team1_name} vs {analysis.team2_name}\n"
+        f"{'=' * 60}\n\n"
+        f"🏠 {analysis.team1_name} (дома) vs 🛬 {analysis.team2_name} (в гостях)\n"
+        f"{'=' * 50}"
+    )
+
+
+def render_section_blocks(analysis: MatchAnalysis, sections: Optional[List[str]] = None) -> Dict[str, str]:
+    """Текст каждого раздела анализа отдельно (ключ раздела -> текст), в порядке отчета"""
+    return {
+        key: "\n".join(SECTION_RENDERERS[key](analysis, analysis.sections[key]))
+        for key in analysis.available_sections(sections)
+    }
+
+
+def join_section_blocks(blocks: Dict[str, str], sections: Optional[List[str]] = None,
+                        header: Optional[str] = None) -> str:
+    """Собирает отчет из готовых текстов разделов (например, из кэша отчетов)"""
+    parts = [header] if header else []
+    parts.extend(blocks[key] for key in SECTION_ORDER
+                 if key in blocks and (sections is None or key in sections))
+    return "\n\n".join(parts)
+
+
+def render_match_analysis(analysis: MatchAnalysis, sections: Optional[List[str]] = None,
+                          include_header: bool = False) -> str:
+    """Форматирует выбранные разделы анализа (по умолчанию - все) в текст"""
+    header = render_header(analysis) if include_header else None
+    return join_section_blocks(render_section_blocks(analysis, sections), header=header)
@@ -0,0 +1,257 @@
+from football_match_forecast import AdvancedFootballAnalyzer
+from players_analyzer import PlayersAnalyzer
+from analysis_renderer import render_match_analysis
+from clickhouse_async import AsyncClickHouse, ClickHousePool
+from storage_backends import DuckDBPool, ENGINES
+from aggregates_cache import AggregatesCache
+from standings_snapshot import StandingsStore
+from report_cache import ReportCache
+from single_flight import SingleFlight
+from goal_model import GoalModel
+from query_profiler import percentile
+from synthetic_dataset import SyntheticLeague, seed_clickhouse
+from types import SimpleNamespace
+from typing import Dict, Any, Awaitable, Callable, List
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def latency_stats(latencies: List[float], wall_seconds: float) -> Dict[str, Any]:
+    """Перцентили задержки (мс) и пропускная способность (операций в секунду)"""
+    values = sorted(latency * 1000 for latency in latencies)
+    return {
+        'runs': len(values),
+        'p50_ms': round(percentile(values, 50), 1),
+        'p95_ms': round(percentile(values, 95), 1),
+        'p99_ms': round(percentile(values, 99), 1),
+        'mean_ms': round(sum(values) / len(values), 1) if values else 0.0,
+        'throughput_per_s': round(len(values) / wall_seconds, 2) if wall_seconds else 0.0
+    }
+
+
+async def measure(operation: Callable[[int], Awaitable[Any]], iterations: int, concurrency: int = 1) -> Dict[str, Any]:
+    """Выполняет operation(i) iterations раз не более чем concurrency одновременно"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await operation(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(i) for i in range(iterations)))
+    return latency_stats(latencies, time.perf_counter() - started)
+
+
+class ReportBenchmark:
+    """Сценарии бенчмарка поверх стенда с синтетической лигой.
+
+    Каждый сценарий - те же вызовы, что выполняют бот и prerender_reports:
+    анализ матча с холодным и прогретым кэшем агрегатов, дашборд игроков,
+    анализ всего тура и одновременные запросы пользователей через
+    build_analysis_output бота.
+    """
+
+    def __init__(self, ch_client: AsyncClickHouse, league: SyntheticLeague, iterations: int = 20,
+                 concurrency: int = 8):
+        self.ch_client = ch_client
+        self.league = league
+        self.iterations = iterations
+        self.concurrency = concurrency
+        self.fixtures = league.fixtures(league.next_round)
+
+    def _fixture(self, i: int):
+        home_id, away_id = self.fixtures[i % len(self.fixtures)]
+        return home_id, away_id, self.league.team_names[home_id], self.league.team_names[away_id]
+
+    async def _analysis(self, i: int, cache: AggregatesCache = None, standings: StandingsStore = None):
+        home_id, away_id, home_name, away_name = self._fixture(i)
+        async with AdvancedFootballAnalyzer(self.ch_client, cache, standings) as analyzer:
+            analysis = await analyzer.get_match_analysis(
+                home_id, away_id, home_name, away_name,
+                self.league.tournament_id, self.league.current_season_id
+            )
+        if analysis.errors:
+            raise RuntimeError(f"Ошибки анализа {home_name} - {away_name}: {analysis.errors}")
+        return render_match_analysis(analysis, include_header=True)
+
+    async def single_report_cold(self) -> Dict[str, Any]:
+        return await measure(lambda i: self._analysis(i), self.iterations)
+
+    async def single_report_warm(self) -> Dict[str, Any]:
+        cache = AggregatesCache()
+        standings = StandingsStore(cache)
+        # Прогрев: по одному запросу на каждую пару тура
+        for i in range(len(self.fixtures)):
+            await self._analysis(i, cache, standings)
+        return await measure(lambda i: self._analysis(i, cache, standings), self.iterations)
+
+    async def team_dashboard(self) -> Dict[str, Any]:
+        async def dashboard(i: int):
+            home_id, _, home_name, _ = self._fixture(i)
+            async with PlayersAnalyzer(self.ch_client) as players_analyzer:
+                await players_analyzer.get_team_compact_dashboard(home_id, home_name, self.league.current_season_id)
+        return await measure(dashboard, self.iterations)
+
+    async def full_round(self) -> Dict[str, Any]:
+        async def analyze_round(i: int):
+            async with AdvancedFootballAnalyzer(self.ch_client) as analyzer:
+                analyses = await analyzer.analyze_round(
+                    self.league.tournament_id, self.league.current_season_id, self.league.next_round
+                )
+            if len(analyses) != len(self.fixtures):
+                raise RuntimeError(f"В туре {len(analyses)} матчей вместо {len(self.fixtures)}")
+        return await measure(analyze_round, max(1, self.iterations // 4))
+
+    async def concurrent_users(self) -> Dict[str, Any]:
+        # Обработчик бота без Telegram: тот же bot_data, что создает main()
+        from bot import build_analysis_output
+        cache = AggregatesCache()
+        context = SimpleNamespace(bot_data={
+            'clickhouse': self.ch_client,
+            'aggregates_cache': cache,
+            'standings': StandingsStore(cache),
+            'report_cache': ReportCache(),
+            'analysis_flights': SingleFlight()
+        })
+
+        async def user_request(i: int):
+            home_id, away_id, home_name, away_name = self._fixture(i)
+            output = await build_analysis_output(
+                context, home_name, away_name, home_id, away_id,
+                self.league.tournament_id, self.league.current_season_id, 'all', None
+            )
+            if not output.strip():
+                raise RuntimeError("Пустой отчет")
+        return await measure(user_request, self.iterations * 2, self.concurrency)
+
+    SCENARIOS = ('single_report_cold', 'single_report_warm', 'team_dashboard', 'full_round', 'concurrent_users')
+
+    async def run(self, scenarios=None) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        for name in scenarios or self.SCENARIOS:
+            self.ch_client.profiler.clear()
+            print(f"▶️ {name}...")
+            results[name] = await getattr(self, name)()
+            results[name]['queries'] = self.ch_client.profiler.summary()
+        return results
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                          max_regression: float) -> List[str]:
+    """Сценарии, у которых p95 вырос больше чем на max_regression относительно базового прогона"""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('p95_ms'):
+            continue
+        growth = stats['p95_ms'] / base['p95_ms'] - 1
+        if growth > max_regression:
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {stats['p95_ms']} мс (+{growth:.0%})")
+    return regressions
+
+
+def format_results(results: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'сценарий':<22} {'n':>5} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'оп/с':>8}"]
+    for name, stats in results.items():
+        lines.append(
+            f"{name:<22} {stats['runs']:>5} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+            f"{stats['p99_ms']:>9.1f} {stats['throughput_per_s']:>8.2f}"
+        )
+    return "\n".join(lines)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк отчетов на синтетической лиге')
+    parser.add_argument('--engine', choices=ENGINES, default='clickhouse', help='Хранилище стенда')
+    parser.add_argument('--duckdb-path', default=':memory:', help='Файл базы DuckDB стенда (по умолчанию - в памяти)')
+    parser.add_argument('--host', default=os.getenv('BENCH_CLICKHOUSE_HOST', 'localhost'), help='ClickHouse стенда')
+    parser.add_argument('--port', type=int, default=int(os.getenv('BENCH_CLICKHOUSE_PORT', 9000)))
+    parser.add_argument('--user', default=os.getenv('BENCH_CLICKHOUSE_USER', 'default'))
+    parser.add_argument('--password', default=os.getenv('BENCH_CLICKHOUSE_PASSWORD', ''))
+    parser.add_argument('--database', default='football_bench', help='Отдельная база стенда (пересоздается)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--teams', type=int, default=16)
+    parser.add_argument('--seasons', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8, help='Одновременных пользователей')
+    parser.add_argument('--scenario', action='append', choices=ReportBenchmark.SCENARIOS, help='Только эти сценарии')
+    parser.add_argument('--skip-seed', action='store_true', help='Использовать уже заполненную базу стенда')
+    parser.add_argument('--json', help='Сохранить результаты в файл')
+    parser.add_argument('--baseline', help='Файл результатов прошлого прогона для сравнения')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='Допустимый рост p95 (доля)')
+    args = parser.parse_args()
+
+    league = SyntheticLeague(seasons=args.seasons, teams=args.teams, seed=args.seed)
+    if args.engine == 'duckdb':
+        if args.duckdb_path == os.getenv('DUCKDB_PATH', 'football.duckdb'):
+            print(f"❌ База {args.duckdb_path} - рабочая; для стенда нужен отдельный файл")
+            sys.exit(2)
+        if not args.skip_seed and os.path.exists(args.duckdb_path):
+            os.remove(args.duckdb_path)
+        pool = DuckDBPool(args.duckdb_path, max_size=max(8, args.concurrency))
+    else:
+        if args.database == os.getenv('CLICKHOUSE_DB', 'football_db'):
+            print(f"❌ База {args.database} - рабочая; для стенда нужна отдельная база")
+            sys.exit(2)
+        pool = ClickHousePool(host=args.host, port=args.port, user=args.user, password=args.password,
+                              database=args.database, max_size=max(8, args.concurrency))
+        if not args.skip_seed:
+            with ClickHousePool(host=args.host, port=args.port, user=args.user, password=args.password,
+                                database='default', max_size=1).connection() as client:
+                client.execute(f"DROP DATABASE IF EXISTS {args.database}")
+                client.execute(f"CREATE DATABASE {args.database}")
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        with pool.connection() as client:
+            counts = seed_clickhouse(client, league)
+            # Сезонные агрегаты - как после загрузки туров (по ним строятся статистика матчей и дашборды игроков)
+            from running_script import FootballDataOrchestrator
+            for season_id in league.season_ids:
+                FootballDataOrchestrator(args.host, args.user, args.password, league.tournament_id,
+                                         season_id, ch_client=client).fold_match_aggregates()
+        print(f"✅ Стенд {args.engine} заполнен за {time.perf_counter() - started:.1f} с: {counts}")
+
+    ch_client = AsyncClickHouse(pool)
+    try:
+        if not args.skip_seed:
+            await GoalModel.fit_league(ch_client, league.tournament_id, league.current_season_id)
+        results = await ReportBenchmark(ch_client, league, args.iterations, args.concurrency).run(args.scenario)
+    finally:
+        ch_client.close()
+
+    print("\n" + format_results(results))
+    slowest = max(results.values(), key=lambda stats: stats['p95_ms'])['queries']
+    for name, stats in sorted(slowest.items(), key=lambda item: item[1]['p95_ms'], reverse=True)[:5]:
+        # Прочитанные строки сообщает только сервер ClickHouse; у DuckDB - строки результата
+        rows = (f"{stats['avg_rows_read']} строк прочитано" if args.engine == 'clickhouse'
+                else f"{stats['avg_result_rows']} строк в результате")
+        print(f"   🐢 {name}: p95 {stats['p95_ms']} мс, {rows}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'engine': args.engine, 'seed': args.seed, 'teams': args.teams, 'seasons': args.seasons,
+                       'results': results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f)['results'], args.max_regression)
+        for regression in regressions:
+            print(f"❌ Регрессия {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ Регрессий относительно базового прогона нет")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,14 +2,24 @@ from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
 from football_match_forecast import AdvancedFootballAnalyzer
 from players_analyzer import PlayersAnalyzer
-import io
-import sys
+from analysis_renderer import render_header, render_section_blocks, join_section_blocks
+from match_analysis import SECTION_ORDER
+from storage_backends import create_storage
+from aggregates_cache import AggregatesCache
+from standings_snapshot import StandingsStore
+from report_cache import ReportCache
+from single_flight import SingleFlight
+from session_cache import SessionCache
+from query_profiler import QueryProfiler
+from typing import Dict, Any, List, Optional, Tuple
 import os
-import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Отчеты дольше порога выводятся в лог с разбивкой по запросам
+SLOW_REPORT_MS = float(os.getenv("SLOW_REPORT_SECONDS", 3)) * 1000
+
 # Состояния разговора
 SELECT_LEAGUE, SELECT_HOME_TEAM, SELECT_AWAY_TEAM, SELECT_MAIN_CATEGORY, SELECT_SUB_CATEGORY = range(5)
 
@@ -221,110 +231,84 @@ SUB_CATEGORIES = {
     }
 }
 
-# СТРУКТУРА СЕКЦИЙ БЕЗ ДУБЛИРОВАНИЯ
+# СТРУКТУРА СЕКЦИЙ БЕЗ ДУБЛИРОВАНИЯ (ключи разделов MatchAnalysis, см. match_analysis.SECTION_ORDER)
 SECTION_MAPPING = {
     # === ОБЩИЙ ОБЗОР ===
     "overview_summary": {
-        "sections": ["🏆 ПОЗИЦИЯ В ТАБЛИЦЕ", "⚽ РЕЗУЛЬТАТИВНОСТЬ", "🎯 УДАРЫ", 
-                    "📈 РЕАЛЬНЫЙ xG", "🎯 ЭФФЕКТИВНОСТЬ РЕАЛИЗАЦИИ", "📊 КОНТРОЛЬ ИГРЫ", 
-                    "🔄 ТОЧНОСТЬ ПЕРЕДАЧ", "🛡️ ОБОРОНА", "🎯 СТАТИСТИКА УГЛОВЫХ", "🎪 КАЧЕСТВО МОМЕНТОВ"]
+        "sections": ["positions", "goals", "shots", "xg", "efficiency", "possession",
+                    "passing", "defense", "corners", "chances_quality"]
     },
     "overview_insights": {
-        "sections": ["📈 КЛЮЧЕВЫЕ ИНСАЙТЫ"]
+        "sections": ["insights"]
     },
     "overview_all": {
-        "sections": ["🏆 ПОЗИЦИЯ В ТАБЛИЦЕ", "⚽ РЕЗУЛЬТАТИВНОСТЬ", "🎯 УДАРЫ", 
-                    "📈 РЕАЛЬНЫЙ xG", "🎯 ЭФФЕКТИВНОСТЬ РЕАЛИЗАЦИИ", "📊 КОНТРОЛЬ ИГРЫ", 
-                    "🔄 ТОЧНОСТЬ ПЕРЕДАЧ", "🛡️ ОБОРОНА", "🎪 КАЧЕСТВО МОМЕНТОВ", 
-                    "📈 КЛЮЧЕВЫЕ ИНСАЙТЫ", "🎯 СТАТИСТИКА УГЛОВЫХ", "📊 ОЖИДАЕМАЯ АКТИВНОСТЬ"]
+        "sections": ["positions", "goals", "shots", "xg", "efficiency", "possession",
+                    "passing", "defense", "chances_quality", "insights", "corners", "expected_activity"]
     },
     
     # === АТАКА ===
     "attack_goals": {
-        "sections": ["⚽ РЕЗУЛЬТАТИВНОСТЬ"]
+        "sections": ["goals"]
     },
     "attack_shots_xg": {
-        "sections": ["🎯 УДАРЫ", "📈 РЕАЛЬНЫЙ xG"]
+        "sections": ["shots", "xg"]
     },
     "attack_efficiency": {
-        "sections": ["🎯 ЭФФЕКТИВНОСТЬ РЕАЛИЗАЦИИ"]
+        "sections": ["efficiency"]
     },
     "attack_zones": {
-        "sections": ["🔄 АКТИВНОСТЬ ФЛАНГОВ", "🎯 ДАЛЬНИЕ АТАКИ", 
-                    "🎯 АНАЛИЗ ЗОН АТАК И УЯЗВИМОСТЕЙ", "🏹 АТАКУЕТ"]
+        "sections": ["crosses", "long_balls", "attack_zones"]
     },
     "attack_all": {
-        "sections": ["⚽ РЕЗУЛЬТАТИВНОСТЬ", "🎯 УДАРЫ", "📈 РЕАЛЬНЫЙ xG", 
-                    "🎯 ЭФФЕКТИВНОСТЬ РЕАЛИЗАЦИИ", "🔄 АКТИВНОСТЬ ФЛАНГОВ", 
-                    "🎯 ДАЛЬНИЕ АТАКИ", "🎯 АНАЛИЗ ЗОН АТАК И УЯЗВИМОСТЕЙ", "🏹 АТАКУЕТ"]
+        "sections": ["goals", "shots", "xg", "efficiency", "crosses", "long_balls", "attack_zones"]
     },
     
     # === БАЗОВАЯ СТАТИСТИКА ===
     "stats_possession": {
-        "sections": ["📊 КОНТРОЛЬ ИГРЫ"]
+        "sections": ["possession"]
     },
     "stats_passing": {
-        "sections": ["🔄 ТОЧНОСТЬ ПЕРЕДАЧ"]
+        "sections": ["passing"]
     },
     "stats_quality": {
-        "sections": ["🎪 КАЧЕСТВО МОМЕНТОВ"]
+        "sections": ["chances_quality"]
     },
     "stats_all": {
-        "sections": ["📊 КОНТРОЛЬ ИГРЫ", "🔄 ТОЧНОСТЬ ПЕРЕДАЧ", "🛡️ ОБОРОНА", "🎪 КАЧЕСТВО МОМЕНТОВ"]
+        "sections": ["possession", "passing", "defense", "chances_quality"]
     },
     
     # === ФОРМА И H2H ===
     "form_recent": {
-        "sections": ["📈 ФОРМА"]
+        "sections": ["form"]
     },
     "form_h2h": {
-        "sections": ["📊 ИСТОРИЯ ЛИЧНЫХ ВСТРЕЧ", "🤝 ВСЕГО МАТЧЕЙ", 
-                    "⚽ ОБЩАЯ РЕЗУЛЬТАТИВНОСТЬ", "📈 СРЕДНИЕ ПОКАЗАТЕЛИ ЗА МАТЧ"]
+        "sections": ["h2h"]
     },
     "form_home_away": {
-        "sections": ["🏠🛬 ПРОГНОЗ РЕЗУЛЬТАТА С УЧЕТОМ ДОМАШНЕГО СТАДИОНА"]
+        "sections": ["home_away_forecast"]
     },
     "form_h2h_all": {
-        "sections": ["📈 ФОРМА", "📊 ИСТОРИЯ ЛИЧНЫХ ВСТРЕЧ", "🤝 ВСЕГО МАТЧЕЙ",
-                    "⚽ ОБЩАЯ РЕЗУЛЬТАТИВНОСТЬ", "📈 СРЕДНИЕ ПОКАЗАТЕЛИ ЗА МАТЧ",
-                    "🏠🛬 ПРОГНОЗ РЕЗУЛЬТАТА С УЧЕТОМ ДОМАШНЕГО СТАДИОНА"]
+        "sections": ["form", "h2h", "home_away_forecast"]
     },
     
     # === ПРОГНОЗЫ И СТАВКИ ===
     "predictions_probabilities": {
-        "sections": ["🏆 ПРОГНОЗ С УЧЕТОМ ПОЗИЦИИ В ТАБЛИЦЕ"]
+        "sections": ["position_forecast"]
     },
     "predictions_recommendations": {
-        "sections": ["💰 РЕКОМЕНДАЦИИ"]
+        "sections": ["recommendations"]
     },
     "predictions_cards": {
-        "sections": [
-            "🟨 АГРЕССИВНОСТЬ", "🟨 ЖЕЛТЫЕ КАРТОЧКИ", "🟨 КАРТОЧКИ У СОПЕРНИКОВ", 
-            "📊 АНАЛИЗ АГРЕССИВНОСТИ", "🟨 АНАЛИЗ ДИСЦИПЛИНЫ С УЧЕТОМ РЕФЕРИ",
-            "👨‍⚖️ Рефери:", "🎯 Прогноз желтых карточек:", "💰 Рекомендация:", "🎯 Уверенность:"
-        ]
+        "sections": ["fouls", "yellow_cards", "opponent_cards", "aggression", "cards_forecast"]
     },
     "predictions_exclusive": {
-        "sections": ["🎲 ЭКСКЛЮЗИВНЫЕ ПРОГНОЗЫ", "🟨 АНАЛИЗ ДИСЦИПЛИНЫ С УЧЕТОМ РЕФЕРИ",
-            "👨‍⚖️ Рефери:", "🎯 Прогноз желтых карточек:", "💰 Рекомендация:", "🎯 Уверенность:",
-            "🏠🛬 ПРОГНОЗ РЕЗУЛЬТАТА С УЧЕТОМ ДОМАШНЕГО СТАДИОНА"]
+        "sections": ["exclusive", "cards_forecast", "home_away_forecast"]
     },
     "predictions_all": {
         "sections": [
-            "🏆 ПРОГНОЗ С УЧЕТОМ ПОЗИЦИИ В ТАБЛИЦЕ", "💰 РЕКОМЕНДАЦИИ", 
-            "📈 КЛЮЧЕВЫЕ ИНСАЙТЫ", "🎲 ЭКСКЛЮЗИВНЫЕ ПРОГНОЗЫ",
-            "🟨 АГРЕССИВНОСТЬ", "🟨 ЖЕЛТЫЕ КАРТОЧКИ", "🟨 КАРТОЧКИ У СОПЕРНИКОВ", 
-            "📊 АНАЛИЗ АГРЕССИВНОСТИ", "🟨 АНАЛИЗ ДИСЦИПЛИНЫ С УЧЕТОМ РЕФЕРИ",
-            "👨‍⚖️ Рефери:", "🎯 Прогноз желтых карточек:", "💰 Рекомендация:", "🎯 Уверенность:",
-            "🏠🛬 ПРОГНОЗ РЕЗУЛЬТАТА С УЧЕТОМ ДОМАШНЕГО СТАДИОНА"
-        ]
-    },
-    
-    # === ИГРОКИ ===
-    "players_all": {
-        "sections": [
-            "🏷️", "Общий рейтинг:", "⚽ НАПАДАЮЩИЕ", "🎯 ПОЛУЗАЩИТНИКИ", 
-            "🛡️ ЗАЩИТНИКИ", "🥅 ВРАТАРИ"
+            "position_forecast", "recommendations", "insights", "exclusive",
+            "fouls", "yellow_cards", "opponent_cards", "aggression",
+            "cards_forecast", "home_away_forecast"
         ]
     }
 }
@@ -428,35 +412,26 @@ async def get_players_compact_analysis(update: Update, context: ContextTypes.DEF
         
         await update.message.reply_text("⏳ Анализирую форму игроков...")
         
-        async with PlayersAnalyzer() as analyzer:
-            # Получаем дашборды для обеих команд
-            home_dashboard = await analyzer.get_team_compact_dashboard(
-                team_id=home_team_id,
-                team_name=home_team,
-                season_id=season_id
-            )
-            
-            away_dashboard = await analyzer.get_team_compact_dashboard(
-                team_id=away_team_id, 
-                team_name=away_team,
-                season_id=season_id
-            )
-            
-            # Форматируем вывод
-            home_output = analyzer.format_compact_dashboard(home_dashboard)
-            away_output = analyzer.format_compact_dashboard(away_dashboard)
-            
-            # Собираем полный отчет
-            full_output = (
-                f"🏆 ЛИГА: {league}\n"
-                f"🏟️ АНАЛИЗ ФОРМЫ ИГРОКОВ:\n"
-                f"{home_team} 🆚 {away_team}\n\n"
-                f"{home_output}\n"
-                f"{'='*50}\n"
-                f"{away_output}"
-            )
-            
-            await update.message.reply_text(full_output)
+        home_dashboard, away_dashboard = await load_match_dashboards(
+            context, update.effective_chat.id, home_team, away_team,
+            home_team_id, away_team_id, context.user_data['tournament_id'], season_id
+        )
+        
+        # Форматируем вывод
+        home_output = PlayersAnalyzer.format_compact_dashboard(home_dashboard)
+        away_output = PlayersAnalyzer.format_compact_dashboard(away_dashboard)
+        
+        # Собираем полный отчет
+        full_output = (
+            f"🏆 ЛИГА: {league}\n"
+            f"🏟️ АНАЛИЗ ФОРМЫ ИГРОКОВ:\n"
+            f"{home_team} 🆚 {away_team}\n\n"
+            f"{home_output}\n"
+            f"{'='*50}\n"
+            f"{away_output}"
+        )
+        
+        await update.message.reply_text(full_output)
             
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка анализа игроков: {str(e)}")
@@ -723,78 +698,27 @@ async def get_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE, data_
         
         await update.message.reply_text("⏳ Анализирую данные... Это может занять несколько секунд")
         
-        # Перехватываем вывод
-        old_stdout = sys.stdout
-        new_stdout = io.StringIO()
-        sys.stdout = new_stdout
-        
         try:
-            # Если выбран полный отчет - добавляем анализ игроков
-            if data_type == "all" or data_type == "full_report":
-                # Сначала стандартный анализ
-                async with AdvancedFootballAnalyzer() as analyzer:
-                    await analyzer.get_match_analysis(
-                        team1_id=home_team_id,
-                        team2_id=away_team_id,
-                        team1_name=home_team,
-                        team2_name=away_team,
-                        tournament_id=tournament_id,
-                        season_id=season_id
-                    )
-                
-                # Затем добавляем анализ игроков
-                async with PlayersAnalyzer() as players_analyzer:
-                    home_dashboard = await players_analyzer.get_team_compact_dashboard(
-                        team_id=home_team_id,
-                        team_name=home_team,
-                        season_id=season_id
-                    )
-                    away_dashboard = await players_analyzer.get_team_compact_dashboard(
-                        team_id=away_team_id,
-                        team_name=away_team, 
-                        season_id=season_id
-                    )
-                    
-                    players_output = (
-                        f"\n{'='*60}\n"
-                        f"⭐ ДЕТАЛЬНЫЙ АНАЛИЗ ФОРМЫ ИГРОКОВ:\n"
-                        f"{'='*60}\n"
-                        f"{players_analyzer.format_compact_dashboard(home_dashboard)}\n"
-                        f"{'='*50}\n"
-                        f"{players_analyzer.format_compact_dashboard(away_dashboard)}\n"
-                    )
-                    
-                    # Добавляем к основному выводу
-                    current_output = new_stdout.getvalue()
-                    full_output = current_output + players_output
-                    new_stdout = io.StringIO()
-                    new_stdout.write(full_output)
-            
-            else:
-                # Полный анализ для остальных случаев
-                async with AdvancedFootballAnalyzer() as analyzer:
-                    await analyzer.get_match_analysis(
-                        team1_id=home_team_id,
-                        team2_id=away_team_id,
-                        team1_name=home_team,
-                        team2_name=away_team,
-                        tournament_id=tournament_id,
-                        season_id=season_id
-                    )
+            full_report = data_type == "all" or data_type == "full_report"
+            # Для подкатегории выводятся только ее разделы: считаются только те, которых еще нет в сессии чата
+            sections = None if full_report else SECTION_MAPPING.get(data_type, {}).get("sections", [])
             
-            # Получаем вывод
-            analysis_output = new_stdout.getvalue()
-            sys.stdout = old_stdout
+            # Переход между разделами того же матча - выборка из отчета сессии чата без запросов к базе
+            profiler = context.bot_data['clickhouse'].profiler
+            with profiler.report(f"{home_team} - {away_team} ({data_type})") as query_report:
+                analysis_output = await build_analysis_output(
+                    context, home_team, away_team, home_team_id, away_team_id,
+                    tournament_id, season_id, data_type, sections, chat_id=update.effective_chat.id
+                )
+            if query_report['wall_ms'] >= SLOW_REPORT_MS:
+                print(QueryProfiler.format_report(query_report))
             
             if not analysis_output or len(analysis_output.strip()) < 10:
                 await update.message.reply_text("❌ Не удалось получить данные анализа")
                 return await show_main_menu(update, context)
             
-            # Фильтруем вывод по выбранному типу данных
-            filtered_output = filter_output(analysis_output, data_type)
-            
             # Разбиваем на части если слишком длинное сообщение
-            messages = split_message(filtered_output)
+            messages = split_message(analysis_output)
             
             for i, msg in enumerate(messages):
                 # Для первого сообщения добавляем заголовок
@@ -810,7 +734,6 @@ async def get_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE, data_
             return await show_main_menu(update, context)
             
         except Exception as e:
-            sys.stdout = old_stdout
             await update.message.reply_text(f"❌ Ошибка при анализе данных: {str(e)}")
             return await show_main_menu(update, context)
             
@@ -818,74 +741,143 @@ async def get_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE, data_
         await update.message.reply_text(f"❌ Критическая ошибка: {str(e)}")
         return await show_main_menu(update, context)
 
-def filter_output(output: str, data_type: str) -> str:
-    """Умная фильтрация вывода по блокам/секциям"""
-    if data_type == "all":
-        return output
-    
-    # Используем новую структуру SECTION_MAPPING
-    rule = SECTION_MAPPING.get(data_type, {})
-    if not rule:
-        return get_brief_overview(output, data_type)
-    
-    target_sections = rule.get("sections", [])
-    
-    lines = output.split('\n')
-    filtered_lines = []
-    current_section = ""
-    in_target_section = False
+async def build_analysis_output(context: ContextTypes.DEFAULT_TYPE, home_team: str, away_team: str,
+                                home_team_id: int, away_team_id: int, tournament_id: int, season_id: int,
+                                data_type: str, sections, chat_id: Optional[int] = None) -> str:
+    """Форматирует выбранные разделы анализа матча (sections=None - полный отчет с игроками)"""
+    report = await load_match_report(
+        context, chat_id, home_team, away_team, home_team_id, away_team_id, tournament_id, season_id, sections
+    )
     
-    for line in lines:
-        # Определяем начало новой секции
-        is_section_header = False
-        
-        # Проверяем эмодзи и ключевые слова
-        section_markers = [
-            "🏆", "⚽", "🎯", "📈", "📊", "🔄", "🛡️", "🟨", "🎪", 
-            "🏹", "🤝", "💰", "🎲", "⭐", "🔑", "👨‍⚖️", "🏠🛬", "🏷️"
-        ]
-        
-        section_keywords = [
-            "ПОЗИЦИЯ В ТАБЛИЦЕ", "РЕЗУЛЬТАТИВНОСТЬ", "УДАРЫ", "xG", 
-            "ЭФФЕКТИВНОСТЬ", "КОНТРОЛЬ", "ТОЧНОСТЬ", "ОБОРОНА",
-            "АГРЕССИВНОСТЬ", "ДИСЦИПЛИНА", "КАЧЕСТВО", "ФОРМА", 
-            "ИСТОРИЯ", "ВСЕГО МАТЧЕЙ", "ОБЩАЯ", "СРЕДНИЕ", 
-            "ПРОГНОЗ", "РЕКОМЕНДАЦИИ", "ИНСАЙТЫ", "ЭКСКЛЮЗИВНЫЕ", 
-            "КЛЮЧЕВЫЕ", "АТАКУЕТ", "ФЛАНГОВ", "ДАЛЬНИЕ", "ЗОН АТАК", 
-            "УЯЗВИМОСТЕЙ", "РЕФЕРИ", "КАРТОЧКИ", "УВЕРЕННОСТЬ",
-            "Общий рейтинг:", "НАПАДАЮЩИЕ", "ПОЛУЗАЩИТНИКИ", "ЗАЩИТНИКИ", "ВРАТАРИ"
-        ]
-        
-        # Проверяем наличие маркеров секций
-        has_emoji = any(marker in line for marker in section_markers)
-        has_keyword = any(keyword in line for keyword in section_keywords)
-        
-        # Считаем строку заголовком секции если содержит эмодзи И ключевое слово
-        # ИЛИ если это явно выделенная секция (много заглавных букв)
-        if (has_emoji and has_keyword) or (line.isupper() and len(line) > 5):
-            is_section_header = True
-            current_section = line.strip()
-            
-            # Проверяем, является ли текущая секция целевой
-            in_target_section = any(
-                target_section in current_section for target_section in target_sections
+    # Если выбран полный отчет - все разделы и анализ игроков
+    if sections is None:
+        players_report = report.get('players_report')
+        if not players_report:
+            home_dashboard, away_dashboard = await load_match_dashboards(
+                context, chat_id, home_team, away_team, home_team_id, away_team_id, tournament_id, season_id
             )
-        
-        # Добавляем строку только если мы в целевой секции
-        # ИЛИ если это непустая строка и мы все еще в целевой секции
-        if in_target_section and line.strip():
-            filtered_lines.append(line)
+            players_report = PlayersAnalyzer.format_match_dashboards(home_dashboard, away_dashboard)
+        return join_section_blocks(report['sections'], header=report['header']) + "\n" + players_report
     
-    result = '\n'.join(filtered_lines)
+    analysis_output = join_section_blocks(report['sections'], sections)
+    if not analysis_output.strip():
+        analysis_output = get_brief_overview(data_type)
+    return analysis_output
+
+async def coalesce(context: ContextTypes.DEFAULT_TYPE, key: tuple, loader):
+    """Одинаковые расчеты, запрошенные одновременно (пары дерби в день матча), выполняются один раз"""
+    flights = context.bot_data.get('analysis_flights')
+    if flights is None:
+        return await loader()
+    return await flights.run(key, loader)
+
+async def match_session(context: ContextTypes.DEFAULT_TYPE, chat_id: Optional[int], tournament_id: int,
+                        season_id: int, home_team_id: int, away_team_id: int):
+    """Ключ матча с текущей версией данных лиги и кэш сессий (None - сессия не используется)"""
+    data_version = await context.bot_data['aggregates_cache'].data_version(
+        context.bot_data['clickhouse'], tournament_id, season_id
+    )
+    fixture = (tournament_id, season_id, home_team_id, away_team_id, data_version)
+    sessions = context.bot_data.get('session_cache')
+    if chat_id is None or data_version is None:
+        sessions = None
+    return fixture, sessions
+
+async def load_match_report(context: ContextTypes.DEFAULT_TYPE, chat_id: Optional[int], home_team: str,
+                            away_team: str, home_team_id: int, away_team_id: int, tournament_id: int,
+                            season_id: int, sections: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Заголовок и тексты разделов анализа матча для текущей версии данных (sections=None - все).
+
+    По порядку: отчет сессии чата, готовый отчет prerender_reports.py (при
+    первом открытии матча), расчет недостающих разделов. Тексты сохраняются
+    в сессии по разделам: следующий переход досчитывает только разделы,
+    которых в сессии еще нет, и дополняет ими запись.
+    """
+    wanted = [key for key in SECTION_ORDER if sections is None or key in sections]
+    fixture, sessions = await match_session(context, chat_id, tournament_id, season_id, home_team_id, away_team_id)
+    report = (sessions.get(chat_id, fixture) if sessions else None) or {}
+    computed = report.get('computed_sections', frozenset())
+    missing = [key for key in wanted if key not in computed]
+    if not missing:
+        return report
+    
+    ch_client = context.bot_data['clickhouse']
+    if not computed:
+        prerendered = await context.bot_data['report_cache'].get(
+            ch_client, tournament_id, season_id, home_team_id, away_team_id, fixture[-1]
+        )
+        if prerendered is not None:
+            # Готовый отчет содержит все разделы
+            report = {**prerendered, 'computed_sections': frozenset(SECTION_ORDER)}
+            if sessions:
+                sessions.update(chat_id, fixture, report)
+            return report
+    
+    # Ключ расчета - матч и набор разделов (без порядка): разные наборы не подменяют друг друга.
+    # Идущий для другого чата расчет полного отчета содержит все разделы - к нему запрос присоединяется
+    full_key = ('report', *fixture, frozenset(SECTION_ORDER))
+    flights = context.bot_data.get('analysis_flights')
+    key = full_key if flights is not None and flights.in_flight(full_key) else ('report', *fixture, frozenset(missing))
+    to_compute = [section for section in SECTION_ORDER if section in key[-1]]
+    
+    async def compute():
+        async with AdvancedFootballAnalyzer(
+            ch_client,
+            context.bot_data['aggregates_cache'],
+            context.bot_data['standings']
+        ) as analyzer:
+            analysis = await analyzer.get_match_analysis(
+                team1_id=home_team_id,
+                team2_id=away_team_id,
+                team1_name=home_team,
+                team2_name=away_team,
+                tournament_id=tournament_id,
+                season_id=season_id,
+                sections=to_compute
+            )
+        # Разделы без данных тоже отмечаются посчитанными - повторный переход не запускает расчет
+        return {
+            'header': render_header(analysis),
+            'sections': render_section_blocks(analysis),
+            'computed_sections': frozenset(to_compute)
+        }
     
-    # Если ничего не найдено, возвращаем краткий обзор
-    if not result.strip():
-        return get_brief_overview(output, data_type)
+    computed_report = await coalesce(context, key, compute)
+    if sessions:
+        sessions.update(chat_id, fixture, computed_report)
+    return {
+        **report,
+        **computed_report,
+        'sections': {**report.get('sections', {}), **computed_report['sections']},
+        'computed_sections': computed | computed_report['computed_sections']
+    }
+
+async def load_match_dashboards(context: ContextTypes.DEFAULT_TYPE, chat_id: Optional[int], home_team: str,
+                                away_team: str, home_team_id: int, away_team_id: int, tournament_id: int,
+                                season_id: int) -> Tuple[Dict, Dict]:
+    """Дашборды формы игроков обеих команд: из сессии чата или одним запросом составов"""
+    fixture, sessions = await match_session(context, chat_id, tournament_id, season_id, home_team_id, away_team_id)
+    report = sessions.get(chat_id, fixture) if sessions else None
+    if report and 'dashboards' in report:
+        return report['dashboards']
+    
+    async def compute():
+        async with PlayersAnalyzer(context.bot_data['clickhouse']) as players_analyzer:
+            return await players_analyzer.get_match_players_dashboard(
+                home_id=home_team_id,
+                away_id=away_team_id,
+                season_id=season_id,
+                home_name=home_team,
+                away_name=away_team
+            )
     
-    return result
+    dashboards = await coalesce(context, ('players', *fixture), compute)
+    if sessions:
+        sessions.update(chat_id, fixture, {'dashboards': dashboards})
+    return dashboards
 
-def get_brief_overview(output: str, data_type: str) -> str:
-    """Возвращает краткий обзор если фильтр пустой"""
+def get_brief_overview(data_type: str) -> str:
+    """Возвращает краткий обзор если для раздела нет данных"""
     brief_messages = {
         # Общий обзор
         "overview_summary": "📊 Сводная таблица временно недоступна",
@@ -957,19 +949,44 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return ConversationHandler.END
 
-def main():
-    """Запуск бота"""
-    # Получаем токен из переменных окружения
-    TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-    
-    if not TOKEN:
-        print("❌ Токен бота не найден. Убедитесь, что переменная TELEGRAM_BOT_TOKEN установлена в .env файле")
-        return
-    
-    application = Application.builder().token(TOKEN).build()
-    
-    # Создаем обработчик диалога
-    conv_handler = ConversationHandler(
+async def close_clickhouse(application: Application):
+    """Закрывает общий пул соединений ClickHouse при остановке бота"""
+    aggregates_cache = application.bot_data.get('aggregates_cache')
+    if aggregates_cache:
+        print(f"📊 Кэш агрегатов: {aggregates_cache.metrics()}")
+    standings = application.bot_data.get('standings')
+    if standings:
+        print(f"📊 Снимки турнирных таблиц: {standings.metrics()}")
+    report_cache = application.bot_data.get('report_cache')
+    if report_cache:
+        print(f"📊 Кэш готовых отчетов: {report_cache.metrics()}")
+    session_cache = application.bot_data.get('session_cache')
+    if session_cache:
+        print(f"📊 Сессии анализа в чатах: {session_cache.metrics()}")
+    analysis_flights = application.bot_data.get('analysis_flights')
+    if analysis_flights:
+        print(f"📊 Объединение одинаковых анализов: {analysis_flights.metrics()}")
+    
+    clickhouse = application.bot_data.get('clickhouse')
+    if clickhouse:
+        print(f"📊 Пул ClickHouse: {clickhouse.metrics()}")
+        print(f"📊 Запросы ClickHouse:\n{clickhouse.profiler.format_summary()}")
+        clickhouse.close()
+
+async def analysis_in_progress(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ответ на сообщения, пришедшие, пока анализ этого чата еще выполняется"""
+    await update.message.reply_text("⏳ Анализ еще выполняется, дождитесь результата")
+
+def build_conversation_handler() -> ConversationHandler:
+    """Диалог выбора лиги, команд и разделов анализа.
+
+    Выбор разделов запускает расчет анализа - эти обработчики неблокирующие
+    (block=False): пока анализ одного чата считается, бот обрабатывает
+    сообщения других чатов. Состояние диалога чата при этом остается
+    корректным: ConversationHandler ждет завершения обработчика, а
+    сообщения, пришедшие в это время, получают ответ из состояния WAITING.
+    """
+    return ConversationHandler(
         entry_points=[
             CommandHandler('start', start),
             MessageHandler(filters.Text(["🏟️ Старт анализа"]), start_analysis),
@@ -986,10 +1003,14 @@ def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, select_away_team)
             ],
             SELECT_MAIN_CATEGORY: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, select_main_category)
+                MessageHandler(filters.TEXT & ~filters.COMMAND, select_main_category, block=False)
             ],
             SELECT_SUB_CATEGORY: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, select_sub_category)
+                MessageHandler(filters.TEXT & ~filters.COMMAND, select_sub_category, block=False)
+            ],
+            # Сообщения чата, пока его анализ еще считается: состояние диалога не меняется
+            ConversationHandler.WAITING: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, analysis_in_progress)
             ],
         },
         fallbacks=[
@@ -998,8 +1019,42 @@ def main():
             CommandHandler('start', start)
         ],
     )
+
+def main():
+    """Запуск бота"""
+    # Получаем токен из переменных окружения
+    TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+    
+    if not TOKEN:
+        print("❌ Токен бота не найден. Убедитесь, что переменная TELEGRAM_BOT_TOKEN установлена в .env файле")
+        return
+    
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .post_shutdown(close_clickhouse)
+        .build()
+    )
+    
+    # Один пул соединений на весь процесс, общий для всех обработчиков (ClickHouse или DuckDB по STORAGE_ENGINE)
+    application.bot_data['clickhouse'] = create_storage(max_size=int(os.getenv("CLICKHOUSE_POOL_SIZE", 8)))
+    # Кэш командных агрегатов, сбрасывается при новой версии данных (после загрузки тура)
+    application.bot_data['aggregates_cache'] = AggregatesCache(
+        max_size=int(os.getenv("AGGREGATES_CACHE_SIZE", 2048))
+    )
+    # Снимки турнирных таблиц, обновляются по той же версии данных
+    application.bot_data['standings'] = StandingsStore(application.bot_data['aggregates_cache'])
+    # Готовые отчеты по предстоящим матчам (prerender_reports.py)
+    application.bot_data['report_cache'] = ReportCache()
+    # Одинаковые анализы, запрошенные одновременно, считаются один раз
+    application.bot_data['analysis_flights'] = SingleFlight()
+    # Посчитанный анализ матча на время сессии чата: переход между разделами без запросов к базе
+    application.bot_data['session_cache'] = SessionCache(
+        max_size=int(os.getenv("SESSION_CACHE_SIZE", 1000)),
+        ttl_seconds=float(os.getenv("SESSION_TTL_MINUTES", 30)) * 60
+    )
     
-    application.add_handler(conv_handler)
+    application.add_handler(build_conversation_handler())
     
     # Запускаем бота
     print("🤖 Бот запущен...")
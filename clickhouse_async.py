@@ -0,0 +1,249 @@
+from clickhouse_driver import Client
+from clickhouse_driver.errors import ServerException
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+from query_profiler import QueryProfiler, default_query_name
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+
+
+class ClickHousePool:
+    """Ограниченный пул соединений ClickHouse с проверкой здоровья.
+
+    Соединения переиспользуются между запросами. Простаивающие дольше
+    max_idle_seconds закрываются, а перед выдачей давно не использованного
+    соединения выполняется SELECT 1.
+    """
+
+    def __init__(self, host: str = 'localhost', user: str = 'username', password: str = 'password',
+                 database: str = 'football_db', port: int = 9000, max_size: int = 8,
+                 max_idle_seconds: float = 300.0, health_check_interval: float = 30.0,
+                 acquire_timeout: float = 30.0):
+        self.connection_params = {
+            'host': host,
+            'port': port,
+            'user': user,
+            'password': password,
+            'database': database
+        }
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []  # [(client, last_used)], последний - самый свежий
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'evicted_idle': 0,
+            'health_check_failures': 0,
+            'broken': 0,
+            'acquire_timeouts': 0
+        }
+
+    @classmethod
+    def from_env(cls, **kwargs) -> 'ClickHousePool':
+        """Создает пул по переменным окружения CLICKHOUSE_*"""
+        return cls(
+            host=os.getenv('CLICKHOUSE_HOST', 'localhost'),
+            user=os.getenv('CLICKHOUSE_USER', 'username'),
+            password=os.getenv('CLICKHOUSE_PASSWORD', 'password'),
+            database=os.getenv('CLICKHOUSE_DB', 'football_db'),
+            port=int(os.getenv('CLICKHOUSE_PORT', 9000)),
+            **kwargs
+        )
+
+    def _disconnect(self, client: Client):
+        try:
+            client.disconnect()
+        except Exception as e:
+            print(f"⚠️ Ошибка закрытия соединения ClickHouse: {e}")
+
+    def _is_healthy(self, client: Client) -> bool:
+        try:
+            client.execute('SELECT 1')
+            return True
+        except Exception as e:
+            print(f"⚠️ Соединение ClickHouse не прошло проверку: {e}")
+            return False
+
+    def _evict_expired_locked(self, now: float) -> List[Client]:
+        expired = [client for client, last_used in self._idle if now - last_used > self.max_idle_seconds]
+        if expired:
+            self._idle = [(client, last_used) for client, last_used in self._idle
+                          if now - last_used <= self.max_idle_seconds]
+            self._stats['evicted_idle'] += len(expired)
+        return expired
+
+    def evict_idle(self) -> int:
+        """Закрывает соединения, простаивающие дольше max_idle_seconds"""
+        with self._lock:
+            expired = self._evict_expired_locked(time.monotonic())
+        for client in expired:
+            self._disconnect(client)
+        return len(expired)
+
+    def acquire(self) -> Client:
+        """Выдает соединение из пула (блокирующий вызов)"""
+        if self._closed:
+            raise RuntimeError("Пул соединений ClickHouse закрыт")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._stats['acquire_timeouts'] += 1
+            raise TimeoutError(f"Нет свободных соединений ClickHouse за {self.acquire_timeout} с")
+
+        try:
+            while True:
+                now = time.monotonic()
+                with self._lock:
+                    expired = self._evict_expired_locked(now)
+                    client, last_used = self._idle.pop() if self._idle else (None, None)
+                    self._in_use += 1
+                for old_client in expired:
+                    self._disconnect(old_client)
+
+                if client is None:
+                    client = Client(**self.connection_params)
+                    with self._lock:
+                        self._stats['created'] += 1
+                    return client
+
+                if now - last_used > self.health_check_interval and not self._is_healthy(client):
+                    self._disconnect(client)
+                    with self._lock:
+                        self._in_use -= 1
+                        self._stats['health_check_failures'] += 1
+                    continue
+
+                with self._lock:
+                    self._stats['reused'] += 1
+                return client
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, client: Client, broken: bool = False):
+        """Возвращает соединение в пул (сломанное закрывается)"""
+        with self._lock:
+            self._in_use -= 1
+            if broken or self._closed:
+                if broken:
+                    self._stats['broken'] += 1
+                keep = False
+            else:
+                self._idle.append((client, time.monotonic()))
+                keep = True
+        if not keep:
+            self._disconnect(client)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: соединение на время одного запроса"""
+        client = self.acquire()
+        broken = False
+        try:
+            yield client
+        except Exception as e:
+            # Ошибки сети/протокола оставляют соединение в неизвестном состоянии
+            broken = not isinstance(e, ServerException)
+            raise
+        finally:
+            self.release(client, broken=broken)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики пула: размер, занятые/свободные соединения и счетчики"""
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'size': self._in_use + len(self._idle),
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                **self._stats
+            }
+
+    def close(self):
+        """Закрывает все свободные соединения; занятые закроются при возврате"""
+        with self._lock:
+            self._closed = True
+            idle = [client for client, _ in self._idle]
+            self._idle = []
+        for client in idle:
+            self._disconnect(client)
+
+
+class AsyncClickHouse:
+    """Неблокирующий доступ к ClickHouse для асинхронного кода.
+
+    clickhouse_driver синхронный, поэтому запросы выполняются в ограниченном
+    пуле потоков, а соединения берутся из ClickHousePool. Независимые
+    запросы можно запускать параллельно через asyncio.gather, не блокируя
+    цикл событий бота. Каждый запрос замеряется в profiler под именем
+    query_name (по умолчанию - первая таблица запроса).
+    """
+
+    def __init__(self, pool: Optional[ClickHousePool] = None, max_workers: Optional[int] = None,
+                 profiler: Optional[QueryProfiler] = None, **pool_kwargs):
+        self.pool = pool or ClickHousePool(**pool_kwargs)
+        self.profiler = profiler or QueryProfiler()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or self.pool.max_size,
+            thread_name_prefix='clickhouse'
+        )
+
+    def execute_sync(self, query: str, params: Optional[Dict[str, Any]] = None,
+                     query_name: Optional[str] = None, **kwargs) -> List:
+        """Синхронное выполнение запроса на соединении из пула"""
+        name = query_name or default_query_name(query)
+        started = time.perf_counter()
+        with self.pool.connection() as client:
+            try:
+                result = client.execute(query, params, **kwargs)
+            except Exception:
+                self.profiler.record(name, time.perf_counter() - started, error=True)
+                raise
+            self._record(name, time.perf_counter() - started, client, result)
+            return result
+
+    def _record(self, name: str, wall_seconds: float, client: Client, result: Any):
+        """Замер запроса по статистике последнего запроса соединения (progress, elapsed)"""
+        last_query = getattr(client, 'last_query', None)
+        progress = getattr(last_query, 'progress', None)
+        elapsed_ns = getattr(progress, 'elapsed_ns', 0)
+        self.profiler.record(
+            name,
+            wall_seconds,
+            rows_read=getattr(progress, 'rows', 0),
+            bytes_read=getattr(progress, 'bytes', 0),
+            server_seconds=elapsed_ns / 1e9 if elapsed_ns else getattr(last_query, 'elapsed', 0.0),
+            result_rows=len(result) if isinstance(result, list) else 0
+        )
+
+    async def execute(self, query: str, params: Optional[Dict[str, Any]] = None,
+                      query_name: Optional[str] = None, **kwargs) -> List:
+        """Выполняет запрос в пуле потоков, не блокируя цикл событий"""
+        loop = asyncio.get_running_loop()
+        # Контекст задачи передается в поток - замер попадает в разбивку текущего отчета
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor,
+            context.run,
+            functools.partial(self.execute_sync, query, params, query_name, **kwargs)
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        return self.pool.metrics()
+
+    def close(self):
+        """Останавливает пул потоков и закрывает соединения"""
+        self._executor.shutdown(wait=True)
+        self.pool.close()
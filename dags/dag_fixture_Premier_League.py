@@ -26,3 +26,10 @@ with DAG(
         task_id='run_my_script',
         bash_command="cd /opt/airflow/dags/scripts && python running_script.py --round {{ var.value.get('football_current_round_Premier_League') }} --tournament 17 --season 76986 --fixtures"
     )
+
+    # Отчеты по матчам следующего тура - после загрузки fixtures, увеличившей версию данных лиги
+    prerender_task = BashOperator(
+        task_id='prerender_reports',
+        bash_command="cd /opt/airflow/project && CLICKHOUSE_HOST=${CLICKHOUSE_HOST:-clickhouse-server} python prerender_reports.py --tournament 17 --season 76986 --round {{ var.value.get('football_current_round_Premier_League') | int + 1 }}"
+    )
+    bash_task >> prerender_task
@@ -40,4 +40,10 @@ with DAG(
         task_id='run_my_script',
         bash_command="cd /opt/airflow/dags/scripts && python running_script.py --round {{ var.value.get('football_current_round_Russian_Premier_League') }} --tournament 203 --season 77142 --historical --cache"
     )
-    get_round_task >> bash_task
\ No newline at end of file
+
+    # Модель голов переподбирается один раз на загрузку тура
+    goal_model_task = BashOperator(
+        task_id='fit_goal_model',
+        bash_command="cd /opt/airflow/project && CLICKHOUSE_HOST=${CLICKHOUSE_HOST:-clickhouse-server} python goal_model.py --tournament 203 --season 77142"
+    )
+    get_round_task >> bash_task >> goal_model_task
\ No newline at end of file
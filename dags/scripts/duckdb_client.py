@@ -0,0 +1,626 @@
+import duckdb
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import count
+from typing import Dict, Any, List, Optional, Tuple
+import math
+import re
+import threading
+import uuid
+
+
+# Таблица встроенной базы, в которой хранятся исходные CREATE-запросы ClickHouse:
+# по ним любое подключение восстанавливает ключи, движки и материализованные представления
+SCHEMA_TABLE = '_clickhouse_schema'
+
+# Столько строк VALUES в одном INSERT - пакет литералов DuckDB разбирает быстрее параметров
+INSERT_BATCH = 1000
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_PARAM = re.compile(r'%%|%\((\w+)\)s')
+
+_TYPES = {
+    'UInt8': 'BIGINT', 'UInt16': 'BIGINT', 'UInt32': 'BIGINT', 'UInt64': 'BIGINT',
+    'Int8': 'BIGINT', 'Int16': 'BIGINT', 'Int32': 'BIGINT', 'Int64': 'BIGINT',
+    'Float32': 'DOUBLE', 'Float64': 'DOUBLE', 'Bool': 'BOOLEAN',
+    'String': 'VARCHAR', 'UUID': 'VARCHAR', 'Date': 'DATE', 'Date32': 'DATE',
+    'DateTime': 'TIMESTAMP', 'DateTime64': 'TIMESTAMP'
+}
+
+_CASTS = {
+    'toFloat32': 'DOUBLE', 'toFloat64': 'DOUBLE', 'toString': 'VARCHAR', 'toDateTime': 'TIMESTAMP',
+    **{f'to{prefix}Int{bits}': 'BIGINT' for prefix in ('', 'U') for bits in (8, 16, 32, 64)}
+}
+
+
+def literal(value: Any) -> str:
+    """SQL-литерал DuckDB для значения Python (как подстановка параметров clickhouse_driver)"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else f"'{value}'::DOUBLE"
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return f"TIMESTAMP '{value.replace(tzinfo=None).isoformat(' ')}'"
+    if isinstance(value, date):
+        return f"DATE '{value.isoformat()}'"
+    if isinstance(value, (list, set, frozenset)):
+        return '[' + ', '.join(literal(item) for item in value) + ']'
+    if isinstance(value, tuple):
+        # Пустой кортеж в IN () - ни одного совпадения
+        return '(' + (', '.join(literal(item) for item in value) or 'NULL') + ')'
+    if isinstance(value, dict):
+        return 'MAP {' + ', '.join(f"{literal(k)}: {literal(v)}" for k, v in value.items()) + '}'
+    if isinstance(value, uuid.UUID):
+        value = str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _split_args(text: str) -> List[str]:
+    """Аргументы вызова функции: запятые верхнего уровня"""
+    args, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            args.append(text[start:i].strip())
+            start = i + 1
+    if text.strip():
+        args.append(text[start:].strip())
+    return args
+
+
+def _closing(text: str, start: int) -> int:
+    """Индекс скобки, закрывающей открытую в позиции start"""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] in '([{':
+            depth += 1
+        elif text[i] in ')]}':
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError(f"Несбалансированные скобки: {text[start:start + 50]}")
+
+
+def _rewrite_call(name: str, args: List[str]) -> Optional[str]:
+    """Функция ClickHouse -> выражение DuckDB (None - имя совпадает)"""
+    if name == 'countIf':
+        return f"count_if({args[0]})"
+    if name == 'sumIf':
+        return f"coalesce(sum({args[0]}) FILTER (WHERE {args[1]}), 0)"
+    if name == 'avgIf':
+        return f"avg({args[0]}) FILTER (WHERE {args[1]})"
+    if name.lower() == 'avg':
+        # В ClickHouse условие - UInt8, avg(result = 'W') - доля строк
+        return f"avg(CAST({args[0]} AS DOUBLE))"
+    if name in ('uniq', 'uniqExact'):
+        return f"count(DISTINCT {', '.join(args)})"
+    if name == 'any':
+        return f"any_value({args[0]})"
+    if name == 'anyLast':
+        return f"last({args[0]})"
+    if name == 'argMax':
+        return f"arg_max({args[0]}, {args[1]})"
+    if name == 'argMin':
+        return f"arg_min({args[0]}, {args[1]})"
+    if name == 'groupArray':
+        return f"list({args[0]})"
+    if name == 'multiIf':
+        branches = ' '.join(f"WHEN {args[i]} THEN {args[i + 1]}" for i in range(0, len(args) - 1, 2))
+        return f"CASE {branches} ELSE {args[-1]} END"
+    if name == 'log':
+        return f"ln({args[0]})"
+    if name == 'today':
+        return 'current_date'
+    if name == 'now':
+        return 'CAST(now() AS TIMESTAMP)'
+    if name == 'toDate':
+        return "DATE '1970-01-01'" if args[0] == '0' else f"CAST({args[0]} AS DATE)"
+    if name in _CASTS:
+        return f"CAST({args[0]} AS {_CASTS[name]})"
+    return None
+
+
+def _rewrite_functions(sql: str) -> str:
+    result, position = [], 0
+    for match in re.finditer(r'\b([A-Za-z_]\w*)\s*\(', sql):
+        if match.start() < position:
+            continue
+        end = _closing(sql, match.end() - 1)
+        args = [_rewrite_functions(arg) for arg in _split_args(sql[match.end():end])]
+        rewritten = _rewrite_call(match.group(1), args)
+        result.append(sql[position:match.start()])
+        result.append(rewritten if rewritten is not None else f"{match.group(1)}({', '.join(args)})")
+        position = end + 1
+    result.append(sql[position:])
+    return ''.join(result)
+
+
+def _scope(sql: str, at: int) -> Tuple[int, int]:
+    """Границы подзапроса (уровня скобок), в котором находится позиция at"""
+    depth, start = 0, 0
+    for i in range(at - 1, -1, -1):
+        if sql[i] == ')':
+            depth += 1
+        elif sql[i] == '(':
+            if depth == 0:
+                start = i + 1
+                break
+            depth -= 1
+    end = _closing(sql, start - 1) if start else len(sql)
+    return start, end
+
+
+def _top_level(sql: str, start: int, end: int, pattern: str) -> List[re.Match]:
+    """Совпадения pattern на верхнем уровне скобок отрезка sql[start:end]"""
+    matches, depth = [], 0
+    depths = []
+    for char in sql[start:end]:
+        depths.append(depth)
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+    for match in re.finditer(pattern, sql[start:end], re.IGNORECASE):
+        if depths[match.start()] == 0:
+            matches.append(match)
+    return matches
+
+
+def _rewrite_limit_by(sql: str) -> str:
+    """LIMIT n BY cols -> QUALIFY row_number() OVER (PARTITION BY cols ORDER BY <сортировка запроса>) <= n"""
+    while True:
+        match = re.search(r'\bLIMIT\s+(\d+)\s+BY\s+', sql, re.IGNORECASE)
+        if not match:
+            return sql
+        start, end = _scope(sql, match.start())
+        tail = _top_level(sql, match.end(), end, r'\b(LIMIT|SETTINGS|UNION|FORMAT)\b')
+        by_end = match.end() + tail[0].start() if tail else end
+        partition = sql[match.end():by_end].strip()
+
+        order_by = _top_level(sql, start, match.start(), r'\bORDER\s+BY\b')
+        insert_at = start + order_by[-1].start() if order_by else match.start()
+        order = sql[start + order_by[-1].end():match.start()].strip() if order_by else ''
+        window = f"PARTITION BY {partition}" + (f" ORDER BY {order}" if order else '')
+        qualify = f"QUALIFY row_number() OVER ({window}) <= {match.group(1)}\n"
+        sql = sql[:insert_at] + qualify + sql[insert_at:match.start()] + sql[by_end:]
+
+
+def _rewrite_group_by_aliases(sql: str) -> str:
+    """GROUP BY по псевдониму SELECT -> по его выражению.
+
+    ClickHouse ищет имя сначала среди псевдонимов, DuckDB - среди столбцов
+    таблиц, поэтому при совпадении имен (season_id AS season_id из JOIN)
+    DuckDB считает ссылку неоднозначной.
+    """
+    position = 0
+    while True:
+        match = re.compile(r'\bGROUP\s+BY\s+', re.IGNORECASE).search(sql, position)
+        if not match:
+            return sql
+        start, end = _scope(sql, match.start())
+        select = _top_level(sql, start, match.start(), r'\bSELECT\b')
+        from_ = _top_level(sql, start, match.start(), r'\bFROM\b')
+        tail = _top_level(sql, match.end(), end, r'\b(HAVING|ORDER|LIMIT|QUALIFY|SETTINGS|UNION|WINDOW)\b')
+        by_end = match.end() + tail[0].start() if tail else end
+        position = by_end
+        if not select or not from_:
+            continue
+
+        aliases = {}
+        for item in _split_args(sql[start + select[0].end():start + from_[0].start()]):
+            alias = re.match(r'(.+?)\s+AS\s+(\w+)$', item, re.IGNORECASE | re.DOTALL)
+            if alias and alias.group(1).strip() != alias.group(2):
+                aliases[alias.group(2)] = alias.group(1).strip()
+        items = _split_args(sql[match.end():by_end])
+        rewritten = ', '.join(f"({aliases[item]})" if item in aliases else item for item in items)
+        suffix = sql[by_end:]
+        sql = sql[:match.end()] + rewritten + (' ' if suffix and not suffix[0].isspace() else '') + suffix
+        position = match.end() + len(rewritten)
+
+
+def _rewrite_array_join(sql: str) -> str:
+    """ARRAY JOIN expr AS alias -> CROSS JOIN LATERAL (SELECT unnest(expr) AS alias)"""
+    while True:
+        match = re.search(r'\bARRAY\s+JOIN\s+', sql, re.IGNORECASE)
+        if not match:
+            return sql
+        _, end = _scope(sql, match.start())
+        alias = _top_level(sql, match.end(), end, r'\s+AS\s+(\w+)')
+        if not alias:
+            raise ValueError("ARRAY JOIN без псевдонима не поддерживается")
+        expression = sql[match.end():match.end() + alias[0].start()].strip()
+        name = alias[0].group(1)
+        sql = (sql[:match.start()] + f"CROSS JOIN LATERAL (SELECT unnest({expression}) AS {name})"
+               + sql[match.end() + alias[0].end():])
+
+
+def translate_query(query: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Запрос в диалекте ClickHouse (с параметрами %(name)s) -> запрос DuckDB"""
+    literals = []
+
+    def mask(match: re.Match) -> str:
+        literals.append(match.group(0).replace("\\'", "''"))
+        return f"\x00{len(literals) - 1}\x00"
+
+    sql = _STRING_LITERAL.sub(mask, query)
+    sql = sql.replace('`', '"')
+    sql = re.sub(r'\s+FINAL\b', '', sql, flags=re.IGNORECASE)
+    sql = _rewrite_group_by_aliases(sql)
+    sql = _rewrite_array_join(sql)
+    sql = _rewrite_limit_by(sql)
+    sql = _rewrite_functions(sql)
+    if params is not None:
+        # Как clickhouse_driver: подстановка только при переданных параметрах, %% -> %
+        sql = _PARAM.sub(lambda match: literal(params[match.group(1)]) if match.group(1) else '%', sql)
+        literals = [text.replace('%%', '%') for text in literals]
+    return re.sub(r'\x00(\d+)\x00', lambda match: literals[int(match.group(1))], sql)
+
+
+def _column_type(ch_type: str) -> Tuple[str, str]:
+    """Тип столбца ClickHouse -> (тип DuckDB, агрегатная функция SimpleAggregateFunction)"""
+    ch_type = ch_type.strip()
+    wrapper = re.match(r'(\w+)\((.*)\)$', ch_type, re.DOTALL)
+    if not wrapper:
+        return _TYPES.get(ch_type, 'VARCHAR'), ''
+    name, inner = wrapper.groups()
+    if name in ('Nullable', 'LowCardinality'):
+        return _column_type(inner)[0], ''
+    if name == 'SimpleAggregateFunction':
+        function, value_type = _split_args(inner)
+        return _column_type(value_type)[0], function
+    if name == 'Array':
+        return _column_type(inner)[0] + '[]', ''
+    if name == 'Map':
+        key_type, value_type = (_column_type(arg)[0] for arg in _split_args(inner))
+        return f"MAP({key_type}, {value_type})", ''
+    if name == 'Decimal':
+        return 'DOUBLE', ''
+    return _TYPES.get(name, 'VARCHAR'), ''
+
+
+def _zero_value(duck_type: str) -> str:
+    """Значение по умолчанию ClickHouse для столбца без DEFAULT"""
+    if duck_type.endswith('[]'):
+        return '[]'
+    if duck_type.startswith('MAP'):
+        return 'MAP {}'
+    return {
+        'BIGINT': '0', 'DOUBLE': '0', 'BOOLEAN': 'FALSE', 'VARCHAR': "''",
+        'DATE': "DATE '1970-01-01'", 'TIMESTAMP': "TIMESTAMP '1970-01-01 00:00:00'"
+    }[duck_type]
+
+
+def _strip_comments(statement: str) -> str:
+    """Убирает комментарии -- и # (кроме содержимого строковых литералов)"""
+    lines = []
+    for line in statement.split('\n'):
+        masked = _STRING_LITERAL.sub(lambda match: ' ' * len(match.group(0)), line)
+        cuts = [cut for cut in (masked.find('--'), masked.find('#')) if cut >= 0]
+        lines.append(line[:min(cuts)] if cuts else line)
+    return '\n'.join(lines)
+
+
+def parse_table(statement: str) -> Dict[str, Any]:
+    """CREATE TABLE ClickHouse -> описание таблицы: столбцы, ключ, движок"""
+    statement = _strip_comments(statement)
+    header = re.match(r'\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?([\w.]+)\s*\(', statement, re.IGNORECASE)
+    if not header:
+        raise ValueError(f"Не поддерживается: {statement[:80]}")
+    body_end = _closing(statement, header.end() - 1)
+    tail = statement[body_end + 1:]
+
+    engine = re.search(r'ENGINE\s*=\s*(\w+)\s*(?:\(([^)]*)\))?', tail, re.IGNORECASE)
+    if not engine or not engine.group(1).endswith('MergeTree'):
+        raise ValueError(f"Движок {engine.group(1) if engine else '?'} не поддерживается встроенной базой")
+    order_by = re.search(r'ORDER\s+BY\s+(\([^)]*\)|[\w`]+)', tail, re.IGNORECASE)
+    keys = [key.strip('` ') for key in _split_args(order_by.group(1).strip('()'))] if order_by else []
+
+    columns = []
+    for definition in _split_args(statement[header.end():body_end]):
+        if not definition:
+            continue
+        column = re.match(r'`?(\w+)`?\s+(.+?)(?:\s+DEFAULT\s+(.+))?$', definition.strip(), re.DOTALL | re.IGNORECASE)
+        duck_type, aggregate = _column_type(column.group(2))
+        default = translate_query(column.group(3)) if column.group(3) else _zero_value(duck_type)
+        columns.append({
+            'name': column.group(1),
+            'type': duck_type,
+            'default': f"CAST({default} AS {duck_type})",
+            'aggregate': aggregate
+        })
+
+    kind = {'ReplacingMergeTree': 'replacing', 'AggregatingMergeTree': 'aggregating'}.get(engine.group(1), 'plain')
+    return {
+        'name': header.group(2),
+        'if_not_exists': bool(header.group(1)),
+        'columns': columns,
+        'keys': keys if kind != 'plain' else [],
+        'kind': kind,
+        'version': (engine.group(2) or '').strip() or None
+    }
+
+
+def parse_view(statement: str) -> Dict[str, Any]:
+    """CREATE MATERIALIZED VIEW ... TO target AS SELECT -> таблица-источник, цель и запрос"""
+    statement = _strip_comments(statement)
+    header = re.match(r'\s*CREATE\s+MATERIALIZED\s+VIEW\s+(IF\s+NOT\s+EXISTS\s+)?([\w.]+)\s+TO\s+([\w.]+)\s+AS\s+',
+                      statement, re.IGNORECASE)
+    if not header:
+        raise ValueError("Материализованное представление без TO не поддерживается встроенной базой")
+    select = statement[header.end():]
+    # Как в ClickHouse, представление срабатывает на вставку в первую таблицу FROM
+    source = re.search(r'\bFROM\s+([\w.]+)', select, re.IGNORECASE)
+    return {
+        'name': header.group(2),
+        'target': header.group(3),
+        'source': source.group(1),
+        'select': select[:source.start(1)] + '__source__' + select[source.end(1):]
+    }
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class DuckDBClient:
+    """Встроенная база DuckDB с интерфейсом clickhouse_driver.Client.
+
+    execute() принимает запросы в диалекте ClickHouse: FINAL, LIMIT n BY,
+    ARRAY JOIN, countIf/sumIf/argMax и параметры %(name)s переводятся в
+    DuckDB. Схема создается теми же CREATE-запросами, что и в ClickHouse:
+    ключ ORDER BY становится первичным ключом, вставка в ReplacingMergeTree
+    заменяет строку с тем же ключом (с версией не меньше текущей), в
+    AggregatingMergeTree - суммирует sum-столбцы и заменяет anyLast.
+    Материализованные представления выполняются на вставленных строках в
+    той же транзакции. Данные можно выгрузить в Parquet и загрузить обратно.
+
+    cursor() создает клиента на отдельном соединении той же базы - по
+    одному на поток.
+    """
+
+    def __init__(self, path: str = ':memory:', read_only: bool = False, _parent: 'DuckDBClient' = None):
+        if _parent is None:
+            self.connection = duckdb.connect(path, read_only=read_only)
+            self.tables = {}
+            self.views = {}
+            self._write_lock = threading.RLock()
+            self._temp_names = count()
+            self._load_schema()
+        else:
+            self.connection = _parent.connection.cursor()
+            self.tables = _parent.tables
+            self.views = _parent.views
+            self._write_lock = _parent._write_lock
+            self._temp_names = _parent._temp_names
+        self.path = path
+
+    def cursor(self) -> 'DuckDBClient':
+        return DuckDBClient(self.path, _parent=self)
+
+    def _load_schema(self):
+        exists = self.connection.execute(
+            "SELECT count() FROM information_schema.tables WHERE table_name = ?", [SCHEMA_TABLE]
+        ).fetchone()[0]
+        if not exists:
+            return
+        for kind, statement in self.connection.execute(f"SELECT kind, statement FROM {SCHEMA_TABLE} ORDER BY id").fetchall():
+            if kind == 'table':
+                table = parse_table(statement)
+                self.tables[table['name']] = table
+            else:
+                view = parse_view(statement)
+                self.views[view['name']] = view
+
+    def _save_schema(self, name: str, kind: str, statement: Optional[str]):
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} (id BIGINT, name VARCHAR PRIMARY KEY, kind VARCHAR, statement VARCHAR)"
+        )
+        self.connection.execute(f"DELETE FROM {SCHEMA_TABLE} WHERE name = ?", [name])
+        if statement is not None:
+            self.connection.execute(
+                f"INSERT INTO {SCHEMA_TABLE} SELECT coalesce(max(id), 0) + 1, ?, ?, ? FROM {SCHEMA_TABLE}",
+                [name, kind, statement]
+            )
+
+    def execute(self, query: str, params: Optional[Dict[str, Any]] = None, with_column_types: bool = False,
+                columnar: bool = False, settings: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        """Выполняет запрос ClickHouse; для INSERT ... VALUES строки передаются в params"""
+        statement = _strip_comments(query).strip().rstrip(';')
+        keyword = ' '.join(statement.split()[:3]).upper()
+
+        if keyword.startswith('CREATE TABLE'):
+            return self._create_table(statement)
+        if keyword.startswith('CREATE MATERIALIZED VIEW'):
+            return self._create_view(statement)
+        if keyword.startswith('INSERT INTO'):
+            return self._insert_statement(statement, params)
+        if keyword.startswith('DROP TABLE'):
+            return self._drop_table(statement)
+        if keyword.startswith('ALTER TABLE'):
+            raise NotImplementedError("Мутации ALTER TABLE не поддерживаются встроенной базой")
+
+        result = self.connection.execute(translate_query(statement, params))
+        rows = result.fetchall() if result.description else []
+        if columnar:
+            rows = [tuple(column) for column in zip(*rows)] if rows else [() for _ in result.description or []]
+        if with_column_types:
+            return rows, [(column[0], str(column[1])) for column in result.description or []]
+        return rows
+
+    def _create_table(self, statement: str) -> List:
+        table = parse_table(statement)
+        with self._write_lock:
+            if table['name'] in self.tables:
+                if table['if_not_exists']:
+                    return []
+                raise ValueError(f"Таблица {table['name']} уже существует")
+            definitions = [
+                f"{_quote(column['name'])} {column['type']} DEFAULT {column['default']}"
+                for column in table['columns']
+            ]
+            if table['keys']:
+                definitions.append(f"PRIMARY KEY ({', '.join(map(_quote, table['keys']))})")
+            self.connection.execute(f"CREATE TABLE {table['name']} ({', '.join(definitions)})")
+            self._save_schema(table['name'], 'table', statement)
+            self.tables[table['name']] = table
+        return []
+
+    def _create_view(self, statement: str) -> List:
+        view = parse_view(statement)
+        with self._write_lock:
+            if view['target'] not in self.tables:
+                raise ValueError(f"Нет таблицы {view['target']} для представления {view['name']}")
+            self._save_schema(view['name'], 'view', statement)
+            self.views[view['name']] = view
+        return []
+
+    def _drop_table(self, statement: str) -> List:
+        name = statement.split()[-1]
+        with self._write_lock:
+            self.connection.execute(translate_query(statement))
+            self.tables.pop(name, None)
+            self.views.pop(name, None)
+            self._save_schema(name, 'table', None)
+        return []
+
+    def _insert_statement(self, statement: str, params: Any) -> int:
+        match = re.match(r'INSERT\s+INTO\s+([\w.]+)\s*(?:\(([^)]*)\))?\s*(.*)$', statement, re.IGNORECASE | re.DOTALL)
+        table, columns, source = match.groups()
+        columns = [column.strip('` \n') for column in columns.split(',')] if columns else None
+        rows = None
+        if re.match(r'VALUES\s*$', source, re.IGNORECASE):
+            # clickhouse_driver: строки - кортежи или словари по именам столбцов
+            rows, source = params or [], None
+            if not rows:
+                return 0
+            if columns is None:
+                columns = [column['name'] for column in self.tables[table]['columns']]
+            if isinstance(rows[0], dict):
+                rows = [tuple(row.get(column) for column in columns) for row in rows]
+        else:
+            source = translate_query(source, params if isinstance(params, dict) else None)
+
+        with self._write_lock:
+            self.connection.execute("BEGIN TRANSACTION")
+            try:
+                inserted = self._insert(table, columns, source, rows)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def _temp_table(self) -> str:
+        return f"_insert_{next(self._temp_names)}"
+
+    def _insert(self, table_name: str, columns: Optional[List[str]], source: Optional[str],
+                rows: Optional[List[tuple]] = None, by_name: bool = False) -> int:
+        """Вставка с семантикой движка таблицы и срабатыванием материализованных представлений"""
+        table = self.tables[table_name]
+        types = {column['name']: column['type'] for column in table['columns']}
+        staged = self._temp_table()
+
+        if rows is not None:
+            self.connection.execute(
+                f"CREATE TEMP TABLE {staged} AS SELECT {', '.join(map(_quote, columns))} FROM {table_name} LIMIT 0"
+            )
+            for start in range(0, len(rows), INSERT_BATCH):
+                values = ', '.join(
+                    '(' + ', '.join(literal(value) for value in row) + ')'
+                    for row in rows[start:start + INSERT_BATCH]
+                )
+                self.connection.execute(f"INSERT INTO {staged} VALUES {values}")
+            provided = {column: column for column in columns}
+        else:
+            self.connection.execute(f"CREATE TEMP TABLE {staged} AS {source}")
+            staged_columns = [column[0] for column in
+                              self.connection.execute(f"SELECT * FROM {staged} LIMIT 0").description]
+            if by_name:
+                # Представление ClickHouse вставляет столбцы по именам
+                provided = {column: column for column in staged_columns if column in types}
+            else:
+                targets = columns or [column['name'] for column in table['columns']]
+                provided = dict(zip(targets, staged_columns))
+
+        inserted = self._temp_table()
+        expressions = [
+            f"CAST({_quote(provided[column['name']])} AS {column['type']})" if column['name'] in provided
+            else column['default']
+            for column in table['columns']
+        ]
+        names = [_quote(column['name']) for column in table['columns']]
+        self.connection.execute(
+            f"CREATE TEMP TABLE {inserted} AS SELECT "
+            + ', '.join(f"{expression} AS {name}" for expression, name in zip(expressions, names))
+            + f", rowid AS __seq FROM {staged}"
+        )
+        count_inserted = self.connection.execute(f"SELECT count() FROM {inserted}").fetchone()[0]
+        self.connection.execute(self._apply_query(table, inserted))
+
+        for view in self.views.values():
+            if view['source'] == table_name:
+                select = translate_query(view['select']).replace('__source__', inserted)
+                self._insert(view['target'], None, select, by_name=True)
+
+        self.connection.execute(f"DROP TABLE {staged}")
+        self.connection.execute(f"DROP TABLE {inserted}")
+        return count_inserted
+
+    def _apply_query(self, table: Dict[str, Any], inserted: str) -> str:
+        """INSERT из подготовленных строк по правилам движка таблицы"""
+        names = [_quote(column['name']) for column in table['columns']]
+        insert = f"INSERT INTO {table['name']} ({', '.join(names)}) "
+        keys = [_quote(key) for key in table['keys']]
+        values = [column for column in table['columns'] if column['name'] not in table['keys']]
+
+        if table['kind'] == 'aggregating':
+            select = ', '.join(
+                _quote(column['name']) if column['name'] in table['keys']
+                else f"sum({_quote(column['name'])})" if column['aggregate'] == 'sum'
+                else f"arg_max({_quote(column['name'])}, __seq)"
+                for column in table['columns']
+            )
+            updates = ', '.join(
+                f"{_quote(column['name'])} = {_quote(column['name'])} + excluded.{_quote(column['name'])}"
+                if column['aggregate'] == 'sum' else f"{_quote(column['name'])} = excluded.{_quote(column['name'])}"
+                for column in values
+            )
+            return (insert + f"SELECT {select} FROM {inserted} GROUP BY {', '.join(keys)} "
+                    + f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}")
+
+        if table['kind'] == 'replacing':
+            version = _quote(table['version']) if table['version'] else None
+            order = f"{version} DESC, __seq DESC" if version else "__seq DESC"
+            select = (f"SELECT {', '.join(names)} FROM {inserted} "
+                      f"QUALIFY row_number() OVER (PARTITION BY {', '.join(keys)} ORDER BY {order}) = 1")
+            if not values:
+                return insert + select + f" ON CONFLICT ({', '.join(keys)}) DO NOTHING"
+            updates = ', '.join(f"{_quote(column['name'])} = excluded.{_quote(column['name'])}" for column in values)
+            condition = f" WHERE excluded.{version} >= {table['name']}.{version}" if version else ''
+            return insert + select + f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}{condition}"
+
+        return insert + f"SELECT {', '.join(names)} FROM {inserted}"
+
+    def export_parquet(self, directory: str):
+        """Выгружает все таблицы (и схему ClickHouse) в каталог Parquet-файлов"""
+        self.connection.execute(f"EXPORT DATABASE {literal(directory)} (FORMAT PARQUET)")
+
+    def import_parquet(self, directory: str):
+        """Загружает в пустую базу выгрузку export_parquet"""
+        with self._write_lock:
+            self.connection.execute(f"IMPORT DATABASE {literal(directory)}")
+            self.tables.clear()
+            self.views.clear()
+            self._load_schema()
+
+    def disconnect(self):
+        self.connection.close()
@@ -3,7 +3,7 @@ sys.path.append('/opt/airflow/dags/scripts')
 from clickhouse_driver import Client
 from footbolldatacollector import FootballDataCollector
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import argparse
 from datetime import datetime
 import os
@@ -12,8 +12,13 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class FootballDataOrchestrator:
-    def __init__(self, ch_host: str, ch_user: str, ch_password: str, tournament_id: int, season_id: int, ch_database: str = 'football_db'):
-        self.ch_client = Client(
+    # Оценок в кольце последних матчей игрока (окно тренда формы в PlayersAnalyzer)
+    RECENT_RATINGS = 5
+
+    def __init__(self, ch_host: str, ch_user: str, ch_password: str, tournament_id: int, season_id: int,
+                 ch_database: str = 'football_db', ch_client=None):
+        # Готовый клиент с интерфейсом clickhouse_driver (например, DuckDBClient встроенной базы)
+        self.ch_client = ch_client or Client(
             host=ch_host,
             user=ch_user,
             password=ch_password,
@@ -27,7 +32,7 @@ class FootballDataOrchestrator:
         try:
             if not matches:
                 return
-                
+            
             query = """
             INSERT INTO football_matches (
                 match_id, tournament_id, season_id, round_number, match_date,
@@ -141,7 +146,15 @@ class FootballDataOrchestrator:
             import traceback
             traceback.print_exc()
 
-    def _insert_match_stats(self, match_stats: List[Dict[str, Any]]):
+    def _match_columns(self, match_info: Dict[str, Any]) -> tuple:
+        """Денормализованные поля матча для таблиц статистики и карточек"""
+        return (
+            int(match_info['tournament_id']),
+            int(match_info['season_id']),
+            match_info['match_date']
+        )
+
+    def _insert_match_stats(self, match_stats: List[Dict[str, Any]], match_info: Dict[str, Any]):
         """Вставляет статистику матча в ClickHouse"""
         try:
             if not match_stats:
@@ -158,10 +171,11 @@ class FootballDataOrchestrator:
                 total_long_balls, accurate_long_balls, tackles, tackles_won_percent, interceptions,
                 recoveries, clearances, errors_lead_to_shot, errors_lead_to_goal,
                 duel_won_percent, dispossessed, ground_duels_percentage, aerial_duels_percentage, dribbles_percentage,
-                created_at
+                tournament_id, season_id, match_date, created_at
             ) VALUES
             """
             
+            match_columns = self._match_columns(match_info)
             data = []
             for stats in match_stats:
                 data.append((
@@ -204,6 +218,7 @@ class FootballDataOrchestrator:
                     int(stats.get('ground_duels_percentage', 0)),
                     int(stats.get('aerial_duels_percentage', 0)),
                     int(stats.get('dribbles_percentage', 0)),
+                    *match_columns,
                     stats['created_at']
                 ))
                 
@@ -213,23 +228,27 @@ class FootballDataOrchestrator:
         except Exception as e:
             print(f"❌ Ошибка вставки статистики матча: {e}")
 
-    def _insert_cards(self, incidents: List[Dict[str, Any]]):
+    def _insert_cards(self, incidents: List[Dict[str, Any]], match_info: Dict[str, Any]):
         """Вставляет данные о карточках в отдельную таблицу ClickHouse"""
         try:
             card_incidents = [inc for inc in incidents if inc.get('card_type') in ['yellow', 'red', 'yellowRed']]
             
             if not card_incidents:
                 return
-                
+            
             print(f"🔍 Подготовка {len(card_incidents)} карточек для вставки...")
             
             query = """
             INSERT INTO football_cards (
                 match_id, player_id, player_name, team_is_home, card_type, 
-                reason, time, added_time, created_at
+                reason, time, added_time, team_id, opponent_team_id,
+                tournament_id, season_id, match_date, created_at
             ) VALUES
             """
             
+            match_columns = self._match_columns(match_info)
+            home_team_id = int(match_info['home_team_id'])
+            away_team_id = int(match_info['away_team_id'])
             data = []
             for i, incident in enumerate(card_incidents):
                 # ОТЛАДКА: что приходит в time и added_time
@@ -264,17 +283,25 @@ class FootballDataOrchestrator:
                 # Ограничиваем диапазон
                 time_value = max(0, min(65535, time_value))
                 added_time = max(0, min(65535, added_time))
-    
+                
+                # Команда игрока и ее соперник - чтобы не соединять карточки с football_matches
+                team_is_home = int(incident.get('team_is_home', False))
+                team_id, opponent_team_id = (
+                    (home_team_id, away_team_id) if team_is_home else (away_team_id, home_team_id)
+                )
                 
                 data.append((
                     int(incident['match_id']),
                     int(incident.get('player_id', 0)),
                     incident.get('player_name', ''),
-                    int(incident.get('team_is_home', False)),
+                    team_is_home,
                     incident.get('card_type', ''),
                     incident.get('reason', ''),
                     int(time_value),      # ← гарантированно число
                     int(added_time),      # ← гарантированно число
+                    team_id,
+                    opponent_team_id,
+                    *match_columns,
                     datetime.now()
                 ))
             
@@ -285,7 +312,7 @@ class FootballDataOrchestrator:
             print(f"❌ Ошибка вставки карточек: {e}")
             import traceback
             traceback.print_exc()
-    def _insert_player_stats(self, player_stats: List[Dict[str, Any]]):
+    def _insert_player_stats(self, player_stats: List[Dict[str, Any]], match_info: Dict[str, Any]):
         """Вставляет статистику игроков в ClickHouse"""
         try:
             if not player_stats:
@@ -301,10 +328,11 @@ class FootballDataOrchestrator:
                 total_clearance, outfielder_block, challenge_lost, duel_won, duel_lost,
                 aerial_won, duel_success, touches, possession_lost_ctrl, was_fouled,
                 fouls, saves, punches, good_high_claim,
-                saved_shots_from_inside_box, created_at
+                saved_shots_from_inside_box, tournament_id, season_id, match_date, created_at
             ) VALUES
             """
             
+            match_columns = self._match_columns(match_info)
             data = []
             for stats in player_stats:
                 data.append((
@@ -348,6 +376,7 @@ class FootballDataOrchestrator:
                     int(stats.get('punches', 0)),
                     int(stats.get('good_high_claim', 0)),
                     int(stats.get('saved_shots_from_inside_box', 0)),
+                    *match_columns,
                     datetime.now()
                 ))
                 
@@ -395,15 +424,377 @@ class FootballDataOrchestrator:
                     print(f"📊 Матч {match_info['match_id']}: {len(player_stats)} игроков, {len(incidents)} карточек, {len(match_stats)} записей статистики")
                     
                     if player_stats:
-                        self._insert_player_stats(player_stats)
+                        self._insert_player_stats(player_stats, match_info)
                     
                     if incidents:
-                        self._insert_cards(incidents)
+                        self._insert_cards(incidents, match_info)
                     
                     if match_stats:
-                        self._insert_match_stats(match_stats)
+                        self._insert_match_stats(match_stats, match_info)
             
             print(f"🎉 Тур {round_number} обработан: {total_players} игроков, {total_cards} карточек, {total_match_stats} записей статистики")
+            
+            # Дописываем в сезонные агрегаты только матчи этого тура
+            self.fold_match_aggregates([int(match_info['match_id']) for match_info in match_infos])
+
+    def _foldable_match_ids(self, match_ids: List[int]) -> List[int]:
+        """Завершенные матчи, для которых загружена статистика"""
+        params = {'match_ids': tuple(match_ids)}
+        ended = {row[0] for row in self.ch_client.execute("""
+            SELECT match_id FROM football_matches FINAL
+            WHERE match_id IN %(match_ids)s AND status = 'Ended'
+            """, params)}
+        # Матч без статистики (сбой API) подождет следующей загрузки, а не попадет в агрегаты нулями
+        with_stats = {row[0] for row in self.ch_client.execute(
+            "SELECT DISTINCT match_id FROM football_match_stats WHERE match_id IN %(match_ids)s", params
+        )}
+        return sorted(ended & with_stats)
+
+    def _pending_match_ids(self, aggregate: str, match_ids: List[int]) -> List[int]:
+        """Матчи, еще не учтенные в агрегате"""
+        folded = {row[0] for row in self.ch_client.execute("""
+            SELECT match_id FROM aggregated_matches
+            WHERE aggregate = %(aggregate)s
+            AND tournament_id = %(tournament_id)s
+            AND season_id = %(season_id)s
+            AND match_id IN %(match_ids)s
+            """, {
+                'aggregate': aggregate,
+                'tournament_id': self.tournament_id,
+                'season_id': self.season_id,
+                'match_ids': tuple(match_ids)
+            })}
+        return [match_id for match_id in match_ids if match_id not in folded]
+
+    def _mark_aggregated(self, aggregate: str, match_ids: List[int]):
+        """Отмечает матчи учтенными в агрегате - повторный запуск тура их не просуммирует"""
+        now = datetime.now()
+        self.ch_client.execute(
+            "INSERT INTO aggregated_matches (aggregate, tournament_id, season_id, match_id, aggregated_at) VALUES",
+            [(aggregate, self.tournament_id, self.season_id, match_id, now) for match_id in match_ids]
+        )
+
+    def _fold_team_aggregates(self, match_ids: List[int]):
+        """Итоги команд по сезону: результаты, голы, удары, владение, карточки"""
+        query = """
+        INSERT INTO team_season_agg (
+            tournament_id, season_id, team_id, matches, wins, draws, losses,
+            goals_for, goals_against, stats_matches, possession_sum, shots, shots_on_target,
+            corners, fouls, big_chances, big_chances_missed, total_passes, accurate_passes,
+            yellow_cards, red_cards
+        )
+        SELECT
+            m.tournament_id, m.season_id, m.team_id,
+            count(),
+            countIf(m.goals_for > m.goals_against),
+            countIf(m.goals_for = m.goals_against),
+            countIf(m.goals_for < m.goals_against),
+            sum(m.goals_for), sum(m.goals_against),
+            countIf(s.match_id != 0),
+            sum(toFloat64(s.ball_possession)),
+            sum(s.total_shots), sum(s.shots_on_target),
+            sum(s.corners), sum(s.fouls),
+            sum(s.big_chances), sum(s.big_chances_missed),
+            sum(s.total_passes), sum(s.accurate_passes),
+            sum(c.yellow_cards), sum(c.red_cards)
+        FROM (
+            SELECT
+                match_id, tournament_id, season_id,
+                if(side = 'home', home_team_id, away_team_id) AS team_id,
+                if(side = 'home', home_score, away_score) AS goals_for,
+                if(side = 'home', away_score, home_score) AS goals_against
+            FROM football_matches FINAL
+            ARRAY JOIN ['home', 'away'] AS side
+            WHERE match_id IN %(match_ids)s
+        ) m
+        LEFT JOIN (
+            SELECT *
+            FROM football_match_stats FINAL
+            WHERE match_id IN %(match_ids)s
+        ) s ON s.match_id = m.match_id AND s.team_id = m.team_id
+        LEFT JOIN (
+            SELECT
+                match_id, team_id,
+                countIf(card_type = 'yellow') AS yellow_cards,
+                countIf(card_type IN ('red', 'yellowRed')) AS red_cards
+            FROM football_cards FINAL
+            WHERE match_id IN %(match_ids)s
+            GROUP BY match_id, team_id
+        ) c ON c.match_id = m.match_id AND c.team_id = m.team_id
+        GROUP BY m.tournament_id, m.season_id, m.team_id
+        """
+        self.ch_client.execute(query, {'match_ids': tuple(match_ids)})
+
+    def _fold_match_stats_aggregates(self, match_ids: List[int]):
+        """Статистика матчей по сезону, команде и площадке: xG, фланги, длинные передачи, фолы, угловые"""
+        matches = """
+            SELECT match_id, season_id, home_team_id, away_team_id
+            FROM football_matches FINAL
+            WHERE match_id IN %(match_ids)s
+        """
+        stats = """
+            SELECT *
+            FROM football_match_stats FINAL
+            WHERE match_id IN %(match_ids)s
+        """
+        params = {'match_ids': tuple(match_ids)}
+        self.ch_client.execute(f"""
+        INSERT INTO team_season_match_stats_agg (
+            season_id, team_id, venue, matches, xg_sum, xg_count, total_crosses, accurate_crosses,
+            total_long_balls, accurate_long_balls, fouls, corners_for
+        )
+        SELECT
+            m.season_id, s.team_id, s.team_type,
+            count(), sumIf(toFloat64(s.expected_goals), s.expected_goals > 0), countIf(s.expected_goals > 0),
+            sum(s.total_crosses), sum(s.accurate_crosses), sum(s.total_long_balls), sum(s.accurate_long_balls),
+            sum(s.fouls), sum(s.corners)
+        FROM ({stats}) s
+        INNER JOIN ({matches}) m ON s.match_id = m.match_id
+        GROUP BY m.season_id, s.team_id, s.team_type
+        """, params)
+        # Угловые соперника засчитываются команде как пропущенные
+        self.ch_client.execute(f"""
+        INSERT INTO team_season_match_stats_agg (season_id, team_id, venue, corners_against, corners_against_matches)
+        SELECT
+            m.season_id,
+            if(s.team_type = 'home', m.away_team_id, m.home_team_id) AS against_team_id,
+            if(s.team_type = 'home', 'away', 'home') AS against_venue,
+            sum(s.corners), count()
+        FROM ({stats}) s
+        INNER JOIN ({matches}) m ON s.match_id = m.match_id
+        GROUP BY m.season_id, against_team_id, against_venue
+        """, params)
+
+    def _fold_player_aggregates(self, match_ids: List[int]):
+        """Итоги игроков по сезону: минуты, голы, передачи, рейтинг, карточки.
+
+        Вместе с суммами матчей тура пересчитываются последние оценки затронутых
+        игроков (кольцо для тренда формы) - они пишутся в player_recent_ratings
+        с версией folded_at, поэтому после слияний остается самое свежее кольцо.
+        """
+        teams = {team_id for row in self.ch_client.execute(
+            "SELECT home_team_id, away_team_id FROM football_matches FINAL WHERE match_id IN %(match_ids)s",
+            {'match_ids': tuple(match_ids)}
+        ) for team_id in row}
+        query = """
+        SELECT
+            p.season_id, p.team_id, p.player_id,
+            argMax(p.player_name, p.match_date), argMax(p.position, p.match_date),
+            countIf(p.minutes_played > 0), sum(p.minutes_played),
+            sum(p.goals), sum(p.goal_assist),
+            sum(p.total_shot), sum(p.on_target_shot), sum(p.key_pass),
+            sum(p.total_tackle), sum(p.interception_won), sum(p.fouls), sum(p.was_fouled),
+            sumIf(toFloat64(p.rating), p.rating > 0), countIf(p.rating > 0),
+            sum(c.yellow_cards), sum(c.red_cards),
+            sumIf(toFloat64(p.pass_accuracy), p.minutes_played > 0),
+            sumIf(p.duel_won * 100.0 / (p.duel_won + p.duel_lost), p.duel_won + p.duel_lost > 0),
+            countIf(p.duel_won + p.duel_lost > 0),
+            sum(p.saves)
+        FROM (
+            SELECT *
+            FROM football_player_stats FINAL
+            WHERE team_id IN %(teams)s
+            AND match_id IN %(match_ids)s
+            AND player_id != 0
+        ) p
+        LEFT JOIN (
+            SELECT
+                match_id, player_id,
+                countIf(card_type = 'yellow') AS yellow_cards,
+                countIf(card_type IN ('red', 'yellowRed')) AS red_cards
+            FROM football_cards FINAL
+            WHERE match_id IN %(match_ids)s
+            GROUP BY match_id, player_id
+        ) c ON c.match_id = p.match_id AND c.player_id = p.player_id
+        GROUP BY p.season_id, p.team_id, p.player_id
+        """
+        rows = self.ch_client.execute(query, {'match_ids': tuple(match_ids), 'teams': tuple(teams)})
+        if not rows:
+            return
+        rings = self._recent_player_ratings(rows)
+
+        self.ch_client.execute(
+            """
+            INSERT INTO player_season_agg (
+                season_id, team_id, player_id, player_name, position,
+                matches, minutes_played, goals, assists, shots, shots_on_target, key_passes,
+                tackles, interceptions, fouls, was_fouled, rating_sum, rated_matches,
+                yellow_cards, red_cards, pass_accuracy_sum, duel_success_sum, duel_matches, saves
+            ) VALUES
+            """,
+            [tuple(row) for row in rows]
+        )
+        folded_at = datetime.now()
+        self.ch_client.execute(
+            "INSERT INTO player_recent_ratings (season_id, team_id, player_id, recent_ratings, folded_at) VALUES",
+            [tuple(row[:3]) + (rings.get(tuple(row[:3]), []), folded_at) for row in rows]
+        )
+
+    def _recent_player_ratings(self, keys: List[tuple]) -> Dict[tuple, List[float]]:
+        """Последние RECENT_RATINGS оценок (матчи 45+ минут, от свежего) по (сезон, команда, игрок)"""
+        query = """
+        SELECT season_id, team_id, player_id, rating
+        FROM (
+            SELECT
+                season_id, team_id, player_id, rating,
+                row_number() OVER (PARTITION BY season_id, team_id, player_id ORDER BY match_date DESC) AS match_rank
+            FROM football_player_stats FINAL
+            WHERE season_id IN %(seasons)s
+            AND team_id IN %(teams)s
+            AND player_id IN %(players)s
+            AND minutes_played > 45
+        )
+        WHERE match_rank <= %(matches)s
+        ORDER BY season_id, team_id, player_id, match_rank
+        """
+        rings = {}
+        for season_id, team_id, player_id, rating in self.ch_client.execute(query, {
+            'seasons': tuple({key[0] for key in keys}),
+            'teams': tuple({key[1] for key in keys}),
+            'players': tuple({key[2] for key in keys}),
+            'matches': self.RECENT_RATINGS
+        }):
+            rings.setdefault((season_id, team_id, player_id), []).append(float(rating))
+        return rings
+
+    def _fold_referee_aggregates(self, match_ids: List[int]):
+        """Итоги рефери по сезону в лиге: матчи, карточки, фолы (рефери - из match_fixtures)"""
+        query = """
+        INSERT INTO referee_season_agg (
+            tournament_id, season_id, referee_id, referee_name,
+            games, yellow_cards, red_cards, fouls
+        )
+        SELECT
+            %(tournament_id)s, %(season_id)s, f.referee_id, any(f.referee_name),
+            count(), sum(c.yellow_cards), sum(c.red_cards), sum(s.fouls)
+        FROM (
+            SELECT match_id, referee_id, referee_name
+            FROM match_fixtures FINAL
+            WHERE match_id IN %(match_ids)s
+            AND referee_id != 0
+            LIMIT 1 BY match_id
+        ) f
+        LEFT JOIN (
+            SELECT
+                match_id,
+                countIf(card_type = 'yellow') AS yellow_cards,
+                countIf(card_type IN ('red', 'yellowRed')) AS red_cards
+            FROM football_cards FINAL
+            WHERE match_id IN %(match_ids)s
+            GROUP BY match_id
+        ) c ON c.match_id = f.match_id
+        LEFT JOIN (
+            SELECT match_id, sum(fouls) AS fouls
+            FROM football_match_stats FINAL
+            WHERE match_id IN %(match_ids)s
+            GROUP BY match_id
+        ) s ON s.match_id = f.match_id
+        GROUP BY f.referee_id
+        """
+        self.ch_client.execute(query, {
+            'match_ids': tuple(match_ids),
+            'tournament_id': self.tournament_id,
+            'season_id': self.season_id
+        })
+
+    def fold_match_aggregates(self, match_ids: Optional[List[int]] = None):
+        """Дописывает матчи в сезонные агрегаты команд, статистики матчей, игроков и рефери.
+
+        Агрегаты (SimpleAggregateFunction(sum)) складывают вставки, поэтому
+        обрабатываются только новые матчи: стоимость пропорциональна туру,
+        а не длине сезона. Учтенные матчи отмечаются в aggregated_matches
+        отдельно по каждому агрегату - сбой одного не приведет к повторному
+        суммированию других. Без match_ids - все завершенные матчи сезона
+        (первое заполнение).
+        """
+        try:
+            if match_ids is None:
+                match_ids = [row[0] for row in self.ch_client.execute("""
+                    SELECT match_id FROM football_matches FINAL
+                    WHERE tournament_id = %(tournament_id)s
+                    AND season_id = %(season_id)s
+                    AND status = 'Ended'
+                    """, {'tournament_id': self.tournament_id, 'season_id': self.season_id})]
+            if match_ids:
+                match_ids = self._foldable_match_ids(match_ids)
+            if not match_ids:
+                print("⏭️ Нет завершенных матчей со статистикой для агрегатов")
+                return
+        except Exception as e:
+            print(f"❌ Ошибка выбора матчей для агрегатов: {e}")
+            return
+
+        folders = {
+            'team': self._fold_team_aggregates,
+            'match_stats': self._fold_match_stats_aggregates,
+            'player': self._fold_player_aggregates,
+            'referee': self._fold_referee_aggregates
+        }
+        for aggregate, fold in folders.items():
+            try:
+                pending = self._pending_match_ids(aggregate, match_ids)
+                if not pending:
+                    print(f"⏭️ Агрегаты {aggregate}: новых матчей нет")
+                    continue
+                fold(pending)
+                self._mark_aggregated(aggregate, pending)
+                print(f"✅ Агрегаты {aggregate}: учтено {len(pending)} матчей")
+            except Exception as e:
+                print(f"❌ Ошибка обновления агрегатов {aggregate}: {e}")
+
+    def _refresh_team_stats_cache(self):
+        """Пересобирает team_stats_cache из team_season_agg без запросов к API.
+
+        Распределение голов по зонам и быстрые атаки есть только в сезонной
+        статистике API - они переносятся из последней записи кэша
+        (обновляются запуском с --full-stats).
+        """
+        query = """
+        INSERT INTO team_stats_cache (
+            team_id, tournament_id, season_id, matches_played, goals_scored, goals_conceded,
+            avg_possession, avg_shots, avg_shots_on_target, avg_corners, avg_fouls,
+            avg_yellow_cards, big_chances, big_chances_missed, goals_inside_box,
+            goals_outside_box, headed_goals, pass_accuracy, fast_breaks, updated_at
+        )
+        SELECT
+            a.team_id, %(tournament_id)s, %(season_id)s,
+            a.matches, a.goals_for, a.goals_against,
+            if(a.stats_matches > 0, a.possession_sum / a.stats_matches, 0),
+            a.shots, a.shots_on_target, a.corners, a.fouls, a.yellow_cards,
+            a.big_chances, a.big_chances_missed,
+            prev.goals_inside_box, prev.goals_outside_box, prev.headed_goals,
+            if(a.total_passes > 0, a.accurate_passes * 100 / a.total_passes, 0),
+            prev.fast_breaks,
+            now()
+        FROM (
+            SELECT
+                team_id,
+                sum(matches) AS matches, sum(goals_for) AS goals_for, sum(goals_against) AS goals_against,
+                sum(stats_matches) AS stats_matches, sum(possession_sum) AS possession_sum,
+                sum(shots) AS shots, sum(shots_on_target) AS shots_on_target,
+                sum(corners) AS corners, sum(fouls) AS fouls, sum(yellow_cards) AS yellow_cards,
+                sum(big_chances) AS big_chances, sum(big_chances_missed) AS big_chances_missed,
+                sum(total_passes) AS total_passes, sum(accurate_passes) AS accurate_passes
+            FROM team_season_agg
+            WHERE tournament_id = %(tournament_id)s
+            AND season_id = %(season_id)s
+            GROUP BY team_id
+        ) a
+        LEFT JOIN (
+            SELECT team_id, goals_inside_box, goals_outside_box, headed_goals, fast_breaks
+            FROM team_stats_cache
+            WHERE tournament_id = %(tournament_id)s
+            AND season_id = %(season_id)s
+            ORDER BY updated_at DESC
+            LIMIT 1 BY team_id
+        ) prev ON prev.team_id = a.team_id
+        """
+        try:
+            self.ch_client.execute(query, {'tournament_id': self.tournament_id, 'season_id': self.season_id})
+            print("✅ team_stats_cache пересобрана из сезонных агрегатов")
+        except Exception as e:
+            print(f"❌ Ошибка обновления team_stats_cache из агрегатов: {e}")
+
     def _insert_team_positions_cache(self, positions_data: List[Dict[str, Any]]):
         """Вставляет данные в team_positions_cache"""
         try:
@@ -493,8 +884,13 @@ class FootballDataOrchestrator:
         except Exception as e:
             print(f"❌ Ошибка вставки в team_stats_cache: {e}")
 
-    async def update_cache_tables(self):
-        """Обновляет кэш-таблицы с актуальными данными"""
+    async def update_cache_tables(self, full_stats: bool = False):
+        """Обновляет кэш-таблицы с актуальными данными.
+
+        Позиции - из турнирной таблицы API (один запрос). Статистика команд
+        по умолчанию собирается из сезонных агрегатов; full_stats - заново
+        запросить сезонную статистику каждой команды из API.
+        """
         print("🔄 Обновление кэш-таблиц...")
         
         async with FootballDataCollector() as collector:
@@ -547,6 +943,9 @@ class FootballDataOrchestrator:
                         }
                         positions_data.append(position_data)
                         
+                        if not full_stats:
+                            continue
+                        
                         # Получаем детальную статистику команды
                         team_stats = await collector.get_team_season_stats(team_id, self.tournament_id, self.season_id)
                         if team_stats:
@@ -583,8 +982,10 @@ class FootballDataOrchestrator:
             
             if stats_data:
                 self._insert_team_stats_cache(stats_data)
+            elif not full_stats:
+                self._refresh_team_stats_cache()
             
-            print(f"🎉 Кэш-таблицы обновлены: {len(positions_data)} позиций, {len(stats_data)} статистик")
+            print(f"🎉 Кэш-таблицы обновлены: {len(positions_data)} позиций, {len(stats_data)} статистик из API")
     async def process_upcoming_fixtures(self, round_number: int):
         """Обрабатывает предстоящие матчи и заполняет fixtures"""
         print(f"🔮 Обработка fixtures для тура {round_number}")
@@ -626,9 +1027,73 @@ class FootballDataOrchestrator:
                 self._insert_match_fixtures(fixtures_data)
                 print(f"🎉 Fixtures обновлены: {len(fixtures_data)} матчей тура {round_number}")
 
-def check_database_state(host, user, password, database):
+    def backfill_match_columns(self):
+        """Однократно заполняет tournament_id, season_id, match_date (и команды карточек)
+        в строках, загруженных до денормализации"""
+        print("🔄 Заполнение полей матча в таблицах статистики и карточек...")
+        # joinGet в мутациях требует allow_nondeterministic_mutations
+        settings = {'mutations_sync': 1, 'allow_nondeterministic_mutations': 1}
+        match_columns = """
+            tournament_id = joinGet('match_columns_join', 'tournament_id', match_id),
+            season_id = joinGet('match_columns_join', 'season_id', match_id),
+            match_date = joinGet('match_columns_join', 'match_date', match_id)
+        """
+        try:
+            self.ch_client.execute("DROP TABLE IF EXISTS match_columns_join")
+            self.ch_client.execute("""
+            CREATE TABLE match_columns_join
+            ENGINE = Join(ANY, LEFT, match_id) AS
+            SELECT match_id, tournament_id, season_id, match_date, home_team_id, away_team_id
+            FROM football_matches FINAL
+            """)
+            
+            for table in ('football_match_stats', 'football_player_stats'):
+                self.ch_client.execute(
+                    f"ALTER TABLE {table} UPDATE {match_columns} WHERE season_id = 0",
+                    settings=settings
+                )
+                print(f"✅ {table} обновлена")
+            
+            self.ch_client.execute(f"""
+            ALTER TABLE football_cards UPDATE
+                {match_columns},
+                team_id = if(team_is_home = 1,
+                    joinGet('match_columns_join', 'home_team_id', match_id),
+                    joinGet('match_columns_join', 'away_team_id', match_id)),
+                opponent_team_id = if(team_is_home = 1,
+                    joinGet('match_columns_join', 'away_team_id', match_id),
+                    joinGet('match_columns_join', 'home_team_id', match_id))
+            WHERE season_id = 0
+            """, settings=settings)
+            print("✅ football_cards обновлена")
+            
+        except Exception as e:
+            print(f"❌ Ошибка заполнения полей матча: {e}")
+        finally:
+            self.ch_client.execute("DROP TABLE IF EXISTS match_columns_join")
+
+    def bump_data_version(self, source: str, all_leagues: bool = False):
+        """Увеличивает версию данных лиги, чтобы бот перестал брать из кэша ее агрегаты и отчеты.
+
+        Версии всех лиг - один счетчик; all_leagues - загрузка, затрагивающая
+        все лиги (строка с tournament_id = 0).
+        """
+        try:
+            tournament_id, season_id = (0, 0) if all_leagues else (self.tournament_id, self.season_id)
+            query = """
+            INSERT INTO data_version (version, source, tournament_id, season_id)
+            SELECT max(version) + 1, %(source)s, %(tournament_id)s, %(season_id)s FROM data_version
+            """
+            self.ch_client.execute(query, {'source': source, 'tournament_id': tournament_id, 'season_id': season_id})
+            version = self.ch_client.execute("SELECT max(version) FROM data_version")[0][0]
+            print(f"✅ Версия данных обновлена: {version} ({source})")
+            
+        except Exception as e:
+            print(f"❌ Ошибка обновления версии данных: {e}")
+
+def check_database_state(host, user, password, database, ch_client=None):
     """Проверяет состояние базы данных"""
-    ch_client = Client(
+    ch_client = ch_client or Client(
         host=host,
         user=user,
         password=password,
@@ -659,21 +1124,36 @@ async def main():
     parser.add_argument('--password', default=os.getenv('CLICKHOUSE_PASSWORD', ''), help='ClickHouse password')
     parser.add_argument('--database', default=os.getenv('CLICKHOUSE_DB', 'football_db'), help='ClickHouse database name')
     parser.add_argument('--port', type=int, default=os.getenv('CLICKHOUSE_PORT', 9000), help='ClickHouse port')
+    parser.add_argument('--engine', choices=('clickhouse', 'duckdb'), default=os.getenv('STORAGE_ENGINE', 'clickhouse'),
+                        help='Хранилище: сервер ClickHouse или встроенная база DuckDB')
+    parser.add_argument('--duckdb-path', default=os.getenv('DUCKDB_PATH', 'football.duckdb'), help='Файл базы DuckDB')
     
     # Новые аргументы для выбора операций
     parser.add_argument('--historical', action='store_true', help='Обработать исторические данные тура')
     parser.add_argument('--fixtures', action='store_true', help='Загрузить fixtures для следующего тура')
     parser.add_argument('--cache', action='store_true', help='Обновить кэш-таблицы')
     parser.add_argument('--all', action='store_true', help='Выполнить все операции (historical + fixtures + cache)')
+    parser.add_argument('--backfill', action='store_true', help='Заполнить поля матча в ранее загруженных статистике и карточках')
+    parser.add_argument('--full-stats', action='store_true', help='Запросить сезонную статистику каждой команды из API вместо агрегатов')
+    parser.add_argument('--aggregate', action='store_true', help='Учесть в сезонных агрегатах все еще не учтенные матчи сезона')
         
     args = parser.parse_args()
         
     print(f"🚀 Запуск обработки в {datetime.now()}")
-    print(f"📊 Подключение к БД: {args.host}:{args.port}/{args.database}")
+    storage = None
+    if args.engine == 'duckdb':
+        from duckdb_client import DuckDBClient
+        storage = DuckDBClient(args.duckdb_path)
+        if not storage.tables:
+            print(f"❌ Во встроенной базе {args.duckdb_path} нет схемы: python storage_backends.py --init")
+            return
+        print(f"📊 Встроенная база DuckDB: {args.duckdb_path}")
+    else:
+        print(f"📊 Подключение к БД: {args.host}:{args.port}/{args.database}")
     
     # Проверяем состояние базы
     print("\n🔍 Проверяем текущее состояние базы данных...")
-    has_data = check_database_state(args.host, args.user, args.password, args.database)
+    has_data = check_database_state(args.host, args.user, args.password, args.database, storage)
     
     orchestrator = FootballDataOrchestrator(
         ch_host=args.host,
@@ -681,10 +1161,23 @@ async def main():
         ch_password=args.password,
         ch_database=args.database,
         tournament_id=args.tournament,
-        season_id=args.season
+        season_id=args.season,
+        ch_client=storage
     )
         
     try:
+        if args.backfill:
+            orchestrator.backfill_match_columns()
+            orchestrator.bump_data_version("backfill match columns", all_leagues=True)
+            if not args.round:
+                return
+        
+        if args.aggregate:
+            orchestrator.fold_match_aggregates()
+            orchestrator.bump_data_version("fold season aggregates")
+            if not args.round:
+                return
+        
         if not args.round:
             print("❌ Укажите --round для обработки данных")
             return
@@ -710,13 +1203,19 @@ async def main():
         
         if run_cache:
             print(f"\n🔄 Обновление кэш-таблиц...")
-            await orchestrator.update_cache_tables()
+            await orchestrator.update_cache_tables(full_stats=args.full_stats)
+        
+        # Новая версия данных лиги сбрасывает кэш ее агрегатов в боте
+        if run_historical or run_fixtures or run_cache:
+            orchestrator.bump_data_version(
+                f"tournament={args.tournament} season={args.season} round={args.round}"
+            )
         
         print(f"\n🎉 Обработка завершена!")
         
         # Проверяем результат
         print("\n🔍 Проверяем результат после обработки...")
-        check_database_state(args.host, args.user, args.password, args.database)
+        check_database_state(args.host, args.user, args.password, args.database, storage)
         
         print(f"\n✅ Все операции завершены успешно!")
         
@@ -0,0 +1,49 @@
+from football_match_forecast import AdvancedFootballAnalyzer
+from clickhouse_async import AsyncClickHouse
+from storage_backends import create_storage
+import argparse
+import asyncio
+import csv
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def export_league_matrix(ch_client: AsyncClickHouse, tournament_id: int, season_id: int, output) -> int:
+    """Пишет в CSV прогнозы для всех пар команд лиги (LeagueMatrix.records), возвращает число строк"""
+    async with AdvancedFootballAnalyzer(ch_client) as analyzer:
+        matrix = await analyzer.get_league_matrix(tournament_id, season_id)
+
+    records = list(matrix.records())
+    if not records:
+        print(f"⚠️ Нет данных для прогнозов лиги {tournament_id}/{season_id}", file=sys.stderr)
+        return 0
+
+    writer = csv.DictWriter(output, fieldnames=list(records[0]))
+    writer.writeheader()
+    writer.writerows(records)
+    return len(records)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Выгрузка прогнозов для всех пар команд лиги в CSV')
+    parser.add_argument('--tournament', required=True, type=int, help='ID турнира')
+    parser.add_argument('--season', required=True, type=int, help='ID сезона')
+    parser.add_argument('--output', help='Файл CSV (по умолчанию - stdout)')
+    args = parser.parse_args()
+
+    ch_client = create_storage()
+    try:
+        if args.output:
+            with open(args.output, 'w', newline='', encoding='utf-8') as output:
+                exported = await export_league_matrix(ch_client, args.tournament, args.season, output)
+            print(f"✅ Выгружено {exported} пар команд в {args.output}")
+        else:
+            await export_league_matrix(ch_client, args.tournament, args.season, sys.stdout)
+    finally:
+        ch_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,26 +1,46 @@
 import pandas as pd
-from clickhouse_driver import Client
+from clickhouse_async import AsyncClickHouse
+from storage_backends import create_storage
+from aggregates_cache import AggregatesCache
+from standings_snapshot import StandingsStore
+from league_matrix import LeagueMatrix
+from goal_model import GoalModel
 import os
 import asyncio
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
+from match_data_loader import MatchDataLoader
+from match_analysis import MatchAnalysis, SECTION_ORDER, required_datasets
 
 class AdvancedFootballAnalyzer:
-    def __init__(self):
-        self.ch_client = None
+    def __init__(self, ch_client: AsyncClickHouse = None, cache: AggregatesCache = None,
+                 standings: StandingsStore = None):
+        # Общий клиент с пулом соединений передается ботом; без него создается собственный
+        self.ch_client = ch_client
+        self._owns_client = ch_client is None
+        # Общий кэш командных агрегатов (необязателен - без него запросы идут в БД)
+        self.cache = cache
+        # Снимки турнирных таблиц; без общего хранилища - собственное на время жизни анализатора
+        self.standings = standings if standings is not None else StandingsStore(cache)
 
     async def __aenter__(self):
-        self.ch_client = Client(
-            host='localhost',
-            user='username', 
-            password='password',
-            database='football_db'
-        )
+        if self.ch_client is None:
+            self.ch_client = create_storage()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.ch_client:
-            self.ch_client.disconnect()
+        if self.ch_client and self._owns_client:
+            self.ch_client.close()
+            self.ch_client = None
+
+    async def _execute_cached(self, name: str, key: tuple, query: str, params: Dict[str, Any]) -> List:
+        """Выполняет запрос через кэш агрегатов (ключ - name, key и версия данных лиги из params)"""
+        if self.cache is None:
+            return await self.ch_client.execute(query, params, query_name=name)
+        return await self.cache.get_or_load(
+            self.ch_client, name, key, lambda: self.ch_client.execute(query, params, query_name=name),
+            params.get('tournament_id'), params.get('season_id')
+        )
 
     # Словарь дерби
     DERBY_PAIRS = {
@@ -83,7 +103,7 @@ class AdvancedFootballAnalyzer:
     }
 
     # Существующие методы получения статистики (без изменений)
-    def get_team_stats_from_db(self, team_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
+    async def get_team_stats_from_db(self, team_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
         """Получает статистику команды из кэш-таблицы"""
         try:
             query = """
@@ -100,7 +120,7 @@ class AdvancedFootballAnalyzer:
             LIMIT 1
             """
             
-            result = self.ch_client.execute(query, {
+            result = await self._execute_cached('team_stats', (team_id, tournament_id, season_id), query, {
                 'team_id': team_id,
                 'tournament_id': tournament_id,
                 'season_id': season_id
@@ -132,95 +152,41 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения статистики команды {team_id} из БД: {e}")
             return {}
 
-    def get_team_position_from_db(self, team_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
-        """Получает позицию и динамику команды из кэш-таблицы"""
+    async def get_team_position_from_db(self, team_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
+        """Получает позицию и динамику команды из снимка турнирной таблицы"""
         try:
-            query = """
-            SELECT 
-                position, points, goal_difference, matches_played,
-                wins, draws, losses, goals_for, goals_against,
-                form, trend, last_updated_round
-            FROM team_positions_cache 
-            WHERE team_id = %(team_id)s 
-            AND tournament_id = %(tournament_id)s 
-            AND season_id = %(season_id)s
-            ORDER BY updated_at DESC 
-            LIMIT 1
-            """
-            
-            result = self.ch_client.execute(query, {
-                'team_id': team_id,
-                'tournament_id': tournament_id,
-                'season_id': season_id
-            })
-            
-            if result:
-                return {
-                    'position': result[0][0],
-                    'points': result[0][1],
-                    'goal_difference': result[0][2],
-                    'matches_played': result[0][3],
-                    'wins': result[0][4],
-                    'draws': result[0][5],
-                    'losses': result[0][6],
-                    'goals_for': result[0][7],
-                    'goals_against': result[0][8],
-                    'form': result[0][9],
-                    'trend': result[0][10],
-                    'last_updated_round': result[0][11]
-                }
-            return {}
+            snapshot = await self.standings.get(self.ch_client, tournament_id, season_id)
+            return snapshot.team(team_id)
             
         except Exception as e:
             print(f"❌ Ошибка получения позиции команды {team_id}: {e}")
             return {}
 
-    def get_current_standings(self, tournament_id: int, season_id: int) -> Dict[int, int]:
-        """Получает текущую таблицу турнира из кэш-таблицы"""
+    async def get_current_standings(self, tournament_id: int, season_id: int) -> Dict[int, int]:
+        """Получает текущую таблицу турнира из снимка турнирной таблицы"""
         try:
-            query = """
-            SELECT team_id, position
-            FROM team_positions_cache 
-            WHERE tournament_id = %(tournament_id)s 
-            AND season_id = %(season_id)s
-            ORDER BY position
-            """
-            
-            results = self.ch_client.execute(query, {
-                'tournament_id': tournament_id,
-                'season_id': season_id
-            })
-            
-            standings = {}
-            for team_id, position in results:
-                standings[team_id] = position
-                
-            return standings
+            snapshot = await self.standings.get(self.ch_client, tournament_id, season_id)
+            return snapshot.standings()
             
         except Exception as e:
             print(f"❌ Ошибка получения таблицы из БД: {e}")
             return {}
 
-    def get_team_xg_from_db(self, team1_id: int, team2_id: int, season_id: int) -> Tuple[float, float]:
-        """Получает xG статистику команд из football_match_stats"""
+    async def get_team_xg_from_db(self, team1_id: int, team2_id: int, season_id: int) -> Tuple[float, float]:
+        """Получает xG статистику команд из агрегатов football_match_stats"""
         try:
             query = """
             SELECT 
                 team_id,
-                AVG(expected_goals) as avg_xg
-            FROM football_match_stats
+                sum(xg_sum) / sum(xg_count) as avg_xg
+            FROM team_season_match_stats_agg
             WHERE team_id IN (%(team1)s, %(team2)s)
-            AND match_id IN (
-                SELECT match_id FROM football_matches 
-                WHERE season_id = %(season_id)s 
-                AND status = 'Ended'
-            )
-            AND expected_goals IS NOT NULL
-            AND expected_goals > 0
+            AND season_id = %(season_id)s
             GROUP BY team_id
+            HAVING sum(xg_count) > 0
             """
             
-            results = self.ch_client.execute(query, {
+            results = await self._execute_cached('team_xg', (team1_id, team2_id, season_id), query, {
                 'team1': team1_id, 
                 'team2': team2_id, 
                 'season_id': season_id
@@ -263,30 +229,28 @@ class AdvancedFootballAnalyzer:
         
         return str(current_position), trend_icons.get(trend, '🟡 стабильно')
 
-    def get_team_crosses_longballs_from_db(self, team1_id: int, team2_id: int, season_id: int) -> Dict[str, Any]:
+    async def get_team_crosses_longballs_from_db(self, team1_id: int, team2_id: int, season_id: int) -> Dict[str, Any]:
         """Получает данные о кроссах и длинных передачах"""
         try:
             query = """
             SELECT 
                 team_id,
-                AVG(total_crosses) as avg_total_crosses,
-                AVG(accurate_crosses) as avg_accurate_crosses,
-                AVG(total_long_balls) as avg_total_long_balls,
-                AVG(accurate_long_balls) as avg_accurate_long_balls
-            FROM football_match_stats 
+                sum(total_crosses) / sum(matches) as avg_total_crosses,
+                sum(accurate_crosses) / sum(matches) as avg_accurate_crosses,
+                sum(total_long_balls) / sum(matches) as avg_total_long_balls,
+                sum(accurate_long_balls) / sum(matches) as avg_accurate_long_balls
+            FROM team_season_match_stats_agg
             WHERE team_id IN (%(team1)s, %(team2)s)
-            AND match_id IN (
-                SELECT match_id FROM football_matches 
-                WHERE season_id = %(season_id)s AND status = 'Ended'
-            )
+            AND season_id = %(season_id)s
             GROUP BY team_id
+            HAVING sum(matches) > 0
             """
             
-            results = self.ch_client.execute(query, {
+            results = await self.ch_client.execute(query, {
                 'team1': team1_id,
                 'team2': team2_id, 
                 'season_id': season_id
-            })
+            }, query_name='team_crosses_longballs')
             
             stats = {}
             for team_id, avg_crosses, avg_accurate_crosses, avg_long_balls, avg_accurate_long_balls in results:
@@ -306,27 +270,25 @@ class AdvancedFootballAnalyzer:
 
 
     # НОВЫЕ МЕТОДЫ ДЛЯ УЛУЧШЕННОГО ПРОГНОЗА ЖЕЛТЫХ КАРТОЧЕК
-    def _get_team_yellow_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
+    async def _get_team_yellow_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
         """Получает статистику желтых карточек команды"""
         try:
             query = """
-            WITH team_matches AS (
-                SELECT match_id, home_team_id as team_id FROM football_matches 
-                WHERE home_team_id = %(team_id)s AND season_id = %(season_id)s AND status = 'Ended'
-                UNION ALL
-                SELECT match_id, away_team_id as team_id FROM football_matches 
-                WHERE away_team_id = %(team_id)s AND season_id = %(season_id)s AND status = 'Ended'
-            )
             SELECT 
-                COUNT(DISTINCT fc.match_id) as matches_count,
-                COUNT(fc.card_type) as total_yellows,
-                COUNT(fc.card_type) * 1.0 / COUNT(DISTINCT fc.match_id) as avg_yellows_per_match
-            FROM football_cards fc
-            JOIN team_matches tm ON fc.match_id = tm.match_id
-            WHERE fc.card_type = 'yellow'
+                COUNT(DISTINCT match_id) as matches_count,
+                COUNT(card_type) as total_yellows,
+                COUNT(card_type) * 1.0 / COUNT(DISTINCT match_id) as avg_yellows_per_match
+            FROM football_cards FINAL
+            WHERE card_type = 'yellow'
+                AND season_id = %(season_id)s
+                AND match_id IN (
+                    SELECT match_id FROM team_matches
+                    WHERE team_id = %(team_id)s AND season_id = %(season_id)s
+                )
+                AND (team_id = %(team_id)s OR opponent_team_id = %(team_id)s)
             """
             
-            result = self.ch_client.execute(query, {
+            result = await self._execute_cached('team_yellows', (team_id, season_id), query, {
                 'team_id': team_id,
                 'season_id': season_id
             })
@@ -344,31 +306,33 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения статистики карточек команды {team_id}: {e}")
             return {'matches_count': 0, 'total_yellows': 0, 'avg_yellows': 2.0}
 
-    def _get_team_home_away_yellow_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
+    async def _get_team_home_away_yellow_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
         """Получает домашние/гостевые показатели карточек"""
         try:
             query = """
             SELECT 
                 CASE 
-                    WHEN fm.home_team_id = %(team_id)s THEN 'home'
+                    WHEN (team_id = %(team_id)s) = (team_is_home = 1) THEN 'home'
                     ELSE 'away'
                 END as venue,
-                COUNT(DISTINCT fc.match_id) as matches_count,
-                COUNT(fc.card_type) as total_yellows,
-                COUNT(fc.card_type) * 1.0 / COUNT(DISTINCT fc.match_id) as avg_yellows
-            FROM football_cards fc
-            JOIN football_matches fm ON fc.match_id = fm.match_id
-            WHERE fc.card_type = 'yellow'
-                AND (fm.home_team_id = %(team_id)s OR fm.away_team_id = %(team_id)s)
-                AND fm.season_id = %(season_id)s
-                AND fm.status = 'Ended'
+                COUNT(DISTINCT match_id) as matches_count,
+                COUNT(card_type) as total_yellows,
+                COUNT(card_type) * 1.0 / COUNT(DISTINCT match_id) as avg_yellows
+            FROM football_cards FINAL
+            WHERE card_type = 'yellow'
+                AND season_id = %(season_id)s
+                AND match_id IN (
+                    SELECT match_id FROM team_matches
+                    WHERE team_id = %(team_id)s AND season_id = %(season_id)s
+                )
+                AND (team_id = %(team_id)s OR opponent_team_id = %(team_id)s)
             GROUP BY venue
             """
             
-            results = self.ch_client.execute(query, {
+            results = await self.ch_client.execute(query, {
                 'team_id': team_id,
                 'season_id': season_id
-            })
+            }, query_name='team_home_away_yellows')
             
             stats = {'home': {'avg_yellows': 2.0}, 'away': {'avg_yellows': 2.0}}
             
@@ -392,7 +356,7 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения домашних/гостевых карточек команды {team_id}: {e}")
             return {'home': {'avg_yellows': 2.0}, 'away': {'avg_yellows': 2.0}}
 
-    def _get_referee_yellow_stats(self, referee_id: int, tournament_id: int) -> Dict[str, Any]:
+    async def _get_referee_yellow_stats(self, referee_id: int, tournament_id: int) -> Dict[str, Any]:
         """Получает статистику желтых карточек рефери"""
         try:
             query = """
@@ -409,10 +373,10 @@ class AdvancedFootballAnalyzer:
             LIMIT 1
             """
             
-            result = self.ch_client.execute(query, {
+            result = await self.ch_client.execute(query, {
                 'referee_id': referee_id,
                 'tournament_id': tournament_id
-            })
+            }, query_name='referee_yellows')
             
             if result:
                 name, total_yellows, games, avg_yellows = result[0]
@@ -428,58 +392,35 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения статистики рефери {referee_id}: {e}")
             return {'name': 'Неизвестно', 'total_yellows': 0, 'games': 0, 'avg_yellows': 3.0}
 
-    def _get_h2h_yellow_stats(self, team1_id: int, team2_id: int) -> Dict[str, Any]:
+    async def _get_h2h_yellow_stats(self, team1_id: int, team2_id: int) -> Dict[str, Any]:
         """Получает историю желтых карточек в личных встречах"""
         try:
-            query = """
-            SELECT 
-                COUNT(DISTINCT fm.match_id) as matches_count,
-                COUNT(fc.card_type) as total_yellows,
-                COUNT(fc.card_type) * 1.0 / COUNT(DISTINCT fm.match_id) as avg_yellows
-            FROM football_matches fm
-            JOIN football_cards fc ON fm.match_id = fc.match_id
-            WHERE ((fm.home_team_id = %(team1)s AND fm.away_team_id = %(team2)s)
-                OR (fm.home_team_id = %(team2)s AND fm.away_team_id = %(team1)s))
-                AND fm.status = 'Ended'
-                AND fc.card_type = 'yellow'
-            """
+            pairs = (MatchDataLoader.pair_key(team1_id, team2_id),)
+            result = await self._execute_cached('h2h', (pairs,), MatchDataLoader.H2H_QUERY, {'pairs': pairs})
             
-            result = self.ch_client.execute(query, {
-                'team1': team1_id,
-                'team2': team2_id
-            })
-            
-            if result and result[0][0] > 0:
-                matches_count, total_yellows, avg_yellows = result[0]
-                return {
-                    'matches_count': matches_count,
-                    'total_yellows': total_yellows,
-                    'avg_yellows': round(avg_yellows, 2)
-                }
-            return {'matches_count': 0, 'total_yellows': 0, 'avg_yellows': 3.0}
+            return MatchDataLoader.parse_h2h(result, team1_id, team2_id)['h2h_yellow_stats']
             
         except Exception as e:
             print(f"❌ Ошибка получения H2H статистики карточек: {e}")
             return {'matches_count': 0, 'total_yellows': 0, 'avg_yellows': 3.0}
 
-    def _get_team_fouls_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
+    async def _get_team_fouls_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
         """Получает статистику фолов команды"""
         try:
             query = """
             SELECT 
-                AVG(fouls) as avg_fouls
-            FROM football_match_stats 
+                sum(fouls) / sum(matches) as avg_fouls
+            FROM team_season_match_stats_agg
             WHERE team_id = %(team_id)s
-                AND match_id IN (
-                    SELECT match_id FROM football_matches 
-                    WHERE season_id = %(season_id)s AND status = 'Ended'
-                )
+            AND season_id = %(season_id)s
+            GROUP BY team_id
+            HAVING sum(matches) > 0
             """
             
-            result = self.ch_client.execute(query, {
+            result = await self.ch_client.execute(query, {
                 'team_id': team_id,
                 'season_id': season_id
-            })
+            }, query_name='team_fouls')
             
             if result and result[0][0] is not None:
                 return {'avg_fouls': round(result[0][0], 2)}
@@ -489,35 +430,13 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения статистики фолов команды {team_id}: {e}")
             return {'avg_fouls': 12.0}
 
-    def _get_position_diff(self, team1_id: int, team2_id: int, tournament_id: int, season_id: int) -> int:
+    async def _get_position_diff(self, team1_id: int, team2_id: int, tournament_id: int, season_id: int) -> int:
         """Получает разницу позиций в таблице"""
         try:
-            query = """
-            SELECT 
-                t1.position as pos1,
-                t2.position as pos2
-            FROM team_positions_cache t1
-            CROSS JOIN team_positions_cache t2
-            WHERE t1.team_id = %(team1)s 
-                AND t2.team_id = %(team2)s
-                AND t1.tournament_id = %(tournament_id)s
-                AND t2.tournament_id = %(tournament_id)s
-                AND t1.season_id = %(season_id)s
-                AND t2.season_id = %(season_id)s
-            ORDER BY t1.updated_at DESC, t2.updated_at DESC
-            LIMIT 1
-            """
-            
-            result = self.ch_client.execute(query, {
-                'team1': team1_id,
-                'team2': team2_id,
-                'tournament_id': tournament_id,
-                'season_id': season_id
-            })
-            
-            if result and result[0][0] is not None and result[0][1] is not None:
-                pos1, pos2 = result[0]
-                return abs(pos1 - pos2)
+            snapshot = await self.standings.get(self.ch_client, tournament_id, season_id)
+            position_diff = snapshot.position_diff(team1_id, team2_id)
+            if position_diff is not None:
+                return position_diff
             
             # Если данных нет - возвращаем 0 (равные команды)
             print(f"⚠️ Не удалось получить позиции для команд {team1_id} и {team2_id}")
@@ -526,28 +445,34 @@ class AdvancedFootballAnalyzer:
         except Exception as e:
             print(f"❌ Ошибка получения разницы позиций: {e}")
             return 0
+
+    def _position_diff_from_standings(self, standings: Dict[int, int], team1_id: int, team2_id: int) -> int:
+        """Разница позиций по уже загруженной таблице"""
+        if team1_id in standings and team2_id in standings:
+            return abs(standings[team1_id] - standings[team2_id])
+        print(f"⚠️ Не удалось получить позиции для команд {team1_id} и {team2_id}")
+        return 0
         
-    def get_opponent_yellow_cards_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
+    async def get_opponent_yellow_cards_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
         """Получает статистику желтых карточек, которые команда провоцирует у соперников"""
         try:
             query = """
             SELECT 
                 COUNT(*) as total_opponent_yellows,
-                COUNT(DISTINCT fc.match_id) as matches_with_opponent_cards,
-                COUNT(*) * 1.0 / COUNT(DISTINCT fc.match_id) as avg_opponent_yellows_per_match
-            FROM football_cards fc
-            JOIN football_matches fm ON fc.match_id = fm.match_id
-            WHERE (fm.home_team_id = %(team_id)s OR fm.away_team_id = %(team_id)s)
-            AND fm.season_id = %(season_id)s
-            AND fm.status = 'Ended'
-            AND fc.card_type = 'yellow'
-            AND fc.team_is_home != CASE 
-                WHEN fm.home_team_id = %(team_id)s THEN 1 
-                ELSE 0 
-            END  -- Карточки у СОПЕРНИКА
+                COUNT(DISTINCT match_id) as matches_with_opponent_cards,
+                COUNT(*) * 1.0 / COUNT(DISTINCT match_id) as avg_opponent_yellows_per_match
+            FROM football_cards FINAL
+            WHERE opponent_team_id = %(team_id)s  -- Карточки у СОПЕРНИКА
+            AND season_id = %(season_id)s
+            AND match_id IN (
+                SELECT match_id FROM team_matches
+                WHERE team_id = %(team_id)s AND season_id = %(season_id)s
+            )
+            AND card_type = 'yellow'
             """
             
-            result = self.ch_client.execute(query, {'team_id': team_id, 'season_id': season_id})
+            result = await self.ch_client.execute(query, {'team_id': team_id, 'season_id': season_id},
+                                                  query_name='opponent_yellows')
             
             if result and result[0][0] > 0:
                 total_opponent_yellows, matches_with_cards, avg_opponent_yellows = result[0]
@@ -574,23 +499,42 @@ class AdvancedFootballAnalyzer:
         
         return False, ""
 
-    def predict_yellow_cards(self, team1_id: int, team2_id: int, referee_id: int, 
+    async def predict_yellow_cards(self, team1_id: int, team2_id: int, referee_id: int, 
                             tournament_id: int, season_id: int) -> Dict[str, Any]:
         """УЛУЧШЕННЫЙ прогноз желтых карточек с реальными данными"""
         try:
-            # 1. Получаем данные по командам
-            team1_home_away = self._get_team_home_away_yellow_stats(team1_id, season_id)
-            team2_home_away = self._get_team_home_away_yellow_stats(team2_id, season_id)
-            
-            team1_fouls = self._get_team_fouls_stats(team1_id, season_id)
-            team2_fouls = self._get_team_fouls_stats(team2_id, season_id)
+            # Независимые запросы выполняются параллельно
+            (team1_home_away, team2_home_away,
+             team1_fouls, team2_fouls,
+             referee_stats, h2h_stats, position_diff) = await asyncio.gather(
+                # 1. Данные по командам
+                self._get_team_home_away_yellow_stats(team1_id, season_id),
+                self._get_team_home_away_yellow_stats(team2_id, season_id),
+                self._get_team_fouls_stats(team1_id, season_id),
+                self._get_team_fouls_stats(team2_id, season_id),
+                # 2. Данные по рефери
+                self._get_referee_yellow_stats(referee_id, tournament_id),
+                # 3. Контекстные данные
+                self._get_h2h_yellow_stats(team1_id, team2_id),
+                self._get_position_diff(team1_id, team2_id, tournament_id, season_id)
+            )
             
-            # 2. Получаем данные по рефери
-            referee_stats = self._get_referee_yellow_stats(referee_id, tournament_id)
+            return self.calculate_yellow_cards_prediction(
+                team1_id, team2_id, team1_home_away, team2_home_away,
+                team1_fouls, team2_fouls, referee_stats, h2h_stats, position_diff
+            )
             
-            # 3. Получаем контекстные данные
-            h2h_stats = self._get_h2h_yellow_stats(team1_id, team2_id)
-            position_diff = self._get_position_diff(team1_id, team2_id, tournament_id, season_id)
+        except Exception as e:
+            print(f"❌ Ошибка улучшенного прогноза желтых карточек: {e}")
+            return {}
+
+    def calculate_yellow_cards_prediction(self, team1_id: int, team2_id: int,
+                                          team1_home_away: Dict, team2_home_away: Dict,
+                                          team1_fouls: Dict, team2_fouls: Dict,
+                                          referee_stats: Dict, h2h_stats: Dict,
+                                          position_diff: int) -> Dict[str, Any]:
+        """Расчет прогноза желтых карточек по уже загруженным данным"""
+        try:
             is_derby, derby_name = self._is_derby(team1_id, team2_id)
             
             # 4. Расчет прогноза (40% команды + 40% рефери + 20% контекст)
@@ -660,7 +604,7 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка улучшенного прогноза желтых карточек: {e}")
             return {}
 
-    def get_referee_stats_from_db(self, referee_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
+    async def get_referee_stats_from_db(self, referee_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
         """Получает статистику рефери из БД"""
         try:
             query = """
@@ -674,11 +618,11 @@ class AdvancedFootballAnalyzer:
             LIMIT 1
             """
             
-            result = self.ch_client.execute(query, {
+            result = await self.ch_client.execute(query, {
                 'referee_id': referee_id,
                 'tournament_id': tournament_id,
                 'season_id': season_id
-            })
+            }, query_name='referee_stats')
             
             if result:
                 return {
@@ -696,7 +640,7 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения статистики рефери: {e}")
             return {}
 
-    def get_match_referee(self, home_team_id: int, away_team_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
+    async def get_match_referee(self, home_team_id: int, away_team_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
         """Получает информацию о рефери для предстоящего матча"""
         try:
             query = """
@@ -712,12 +656,12 @@ class AdvancedFootballAnalyzer:
             LIMIT 1
             """
             
-            result = self.ch_client.execute(query, {
+            result = await self.ch_client.execute(query, {
                 'home_team_id': home_team_id,
                 'away_team_id': away_team_id, 
                 'tournament_id': tournament_id,
                 'season_id': season_id
-            })
+            }, query_name='match_referee')
             
             if result:
                 return {
@@ -735,43 +679,29 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения рефери матча: {e}")
             return {}
 
-    def get_team_home_away_performance(self, team_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
+    async def get_team_home_away_performance(self, team_id: int, tournament_id: int, season_id: int) -> Dict[str, Any]:
         """Получает показатели команды дома и в гостях"""
         try:
             query = """
             SELECT 
-                CASE 
-                    WHEN fm.home_team_id = %(team_id)s THEN 'home'
-                    ELSE 'away'
-                END as match_type,
+                venue as match_type,
                 COUNT(*) as matches,
-                AVG(CASE 
-                    WHEN fm.home_team_id = %(team_id)s THEN fm.home_score
-                    ELSE fm.away_score 
-                END) as avg_goals_scored,
-                AVG(CASE 
-                    WHEN fm.home_team_id = %(team_id)s THEN fm.away_score
-                    ELSE fm.home_score 
-                END) as avg_goals_conceded,
-                AVG(CASE 
-                    WHEN fm.home_team_id = %(team_id)s THEN 
-                        CASE WHEN fm.home_score > fm.away_score THEN 1 ELSE 0 END
-                    ELSE 
-                        CASE WHEN fm.away_score > fm.home_score THEN 1 ELSE 0 END
-                END) as win_rate
-            FROM football_matches fm
-            WHERE (fm.home_team_id = %(team_id)s OR fm.away_team_id = %(team_id)s)
-            AND fm.tournament_id = %(tournament_id)s
-            AND fm.season_id = %(season_id)s
-            AND fm.status = 'Ended'
-            GROUP BY match_type
+                AVG(goals_for) as avg_goals_scored,
+                AVG(goals_against) as avg_goals_conceded,
+                AVG(result = 'W') as win_rate
+            FROM team_matches FINAL
+            WHERE team_id = %(team_id)s
+            AND season_id = %(season_id)s
+            AND tournament_id = %(tournament_id)s
+            AND status = 'Ended'
+            GROUP BY venue
             """
             
-            results = self.ch_client.execute(query, {
+            results = await self.ch_client.execute(query, {
                 'team_id': team_id,
                 'tournament_id': tournament_id,
                 'season_id': season_id
-            })
+            }, query_name='team_home_away_performance')
             
             performance = {'home': {}, 'away': {}}
             for match_type, matches, avg_scored, avg_conceded, win_rate in results:
@@ -796,26 +726,24 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения домашних/гостевых показателей: {e}")
             return {'home': {}, 'away': {}}
         
-    def get_team_corners_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
+    async def get_team_corners_stats(self, team_id: int, season_id: int) -> Dict[str, Any]:
         """Получает статистику угловых команды"""
         try:
             query = """
             SELECT 
-                AVG(fms1.corners) as avg_corners_for,
-                AVG(fms2.corners) as avg_corners_against
-            FROM football_match_stats fms1
-            JOIN football_match_stats fms2 ON fms1.match_id = fms2.match_id 
-                AND fms2.team_id != fms1.team_id
-            JOIN football_matches fm ON fms1.match_id = fm.match_id
-            WHERE fms1.team_id = %(team_id)s
-            AND fm.season_id = %(season_id)s
-            AND fm.status = 'Ended'
+                sum(corners_for) / sum(matches) as avg_corners_for,
+                sum(corners_against) / sum(corners_against_matches) as avg_corners_against
+            FROM team_season_match_stats_agg
+            WHERE team_id = %(team_id)s
+            AND season_id = %(season_id)s
+            GROUP BY team_id
+            HAVING sum(matches) > 0 AND sum(corners_against_matches) > 0
             """
             
-            result = self.ch_client.execute(query, {
+            result = await self.ch_client.execute(query, {
                 'team_id': team_id,
                 'season_id': season_id
-            })
+            }, query_name='team_corners')
             
             if result and result[0][0] is not None:
                 avg_corners_for, avg_corners_against = result[0]
@@ -829,24 +757,22 @@ class AdvancedFootballAnalyzer:
         except Exception as e:
             print(f"❌ Ошибка получения статистики угловых для команды {team_id}: {e}")
             return {'avg_corners_for': 0, 'avg_corners_against': 0, 'corners_balance': 0}
-    def get_team_corners_stats_by_venue(self, team_id: int, season_id: int, venue: str) -> Dict[str, Any]:
+    async def get_team_corners_stats_by_venue(self, team_id: int, season_id: int, venue: str) -> Dict[str, Any]:
         """Получает статистику угловых с учетом домашних/гостевых"""
         try:
             query = """
             SELECT 
-                AVG(fms1.corners) as avg_corners_for,
-                AVG(fms2.corners) as avg_corners_against
-            FROM football_match_stats fms1
-            JOIN football_match_stats fms2 ON fms1.match_id = fms2.match_id 
-                AND fms2.team_id != fms1.team_id
-            JOIN football_matches fm ON fms1.match_id = fm.match_id
-            WHERE fms1.team_id = %(team_id)s
-            AND fms1.team_type = %(venue)s  -- 'home' или 'away'
-            AND fm.season_id = %(season_id)s
-            AND fm.status = 'Ended'
+                sum(corners_for) / sum(matches) as avg_corners_for,
+                sum(corners_against) / sum(corners_against_matches) as avg_corners_against
+            FROM team_season_match_stats_agg
+            WHERE team_id = %(team_id)s
+            AND venue = %(venue)s  -- 'home' или 'away'
+            AND season_id = %(season_id)s
+            GROUP BY team_id
+            HAVING sum(matches) > 0 AND sum(corners_against_matches) > 0
             """
             
-            result = self.ch_client.execute(query, {
+            result = await self._execute_cached('team_corners_by_venue', (team_id, season_id, venue), query, {
                 'team_id': team_id,
                 'venue': venue,
                 'season_id': season_id
@@ -865,14 +791,62 @@ class AdvancedFootballAnalyzer:
             print(f"❌ Ошибка получения статистики угловых для команды {team_id}: {e}")
             return {'avg_corners_for': 0, 'avg_corners_against': 0, 'corners_balance': 0}
         
-    def predict_match_result_with_home_away(self, team1_id: int, team2_id: int, 
+    async def predict_match_result_with_home_away(self, team1_id: int, team2_id: int, 
                                           team1_name: str, team2_name: str,
                                           tournament_id: int, season_id: int) -> Dict[str, Any]:
         """Прогнозирует результат матча с учетом домашних/гостевых показателей"""
         try:
-            team1_performance = self.get_team_home_away_performance(team1_id, tournament_id, season_id)
-            team2_performance = self.get_team_home_away_performance(team2_id, tournament_id, season_id)
+            league_matrix, goal_model = await asyncio.gather(
+                self.get_league_matrix(tournament_id, season_id),
+                self.get_goal_model(tournament_id, season_id)
+            )
+            return self.apply_goal_model(
+                league_matrix.match_result(team1_id, team2_id), goal_model, team1_id, team2_id
+            )
             
+        except Exception as e:
+            print(f"❌ Ошибка прогноза результата: {e}")
+            return {}
+
+    async def get_league_matrix(self, tournament_id: int, season_id: int) -> LeagueMatrix:
+        """Прогнозы для всех пар команд лиги (кэшируются до новой версии данных)"""
+        return await self._data_loader().load_league_matrix(tournament_id, season_id)
+
+    def _data_loader(self) -> MatchDataLoader:
+        return MatchDataLoader(self.ch_client, self.cache, self.standings, self.DERBY_PAIRS)
+
+    async def get_goal_model(self, tournament_id: int, season_id: int) -> Optional[GoalModel]:
+        """Последняя подобранная модель голов лиги (None - модель не подобрана)"""
+        try:
+            rows = await self._execute_cached('goal_model', (tournament_id, season_id), GoalModel.PARAMS_QUERY, {
+                'tournament_id': tournament_id,
+                'season_id': season_id
+            })
+            return GoalModel.from_rows(tournament_id, season_id, rows)
+            
+        except Exception as e:
+            print(f"❌ Ошибка получения модели голов: {e}")
+            return None
+
+    def apply_goal_model(self, prediction: Dict[str, Any], goal_model: Optional[GoalModel],
+                         team1_id: int, team2_id: int) -> Dict[str, Any]:
+        """Заменяет эвристический прогноз счета и исходов прогнозом модели голов, если она есть"""
+        if not prediction or goal_model is None:
+            return prediction
+        model_prediction = goal_model.predict(team1_id, team2_id)
+        if not model_prediction:
+            return prediction
+        return {
+            **prediction,
+            'predicted_score': model_prediction['predicted_score'],
+            'most_likely_score': model_prediction['most_likely_score'],
+            'probabilities': model_prediction['probabilities'],
+            'totals': model_prediction['totals']
+        }
+
+    def calculate_match_result_prediction(self, team1_performance: Dict, team2_performance: Dict) -> Dict[str, Any]:
+        """Расчет прогноза результата по уже загруженным домашним/гостевым показателям"""
+        try:
             if not team1_performance.get('home') or not team2_performance.get('away'):
                 return {}
             
@@ -910,505 +884,476 @@ class AdvancedFootballAnalyzer:
             return {}
 
     async def get_match_analysis(self, team1_id: int, team2_id: int, team1_name: str, team2_name: str, 
-                               tournament_id: int = 203, season_id: int = 77142):
-        """Расширенный анализ матча с данными из БД"""
+                               tournament_id: int = 203, season_id: int = 77142,
+                               sections: Optional[List[str]] = None) -> MatchAnalysis:
+        """Расширенный анализ матча с данными из БД (структурированный результат по разделам).
+
+        sections ограничивает расчет нужными разделами: загружаются только
+        наборы данных, от которых они зависят. По умолчанию - полный отчет.
+        """
+        section_keys = [key for key in SECTION_ORDER if sections is None or key in sections]
+        analysis = MatchAnalysis(
+            team1_id=team1_id,
+            team2_id=team2_id,
+            team1_name=team1_name,
+            team2_name=team2_name,
+            tournament_id=tournament_id,
+            season_id=season_id
+        )
         
-        print(f"🎯 РАСШИРЕННЫЙ АНАЛИЗ МАТЧА: {team1_name} vs {team2_name}")
-        print("=" * 60)
+        try:
+            # Загружаем данные матча пакетом: только наборы, нужные выбранным разделам
+            bundle = await self._data_loader().load(
+                team1_id, team2_id, tournament_id, season_id,
+                datasets=required_datasets(section_keys)
+            )
+        except Exception as e:
+            print(f"❌ Ошибка анализа: {e}")
+            analysis.errors['data'] = str(e)
+            return analysis
         
+        return self._analysis_from_bundle(analysis, bundle, section_keys)
+
+    async def get_round_fixtures(self, tournament_id: int, season_id: int, round_number: int) -> List[Dict[str, Any]]:
+        """Матчи тура из match_fixtures (последние версии строк, по времени начала)"""
         try:
-            # 1. Получаем текущую таблицу из кэша
-            standings = self.get_current_standings(tournament_id, season_id)
-            
-            team1_position = standings.get(team1_id, "N/A")
-            team2_position = standings.get(team2_id, "N/A")
-            
-            # 2. Получаем статистику из кэш-таблицы
-            team1_stats = self.get_team_stats_from_db(team1_id, tournament_id, season_id)
-            team2_stats = self.get_team_stats_from_db(team2_id, tournament_id, season_id)
+            query = """
+            SELECT match_id, home_team_id, home_team_name, away_team_id, away_team_name, start_timestamp
+            FROM (
+                SELECT *
+                FROM match_fixtures
+                WHERE tournament_id = %(tournament_id)s
+                AND season_id = %(season_id)s
+                AND round_number = %(round_number)s
+                ORDER BY created_at DESC
+                LIMIT 1 BY match_id
+            )
+            ORDER BY start_timestamp, match_id
+            """
             
-            # 3. Получаем данные о позиции и динамике
-            team1_position_data = self.get_team_position_from_db(team1_id, tournament_id, season_id)
-            team2_position_data = self.get_team_position_from_db(team2_id, tournament_id, season_id)
+            results = await self.ch_client.execute(query, {
+                'tournament_id': tournament_id,
+                'season_id': season_id,
+                'round_number': round_number
+            }, query_name='round_fixtures')
+            
+            return [
+                {
+                    'match_id': match_id,
+                    'home_team_id': home_team_id,
+                    'home_team_name': home_team_name,
+                    'away_team_id': away_team_id,
+                    'away_team_name': away_team_name,
+                    'start_timestamp': start_timestamp
+                }
+                for match_id, home_team_id, home_team_name, away_team_id, away_team_name, start_timestamp in results
+            ]
             
-            team1_pos_trend = self.analyze_position_trend(team1_position_data)
-            team2_pos_trend = self.analyze_position_trend(team2_position_data)
+        except Exception as e:
+            print(f"❌ Ошибка получения матчей тура {round_number}: {e}")
+            return []
+
+    async def analyze_round(self, tournament_id: int, season_id: int, round_number: int,
+                            sections: Optional[List[str]] = None) -> List[MatchAnalysis]:
+        """Анализ всех матчей тура (в порядке начала матчей).
+
+        Данные лиги загружаются один раз на тур (MatchDataLoader.load_round),
+        разделы каждого матча считаются по общим данным в памяти.
+        """
+        section_keys = [key for key in SECTION_ORDER if sections is None or key in sections]
+        fixtures = await self.get_round_fixtures(tournament_id, season_id, round_number)
+        analyses = [
+            MatchAnalysis(
+                team1_id=fixture['home_team_id'],
+                team2_id=fixture['away_team_id'],
+                team1_name=fixture['home_team_name'],
+                team2_name=fixture['away_team_name'],
+                tournament_id=tournament_id,
+                season_id=season_id
+            )
+            for fixture in fixtures
+        ]
+        if not analyses:
+            return []
+        
+        try:
+            bundles = await self._data_loader().load_round(
+                [(analysis.team1_id, analysis.team2_id) for analysis in analyses],
+                tournament_id, season_id,
+                datasets=required_datasets(section_keys)
+            )
+        except Exception as e:
+            print(f"❌ Ошибка анализа тура {round_number}: {e}")
+            for analysis in analyses:
+                analysis.errors['data'] = str(e)
+            return analyses
+        
+        return [
+            self._analysis_from_bundle(analysis, bundles[(analysis.team1_id, analysis.team2_id)], section_keys)
+            for analysis in analyses
+        ]
+
+    def _analysis_from_bundle(self, analysis: MatchAnalysis, bundle: Dict[str, Any],
+                              section_keys: List[str]) -> MatchAnalysis:
+        """Рассчитывает разделы анализа по загруженным данным матча"""
+        try:
+            context = self._build_match_context(analysis, bundle)
+        except Exception as e:
+            print(f"❌ Ошибка анализа: {e}")
+            analysis.errors['data'] = str(e)
+            return analysis
+        
+        for key in section_keys:
+            try:
+                analysis.sections[key] = getattr(self, f"_section_{key}")(context)
+            except Exception as e:
+                print(f"❌ Ошибка расчета раздела {key}: {e}")
+                analysis.errors[key] = str(e)
+        
+        return analysis
+
+    def _build_match_context(self, analysis: MatchAnalysis, bundle: Dict[str, Any]) -> Dict[str, Any]:
+        """Общие показатели матча, на которых строятся разделы отчета"""
+        team1_id = analysis.team1_id
+        team2_id = analysis.team2_id
+        # Незагруженные наборы данных отсутствуют в bundle - используем пустые значения
+        standings = bundle.get('standings', {})
+        team_stats = bundle.get('team_stats', {})
+        xg = bundle.get('xg', {})
+        
+        team1_stats = team_stats.get(team1_id, {})
+        team2_stats = team_stats.get(team2_id, {})
+        team1_matches = team1_stats.get('matches', 1)
+        team2_matches = team2_stats.get('matches', 1)
+        
+        team1_position = standings.get(team1_id, "N/A")
+        team2_position = standings.get(team2_id, "N/A")
+        
+        # Анализ разницы в классе
+        if team1_position != "N/A" and team2_position != "N/A":
+            position_diff = abs(int(team1_position) - int(team2_position))
+            if position_diff <= 3:
+                class_analysis = "Равные соперники"
+            elif position_diff <= 6:
+                class_analysis = "Умеренное преимущество" 
+            else:
+                class_analysis = "Значительное преимущество"
+        else:
+            position_diff = 0
+            class_analysis = "Данные недоступны"
+        
+        return {
+            'analysis': analysis,
+            'bundle': bundle,
+            'team1_id': team1_id,
+            'team2_id': team2_id,
+            'team1_name': analysis.team1_name,
+            'team2_name': analysis.team2_name,
+            'team1_stats': team1_stats,
+            'team2_stats': team2_stats,
+            'team1_matches': team1_matches,
+            'team2_matches': team2_matches,
+            'team1_position': team1_position,
+            'team2_position': team2_position,
+            'position_diff': position_diff,
+            'class_analysis': class_analysis,
+            'team1_goals_pm': self.safe_divide(team1_stats.get('goalsScored', 0), team1_matches),
+            'team2_goals_pm': self.safe_divide(team2_stats.get('goalsScored', 0), team2_matches),
+            'team1_xg': xg.get(team1_id, 0.0),
+            'team2_xg': xg.get(team2_id, 0.0)
+        }
 
-            # 4. Получаем исторические данные из основных таблиц
-            team1_form = self.get_team_form_from_db(team1_id, season_id)
-            team2_form = self.get_team_form_from_db(team2_id, season_id)
+    def _per_match(self, context: Dict[str, Any], stat: str) -> Tuple[float, float]:
+        """Показатель кэш-статистики на матч для обеих команд"""
+        return (
+            self.safe_divide(context['team1_stats'].get(stat, 0), context['team1_matches']),
+            self.safe_divide(context['team2_stats'].get(stat, 0), context['team2_matches'])
+        )
 
-            # Обработка данных из БД
-            team1_matches = team1_stats.get('matches', 1)
-            team2_matches = team2_stats.get('matches', 1)
+    def _section_positions(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        positions = context['bundle']['positions']
+        return {
+            'team1_position': context['team1_position'],
+            'team2_position': context['team2_position'],
+            'team1_trend': self.analyze_position_trend(positions.get(context['team1_id'], {}))[1],
+            'team2_trend': self.analyze_position_trend(positions.get(context['team2_id'], {}))[1],
+            'position_diff': context['position_diff'],
+            'class_analysis': context['class_analysis'],
+            'has_positions': context['team1_position'] != "N/A" and context['team2_position'] != "N/A"
+        }
 
-            # Расчет показателей на матч
-            team1_goals_pm = self.safe_divide(team1_stats.get('goalsScored', 0), team1_matches)
-            team2_goals_pm = self.safe_divide(team2_stats.get('goalsScored', 0), team2_matches)
-            
-            team1_shots_pm = self.safe_divide(team1_stats.get('shots', 0), team1_matches)
-            team2_shots_pm = self.safe_divide(team2_stats.get('shots', 0), team2_matches)
-            
-            team1_shots_on_target_pm = self.safe_divide(team1_stats.get('shotsOnTarget', 0), team1_matches)
-            team2_shots_on_target_pm = self.safe_divide(team2_stats.get('shotsOnTarget', 0), team2_matches)
-            
-            # 5. Получаем xG данные из БД
-            team1_xg, team2_xg = self.get_team_xg_from_db(team1_id, team2_id, season_id)
+    def _section_goals(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'matches': context['team1_matches'],
+            'team1_goals_pm': context['team1_goals_pm'],
+            'team2_goals_pm': context['team2_goals_pm']
+        }
 
-            # ВЫВОД РЕЗУЛЬТАТОВ
-            print(f"\n🏠 {team1_name} (дома) vs 🛬 {team2_name} (в гостях)")
-            print("=" * 50)
+    def _section_shots(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        team1_shots_pm, team2_shots_pm = self._per_match(context, 'shots')
+        team1_on_target_pm, team2_on_target_pm = self._per_match(context, 'shotsOnTarget')
+        return {
+            'team1_shots_pm': team1_shots_pm,
+            'team2_shots_pm': team2_shots_pm,
+            'team1_shots_on_target_pm': team1_on_target_pm,
+            'team2_shots_on_target_pm': team2_on_target_pm
+        }
 
-            # ПОЗИЦИЯ В ТАБЛИЦЕ
-            print(f"\n🏆 ПОЗИЦИЯ В ТАБЛИЦЕ:")
-            print(f"   {team1_name}: {team1_position} место {team1_pos_trend[1]}")
-            print(f"   {team2_name}: {team2_position} место {team2_pos_trend[1]}")
+    def _section_xg(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {'team1_xg': context['team1_xg'], 'team2_xg': context['team2_xg']}
+
+    def _section_efficiency(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'team1_goals_pm': context['team1_goals_pm'],
+            'team2_goals_pm': context['team2_goals_pm'],
+            'team1_xg': context['team1_xg'],
+            'team2_xg': context['team2_xg'],
+            'team1_efficiency': context['team1_goals_pm'] - context['team1_xg'],
+            'team2_efficiency': context['team2_goals_pm'] - context['team2_xg']
+        }
 
-            # Анализ разницы в классе
-            if team1_position != "N/A" and team2_position != "N/A":
-                position_diff = abs(int(team1_position) - int(team2_position))
-                if position_diff <= 3:
-                    class_analysis = "Равные соперники"
-                elif position_diff <= 6:
-                    class_analysis = "Умеренное преимущество" 
-                else:
-                    class_analysis = "Значительное преимущество"
-                print(f"   Разница в классе: {position_diff} позиций ({class_analysis})")
-            else:
-                position_diff = 0
-                class_analysis = "Данные недоступны"
-
-            # ОСНОВНАЯ СТАТИСТИКА
-            print(f"\n⚽ РЕЗУЛЬТАТИВНОСТЬ (на основе {team1_matches} матчей):")
-            print(f"   {team1_name}: {team1_goals_pm:.1f} голов за матч")
-            print(f"   {team2_name}: {team2_goals_pm:.1f} голов за матч")
-
-            print(f"\n🎯 УДАРЫ:")
-            print(f"   {team1_name}: {team1_shots_pm:.1f} ударов ({team1_shots_on_target_pm:.1f} в створ) за матч")
-            print(f"   {team2_name}: {team2_shots_pm:.1f} ударов ({team2_shots_on_target_pm:.1f} в створ) за матч")
-
-            # xG АНАЛИЗ
-            print(f"\n📈 РЕАЛЬНЫЙ xG АНАЛИЗ:")
-            print(f"   {team1_name}: {team1_xg:.2f} xG")
-            print(f"   {team2_name}: {team2_xg:.2f} xG")
-
-            # ЭФФЕКТИВНОСТЬ РЕАЛИЗАЦИИ
-            team1_efficiency = team1_goals_pm - team1_xg
-            team2_efficiency = team2_goals_pm - team2_xg
-
-            print(f"\n🎯 ЭФФЕКТИВНОСТЬ РЕАЛИЗАЦИИ:")
-            print(f"   {team1_name}: {team1_goals_pm:.1f} голов при {team1_xg:.1f} xG ({team1_efficiency:+.2f})")
-            print(f"   {team2_name}: {team2_goals_pm:.1f} голов при {team2_xg:.1f} xG ({team2_efficiency:+.2f})")
-
-            # КОНТРОЛЬ ИГРЫ
-            team1_possession = team1_stats.get('averageBallPossession', 0)
-            team2_possession = team2_stats.get('averageBallPossession', 0)
-            
-            print(f"\n📊 КОНТРОЛЬ ИГРЫ:")
-            print(f"   {team1_name}: {team1_possession:.1f}% владения")
-            print(f"   {team2_name}: {team2_possession:.1f}% владения")
-
-            # ПЕРЕДАЧИ
-            team1_pass_accuracy = team1_stats.get('accuratePassesPercentage', 0)
-            team2_pass_accuracy = team2_stats.get('accuratePassesPercentage', 0)
-
-            print(f"\n🔄 ТОЧНОСТЬ ПЕРЕДАЧ:")
-            print(f"   {team1_name}: {team1_pass_accuracy:.1f}%")
-            print(f"   {team2_name}: {team2_pass_accuracy:.1f}%")
-
-            # Получаем данные о кроссах и длинных передачах
-            crosses_longballs_data = self.get_team_crosses_longballs_from_db(team1_id, team2_id, season_id)
-
-            team1_crosses_data = crosses_longballs_data.get(team1_id, {})
-            team2_crosses_data = crosses_longballs_data.get(team2_id, {})
-
-            # АКТИВНОСТЬ ФЛАНГОВ
-            print(f"\n🔄 АКТИВНОСТЬ ФЛАНГОВ:")
-            team1_total_crosses = team1_crosses_data.get('total_crosses', 0)
-            team2_total_crosses = team2_crosses_data.get('total_crosses', 0)
-            team1_accurate_crosses = team1_crosses_data.get('accurate_crosses', 0)
-            team2_accurate_crosses = team2_crosses_data.get('accurate_crosses', 0)
-
-            team1_cross_accuracy = self.safe_divide(team1_accurate_crosses, team1_total_crosses) * 100
-            team2_cross_accuracy = self.safe_divide(team2_accurate_crosses, team2_total_crosses) * 100
-
-            print(f"   {team1_name}: {team1_total_crosses:.1f} кроссов ({team1_cross_accuracy:.1f}% точность)")
-            print(f"   {team2_name}: {team2_total_crosses:.1f} кроссов ({team2_cross_accuracy:.1f}% точность)")
-
-            # ДАЛЬНИЕ АТАКИ
-            print(f"\n🎯 ДАЛЬНИЕ АТАКИ:")
-            team1_total_long_balls = team1_crosses_data.get('total_long_balls', 0)
-            team2_total_long_balls = team2_crosses_data.get('total_long_balls', 0)
-            team1_accurate_long_balls = team1_crosses_data.get('accurate_long_balls', 0)
-            team2_accurate_long_balls = team2_crosses_data.get('accurate_long_balls', 0)
-
-            team1_longball_accuracy = self.safe_divide(team1_accurate_long_balls, team1_total_long_balls) * 100
-            team2_longball_accuracy = self.safe_divide(team2_accurate_long_balls, team2_total_long_balls) * 100
-
-            print(f"   {team1_name}: {team1_total_long_balls:.1f} длинных передач ({team1_longball_accuracy:.1f}% точность)")
-            print(f"   {team2_name}: {team2_total_long_balls:.1f} длинных передач ({team2_longball_accuracy:.1f}% точность)")
-
-            # ОБОРОНА
-            team1_goals_conceded_pm = self.safe_divide(team1_stats.get('goalsConceded', 0), team1_matches)
-            team2_goals_conceded_pm = self.safe_divide(team2_stats.get('goalsConceded', 0), team2_matches)
-
-            print(f"\n🛡️ ОБОРОНА:")
-            print(f"   {team1_name}: {team1_goals_conceded_pm:.1f} пропущенных за матч")
-            print(f"   {team2_name}: {team2_goals_conceded_pm:.1f} пропущенных за матч")
-            # УГЛОВЫЕ
-            print(f"\n🎯 СТАТИСТИКА УГЛОВЫХ:")
-            team1_corners_stats = self.get_team_corners_stats(team1_id, season_id)
-            team2_corners_stats = self.get_team_corners_stats(team2_id, season_id)
-            team1_corners_stats = self.get_team_corners_stats_by_venue(team1_id, season_id, 'home')  # Хозяева
-            team2_corners_stats = self.get_team_corners_stats_by_venue(team2_id, season_id, 'away')  # Гости
-
-            
-            print(f"   {team1_name} (общие):")
-            print(f"      • Атака: {team1_corners_stats['avg_corners_for']} угловых за матч")
-            print(f"      • Оборона: {team1_corners_stats['avg_corners_against']} пропускает")
-            print(f"      • Баланс: {team1_corners_stats['corners_balance']:+.1f}")
-
-            print(f"   {team2_name} (общие):")
-            print(f"      • Атака: {team2_corners_stats['avg_corners_for']} угловых за матч") 
-            print(f"      • Оборона: {team2_corners_stats['avg_corners_against']} пропускает")
-            print(f"      • Баланс: {team2_corners_stats['corners_balance']:+.1f}")
-
-            print(f"   {team1_name} (дома):")
-            print(f"      • Атака: {team1_corners_stats['avg_corners_for']} угловых за матч")
-            print(f"      • Оборона: {team1_corners_stats['avg_corners_against']} пропускает")
-            print(f"      • Баланс: {team1_corners_stats['corners_balance']:+.1f}")
-
-            print(f"   {team2_name} (в гостях):")
-            print(f"      • Атака: {team2_corners_stats['avg_corners_for']} угловых за матч")
-            print(f"      • Оборона: {team2_corners_stats['avg_corners_against']} пропускает")
-            print(f"      • Баланс: {team2_corners_stats['corners_balance']:+.1f}")
-
-
-            # Анализ прессинга
-            total_corners = team1_corners_stats['avg_corners_for'] + team2_corners_stats['avg_corners_for']
-            print(f"\n📊 ОЖИДАЕМАЯ АКТИВНОСТЬ:")
-            print(f"   • Всего угловых за матч: {total_corners:.1f}")
-            print(f"   • Интенсивность атаки: {'🔴 Высокая' if total_corners > 10 else '🟡 Средняя' if total_corners > 7 else '🟢 Низкая'}")
-            # АГРЕССИВНОСТЬ
-            print(f"\n🟨 АГРЕССИВНОСТЬ:")
-            team1_fouls_pm = self.safe_divide(team1_stats.get('fouls', 0), team1_matches)
-            team2_fouls_pm = self.safe_divide(team2_stats.get('fouls', 0), team2_matches)
-
-            # ДОБАВЛЯЕМ ЖЕЛТЫЕ КАРТОЧКИ ИЗ СУЩЕСТВУЮЩИХ МЕТОДОВ
-            team1_yellow_stats = self._get_team_yellow_stats(team1_id, season_id)
-            team2_yellow_stats = self._get_team_yellow_stats(team2_id, season_id)
-
-            # ДОБАВЛЯЕМ КАРТОЧКИ СОПЕРНИКОВ
-            team1_opponent_yellow_stats = self.get_opponent_yellow_cards_stats(team1_id, season_id)
-            team2_opponent_yellow_stats = self.get_opponent_yellow_cards_stats(team2_id, season_id)
-
-            print(f"   {team1_name}: {team1_fouls_pm:.1f} фолов за матч")
-            print(f"   {team2_name}: {team2_fouls_pm:.1f} фолов за матч")
-
-            print(f"\n🟨 ЖЕЛТЫЕ КАРТОЧКИ:")
-            print(f"   {team1_name}: {team1_yellow_stats['avg_yellows']} в среднем за матч")
-            print(f"   {team2_name}: {team2_yellow_stats['avg_yellows']} в среднем за матч")
-
-            print(f"\n🟨 КАРТОЧКИ У СОПЕРНИКОВ:")
-            print(f"   Против {team1_name}: {team1_opponent_yellow_stats['avg_opponent_yellows']} в среднем за матч")
-            print(f"   Против {team2_name}: {team2_opponent_yellow_stats['avg_opponent_yellows']} в среднем за матч")
-
-            # Анализ агрессивности
-            print(f"\n📊 АНАЛИЗ АГРЕССИВНОСТИ:")
-            team1_total_yellows = team1_yellow_stats['avg_yellows'] + team1_opponent_yellow_stats['avg_opponent_yellows']
-            team2_total_yellows = team2_yellow_stats['avg_yellows'] + team2_opponent_yellow_stats['avg_opponent_yellows']
-
-            print(f"   Всего карточек в матчах {team1_name}: {team1_total_yellows:.1f} за матч")
-            print(f"   Всего карточек в матчах {team2_name}: {team2_total_yellows:.1f} за матч")
-
-            # КАЧЕСТВО МОМЕНТОВ
-            team1_big_chances_pm = self.safe_divide(team1_stats.get('bigChances', 0), team1_matches)
-            team2_big_chances_pm = self.safe_divide(team2_stats.get('bigChances', 0), team2_matches)
-            team1_big_chances_missed_pm = self.safe_divide(team1_stats.get('bigChancesMissed', 0), team1_matches)
-            team2_big_chances_missed_pm = self.safe_divide(team2_stats.get('bigChancesMissed', 0), team2_matches)
-
-            print(f"\n🎪 КАЧЕСТВО МОМЕНТОВ:")
-            print(f"   {team1_name}: {team1_big_chances_pm:.1f} больших шансов ({team1_big_chances_missed_pm:.1f} пропущено)")
-            print(f"   {team2_name}: {team2_big_chances_pm:.1f} больших шансов ({team2_big_chances_missed_pm:.1f} пропущено)")
-
-            # АНАЛИЗ ЗОН АТАК
-            print(f"\n🎯 АНАЛИЗ ЗОН АТАК И УЯЗВИМОСТЕЙ:")
-
-            team1_total_goals = team1_stats.get('goalsScored', 1)
-            team2_total_goals = team2_stats.get('goalsScored', 1)
-
-            print(f"\n🏹 {team1_name} АТАКУЕТ:")
-            team1_inside = self.safe_divide(team1_stats.get('goalsFromInsideTheBox', 0), team1_total_goals) * 100
-            team1_outside = self.safe_divide(team1_stats.get('goalsFromOutsideTheBox', 0), team1_total_goals) * 100  
-            team1_headed = self.safe_divide(team1_stats.get('headedGoals', 0), team1_total_goals) * 100
-
-            total_percent = team1_inside + team1_outside + team1_headed
-            if total_percent > 100:
-                team1_inside = (team1_inside / total_percent) * 100
-                team1_outside = (team1_outside / total_percent) * 100
-                team1_headed = (team1_headed / total_percent) * 100
-
-            print(f"   • {team1_inside:.0f}% голов изнутри штрафной")
-            print(f"   • {team1_outside:.0f}% голов издали")
-            print(f"   • {team1_headed:.0f}% голов головой")
-
-            print(f"\n🏹 {team2_name} АТАКУЕТ:")
-            team2_inside = self.safe_divide(team2_stats.get('goalsFromInsideTheBox', 0), team2_total_goals) * 100
-            team2_outside = self.safe_divide(team2_stats.get('goalsFromOutsideTheBox', 0), team2_total_goals) * 100  
-            team2_headed = self.safe_divide(team2_stats.get('headedGoals', 0), team2_total_goals) * 100
-
-            total_percent = team2_inside + team2_outside + team2_headed
-            if total_percent > 100:
-                team2_inside = (team2_inside / total_percent) * 100
-                team2_outside = (team2_outside / total_percent) * 100
-                team2_headed = (team2_headed / total_percent) * 100
-
-            print(f"   • {team2_inside:.0f}% голов изнутри штрафной")
-            print(f"   • {team2_outside:.0f}% голов издали")
-            print(f"   • {team2_headed:.0f}% голов головой")
-
-            # ФОРМА КОМАНД
-            matches_count = len(team1_form) if team1_form else 0
-
-            if matches_count == 0:
-                print(f"\n📈 ФОРМА (первый тур - матчей нет)")
-            else:
-                form_text = "матч" if matches_count == 1 else f"последние {matches_count} матча" if matches_count < 5 else "последние 5 матчей"
-                print(f"\n📈 ФОРМА (за {form_text}):")
-
-            if team1_form:
-                team1_form_results = [match[6] for match in team1_form]
-                team1_form_display = team1_form_results[::-1]
-                form_icons = ''.join(['🟢' if r == 'W' else '🟡' if r == 'D' else '🔴' for r in team1_form_display])
-                print(f"   {team1_name}: {form_icons}")
-                if matches_count > 0:
-                    print(f"   Последние результаты: {', '.join([r for r in team1_form_display])}")
-            else:
-                print(f"   {team1_name}: нет данных")
-                
-            if team2_form:
-                team2_form_results = [match[6] for match in team2_form]
-                team2_form_display = team2_form_results[::-1]
-                form_icons = ''.join(['🟢' if r == 'W' else '🟡' if r == 'D' else '🔴' for r in team2_form_display])
-                print(f"   {team2_name}: {form_icons}")
-                if matches_count > 0:
-                    print(f"   Последние результаты: {', '.join([r for r in team2_form_display])}")
-            else:
-                print(f"   {team2_name}: нет данных")
+    def _section_possession(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'team1_possession': context['team1_stats'].get('averageBallPossession', 0),
+            'team2_possession': context['team2_stats'].get('averageBallPossession', 0)
+        }
 
-            # ИСТОРИЯ ЛИЧНЫХ ВСТРЕЧ
-            print(f"\n📊 ИСТОРИЯ ЛИЧНЫХ ВСТРЕЧ ({team1_name} vs {team2_name}):")
-            h2h_all_time = self.get_team_all_time_stats(team1_id, team2_id)
+    def _section_passing(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'team1_pass_accuracy': context['team1_stats'].get('accuratePassesPercentage', 0),
+            'team2_pass_accuracy': context['team2_stats'].get('accuratePassesPercentage', 0)
+        }
 
-            if h2h_all_time:
-                print(f"\n🤝 ВСЕГО МАТЧЕЙ: {h2h_all_time['total_matches']}")
+    def _crosses_longballs(self, context: Dict[str, Any], total_key: str, accurate_key: str) -> Dict[str, Any]:
+        crosses_longballs_data = context['bundle']['crosses_longballs']
+        result = {}
+        for team in ('team1', 'team2'):
+            team_data = crosses_longballs_data.get(context[f'{team}_id'], {})
+            total = team_data.get(total_key, 0)
+            accurate = team_data.get(accurate_key, 0)
+            result[f'{team}_total'] = total
+            result[f'{team}_accuracy'] = self.safe_divide(accurate, total) * 100
+        return result
+
+    def _section_crosses(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return self._crosses_longballs(context, 'total_crosses', 'accurate_crosses')
+
+    def _section_long_balls(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return self._crosses_longballs(context, 'total_long_balls', 'accurate_long_balls')
+
+    def _section_defense(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        team1_conceded_pm, team2_conceded_pm = self._per_match(context, 'goalsConceded')
+        return {
+            'team1_goals_conceded_pm': team1_conceded_pm,
+            'team2_goals_conceded_pm': team2_conceded_pm
+        }
 
-                if h2h_all_time['total_matches'] > 0:
-                    print(f"   • {team1_name}: {h2h_all_time['team1_wins']} побед ({h2h_all_time['team1_win_rate']:.1f}%)")
-                    print(f"   • {team2_name}: {h2h_all_time['team2_wins']} побед ({h2h_all_time['team2_win_rate']:.1f}%)")
-                    print(f"   • Ничьих: {h2h_all_time['draws']} ({h2h_all_time['draws']/h2h_all_time['total_matches']*100:.1f}%)")
-                else:
-                    print(f"   • {team1_name}: {h2h_all_time['team1_wins']} побед (0%)")
-                    print(f"   • {team2_name}: {h2h_all_time['team2_wins']} побед (0%)")
-                    print(f"   • Ничьих: {h2h_all_time['draws']} (0%)")
-                    print("   🤝 Команды ранее не встречались")
-                
-                print(f"\n⚽ ОБЩАЯ РЕЗУЛЬТАТИВНОСТЬ:")
-                print(f"   • {team1_name}: {h2h_all_time['team1_goals']} голов")
-                print(f"   • {team2_name}: {h2h_all_time['team2_goals']} голов")
-                print(f"   • Разница: +{h2h_all_time['team1_goals'] - h2h_all_time['team2_goals']}")
-                
-                print(f"\n📈 СРЕДНИЕ ПОКАЗАТЕЛИ ЗА МАТЧ:")
-                print(f"   • {team1_name}: {h2h_all_time['team1_avg_goals']:.1f} голов")
-                print(f"   • {team2_name}: {h2h_all_time['team2_avg_goals']:.1f} голов")
-                print(f"   • Всего голов за матч: {h2h_all_time['team1_avg_goals'] + h2h_all_time['team2_avg_goals']:.1f}")
-
-            # СУЩЕСТВУЮЩИЕ ПРОГНОЗЫ
-            total_goals = team1_goals_pm + team2_goals_pm
-            
-            print(f"\n🏆 ПРОГНОЗ С УЧЕТОМ ПОЗИЦИИ В ТАБЛИЦЕ:")
-            print(f"   • Ожидаемые голы: {total_goals:.1f}")
-            
-            if position_diff > 0:
-                print(f"   • Разница в классе: {position_diff} позиций")
-
-            # ОБНОВЛЕННЫЕ ПРОГНОЗЫ
-            if team1_position != "N/A" and team2_position != "N/A":
-                if total_goals > 2.8 and position_diff <= 4:
-                    total_pred = "ТБ 2.5 (высокая вероятность)"
-                    confidence = "🔴 Высокая"
-                elif total_goals > 2.2 and position_diff <= 6:
-                    total_pred = "ТБ 2.5 (средняя вероятность)"
-                    confidence = "🟡 Средняя"
-                elif total_goals > 1.8:
-                    total_pred = "ТМ 2.5 (низкая вероятность)" 
-                    confidence = "🟢 Низкая"
-                else:
-                    total_pred = "ТМ 2.5 (высокая вероятность)"
-                    confidence = "🔴 Высокая"
+    def _section_corners(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        corners = context['bundle']['corners']
+        return {
+            'team1_total': corners[context['team1_id']]['total'],
+            'team2_total': corners[context['team2_id']]['total'],
+            'team1_home': corners[context['team1_id']]['home'],  # Хозяева
+            'team2_away': corners[context['team2_id']]['away']   # Гости
+        }
+
+    def _section_expected_activity(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        corners = context['bundle']['corners']
+        total_corners = (corners[context['team1_id']]['home']['avg_corners_for'] +
+                         corners[context['team2_id']]['away']['avg_corners_for'])
+        return {'total_corners': total_corners}
+
+    def _section_fouls(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        team1_fouls_pm, team2_fouls_pm = self._per_match(context, 'fouls')
+        return {'team1_fouls_pm': team1_fouls_pm, 'team2_fouls_pm': team2_fouls_pm}
+
+    def _section_yellow_cards(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        yellow_stats = context['bundle']['yellow_stats']
+        return {
+            'team1_avg_yellows': yellow_stats[context['team1_id']]['avg_yellows'],
+            'team2_avg_yellows': yellow_stats[context['team2_id']]['avg_yellows']
+        }
+
+    def _section_opponent_cards(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        opponent_stats = context['bundle']['opponent_yellow_stats']
+        return {
+            'team1_avg_opponent_yellows': opponent_stats[context['team1_id']]['avg_opponent_yellows'],
+            'team2_avg_opponent_yellows': opponent_stats[context['team2_id']]['avg_opponent_yellows']
+        }
+
+    def _section_aggression(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        yellows = self._section_yellow_cards(context)
+        opponent = self._section_opponent_cards(context)
+        return {
+            'team1_total_yellows': yellows['team1_avg_yellows'] + opponent['team1_avg_opponent_yellows'],
+            'team2_total_yellows': yellows['team2_avg_yellows'] + opponent['team2_avg_opponent_yellows']
+        }
+
+    def _section_chances_quality(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        team1_big_chances_pm, team2_big_chances_pm = self._per_match(context, 'bigChances')
+        team1_missed_pm, team2_missed_pm = self._per_match(context, 'bigChancesMissed')
+        return {
+            'team1_big_chances_pm': team1_big_chances_pm,
+            'team2_big_chances_pm': team2_big_chances_pm,
+            'team1_big_chances_missed_pm': team1_missed_pm,
+            'team2_big_chances_missed_pm': team2_missed_pm
+        }
+
+    def _goal_zones(self, stats: Dict[str, Any]) -> Dict[str, float]:
+        """Доли голов изнутри штрафной, издали и головой"""
+        total_goals = stats.get('goalsScored', 1)
+        inside = self.safe_divide(stats.get('goalsFromInsideTheBox', 0), total_goals) * 100
+        outside = self.safe_divide(stats.get('goalsFromOutsideTheBox', 0), total_goals) * 100
+        headed = self.safe_divide(stats.get('headedGoals', 0), total_goals) * 100
+        
+        total_percent = inside + outside + headed
+        if total_percent > 100:
+            inside = (inside / total_percent) * 100
+            outside = (outside / total_percent) * 100
+            headed = (headed / total_percent) * 100
+        
+        return {'inside': inside, 'outside': outside, 'headed': headed}
+
+    def _section_attack_zones(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'team1': self._goal_zones(context['team1_stats']),
+            'team2': self._goal_zones(context['team2_stats'])
+        }
+
+    def _section_form(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        form = context['bundle']['form']
+        team1_form = form.get(context['team1_id'], [])
+        team2_form = form.get(context['team2_id'], [])
+        # Результаты в хронологическом порядке (старые первыми)
+        return {
+            'matches_count': len(team1_form),
+            'team1_results': [match[6] for match in team1_form][::-1],
+            'team2_results': [match[6] for match in team2_form][::-1]
+        }
+
+    def _section_h2h(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(context['bundle']['h2h'])
+
+    def _section_position_forecast(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'total_goals': context['team1_goals_pm'] + context['team2_goals_pm'],
+            'position_diff': context['position_diff']
+        }
+
+    def _section_recommendations(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        total_goals = context['team1_goals_pm'] + context['team2_goals_pm']
+        position_diff = context['position_diff']
+        goal_model = context['bundle'].get('goal_model')
+        model_prediction = goal_model.predict(context['team1_id'], context['team2_id']) if goal_model else {}
+        
+        if model_prediction:
+            # Вероятность тотала из матрицы счетов модели голов
+            total_probs = model_prediction['totals'][2.5]
+            side, probability = ("ТБ 2.5", total_probs['over']) if total_probs['over'] >= 50 else ("ТМ 2.5", total_probs['under'])
+            total_pred = f"{side} (вероятность {probability}%)"
+            if probability >= 65:
+                confidence = "🔴 Высокая"
+            elif probability >= 55:
+                confidence = "🟡 Средняя"
             else:
-                if total_goals > 2.8:
-                    total_pred = "ТБ 2.5 (средняя вероятность)"
-                    confidence = "🟡 Средняя"
-                elif total_goals > 2.2:
-                    total_pred = "ТБ 2.5 (низкая вероятность)"
-                    confidence = "🟢 Низкая"
-                else:
-                    total_pred = "ТМ 2.5 (средняя вероятность)"
-                    confidence = "🟡 Средняя"
-
-            print(f"\n💰 РЕКОМЕНДАЦИИ:")
-            print(f"   • Тоталы голов: {total_pred}")
-            print(f"   • Уверенность: {confidence}")
-            if position_diff > 0:
-                print(f"   • Фактор позиции: {class_analysis}")
-
-            # КЛЮЧЕВЫЕ ИНСАЙТЫ
-            print(f"\n📈 КЛЮЧЕВЫЕ ИНСАЙТЫ:")
-            insights = self.generate_insights(
-                team1_name, team2_name, team1_stats, team2_stats, 
-                team1_position, team2_position, team1_matches, team2_matches,
-                team1_xg, team2_xg
-            )
-            
-            for i, insight in enumerate(insights, 1):
-                print(f"   {i}. {insight}")
+                confidence = "🟢 Низкая"
+        elif context['team1_position'] != "N/A" and context['team2_position'] != "N/A":
+            if total_goals > 2.8 and position_diff <= 4:
+                total_pred = "ТБ 2.5 (высокая вероятность)"
+                confidence = "🔴 Высокая"
+            elif total_goals > 2.2 and position_diff <= 6:
+                total_pred = "ТБ 2.5 (средняя вероятность)"
+                confidence = "🟡 Средняя"
+            elif total_goals > 1.8:
+                total_pred = "ТМ 2.5 (низкая вероятность)" 
+                confidence = "🟢 Низкая"
+            else:
+                total_pred = "ТМ 2.5 (высокая вероятность)"
+                confidence = "🔴 Высокая"
+        else:
+            if total_goals > 2.8:
+                total_pred = "ТБ 2.5 (средняя вероятность)"
+                confidence = "🟡 Средняя"
+            elif total_goals > 2.2:
+                total_pred = "ТБ 2.5 (низкая вероятность)"
+                confidence = "🟢 Низкая"
+            else:
+                total_pred = "ТМ 2.5 (средняя вероятность)"
+                confidence = "🟡 Средняя"
+        
+        return {
+            'total_prediction': total_pred,
+            'confidence': confidence,
+            'position_diff': position_diff,
+            'class_analysis': context['class_analysis']
+        }
 
-            # НОВЫЕ УНИКАЛЬНЫЕ ПРОГНОЗЫ (без дублирования)
-            print(f"\n🎲 ЭКСКЛЮЗИВНЫЕ ПРОГНОЗЫ:")
-            print("=" * 40)
+    def _section_insights(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        insights = self.generate_insights(
+            context['team1_name'], context['team2_name'],
+            context['team1_stats'], context['team2_stats'],
+            context['team1_position'], context['team2_position'],
+            context['team1_matches'], context['team2_matches'],
+            context['team1_xg'], context['team2_xg']
+        )
+        return {'insights': insights}
 
-            # ПРОГНОЗ ЖЕЛТЫХ КАРТОЧЕК С УЧЕТОМ РЕФЕРИ
-            print(f"\n🟨 АНАЛИЗ ДИСЦИПЛИНЫ С УЧЕТОМ РЕФЕРИ:")
-            try:
-                referee_info = self.get_match_referee(team1_id, team2_id, tournament_id, season_id)
-                if referee_info and referee_info.get('referee_id'):
-                    yellow_cards_prediction = self.predict_yellow_cards(
-                        team1_id, team2_id, referee_info['referee_id'], 
-                        tournament_id, season_id
-                    )
-                    
-                    if yellow_cards_prediction:
-                        print(f"   👨‍⚖️ Рефери: {yellow_cards_prediction['referee_name']}")
-                        if yellow_cards_prediction['referee_games'] > 0:
-                            print(f"   📊 Среднее у рефери: {yellow_cards_prediction['referee_avg_yellows']} желтых за матч")
-                        print(f"   🎯 Прогноз желтых карточек: {yellow_cards_prediction['predicted_yellow_cards']}")
-                        print(f"   💰 Рекомендация: {yellow_cards_prediction['cards_total_prediction']}")
-                        print(f"   🎯 Уверенность: {yellow_cards_prediction['confidence']}")
-                    else:
-                        print(f"   ℹ️ Данные для прогноза карточек недоступны")
-                else:
-                    print(f"   ℹ️ Информация о рефери недоступна")
-                    
-            except Exception as e:
-                print(f"   ❌ Ошибка прогноза карточек: {e}")
+    def _section_exclusive(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {}
 
-            # ПРОГНОЗ РЕЗУЛЬТАТА С УЧЕТОМ ДОМАШНИХ/ГОСТЕВЫХ ПОКАЗАТЕЛЕЙ
-            print(f"\n🏠🛬 ПРОГНОЗ РЕЗУЛЬТАТА С УЧЕТОМ ДОМАШНЕГО СТАДИОНА:")
-            try:
-                result_prediction = self.predict_match_result_with_home_away(
-                    team1_id, team2_id, team1_name, team2_name, tournament_id, season_id
-                )
-                
-                if result_prediction:
-                    home_stats = result_prediction['home_stats']
-                    away_stats = result_prediction['away_stats']
-                    
-                    print(f"   🏠 {team1_name} дома:")
-                    print(f"      • Побед: {home_stats['win_rate']:.1f}%")
-                    print(f"      • Забивает: {home_stats['avg_goals_scored']:.1f} голов")
-                    print(f"      • Пропускает: {home_stats['avg_goals_conceded']:.1f} голов")
-                    
-                    print(f"   🛬 {team2_name} в гостях:")
-                    print(f"      • Побед: {away_stats['win_rate']:.1f}%")
-                    print(f"      • Забивает: {away_stats['avg_goals_scored']:.1f} голов")
-                    print(f"      • Пропускает: {away_stats['avg_goals_conceded']:.1f} голов")
-                    
-                    print(f"   🎯 Прогноз счета: {result_prediction['predicted_score']}")
-                    
-                    probs = result_prediction['probabilities']
-                    print(f"   📊 Вероятности исходов:")
-                    print(f"      • П1 ({team1_name}): {probs['home_win']}%")
-                    print(f"      • Ничья: {probs['draw']}%")
-                    print(f"      • П2 ({team2_name}): {probs['away_win']}%")
-                    
-            except Exception as e:
-                print(f"   ❌ Ошибка улучшенного прогноза: {e}")
+    def _section_cards_forecast(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        bundle = context['bundle']
+        referee_info = bundle['referee']
+        if not referee_info or not referee_info.get('referee_id'):
+            return {'referee_available': False, 'prediction': {}}
+        
+        # Командные показатели - из матрицы лиги, рефери - назначенный на матч
+        team1_id = context['team1_id']
+        team2_id = context['team2_id']
+        prediction = self.calculate_yellow_cards_prediction(
+            team1_id, team2_id,
+            referee_stats=bundle['referee_yellow_stats'],
+            **bundle['league_matrix'].yellow_cards_inputs(team1_id, team2_id)
+        )
+        return {'referee_available': True, 'prediction': prediction}
 
-        except Exception as e:
-            print(f"❌ Ошибка анализа: {e}")
-            import traceback
-            traceback.print_exc()
+    def _section_home_away_forecast(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        prediction = context['bundle']['league_matrix'].match_result(context['team1_id'], context['team2_id'])
+        return self.apply_goal_model(
+            prediction, context['bundle'].get('goal_model'), context['team1_id'], context['team2_id']
+        )
 
     # СУЩЕСТВУЮЩИЕ ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ (без изменений)
-    def get_team_form_from_db(self, team_id: int, season_id: int) -> List:
+    async def get_team_form_from_db(self, team_id: int, season_id: int) -> List:
         try:
             query = """
             SELECT 
-                fm.match_id, fm.home_team_id, fm.away_team_id, 
-                fm.home_score, fm.away_score, fm.match_date,
-                CASE 
-                    WHEN fm.home_team_id = %(team_id)s AND fm.home_score > fm.away_score THEN 'W'
-                    WHEN fm.away_team_id = %(team_id)s AND fm.away_score > fm.home_score THEN 'W' 
-                    WHEN fm.home_score = fm.away_score THEN 'D'
-                    ELSE 'L'
-                END as result
-            FROM football_matches fm
-            WHERE (fm.home_team_id = %(team_id)s OR fm.away_team_id = %(team_id)s)
-            AND fm.status = 'Ended'
-            AND fm.season_id = %(season_id)s
-            ORDER BY fm.match_date DESC
+                match_id,
+                if(venue = 'home', team_id, opponent_id) as home_team_id,
+                if(venue = 'home', opponent_id, team_id) as away_team_id,
+                if(venue = 'home', goals_for, goals_against) as home_score,
+                if(venue = 'home', goals_against, goals_for) as away_score,
+                match_date,
+                result
+            FROM team_matches FINAL
+            WHERE team_id = %(team_id)s
+            AND season_id = %(season_id)s
+            AND status = 'Ended'
+            ORDER BY match_date DESC
             LIMIT 5
             """
-            return self.ch_client.execute(query, {'team_id': team_id, 'season_id': season_id})
+            return await self._execute_cached('team_form', (team_id, season_id), query,
+                                              {'team_id': team_id, 'season_id': season_id})
         except Exception as e:
             print(f"❌ Ошибка получения формы команды {team_id}: {e}")
             return []
 
-    def get_team_all_time_stats(self, team1_id: int, team2_id: int) -> Dict[str, Any]:
+    async def get_team_all_time_stats(self, team1_id: int, team2_id: int) -> Dict[str, Any]:
         """Получает историческую статистику только в матчах между командами"""
         try:
-            query = """
-            SELECT 
-                COUNT(*) as total_matches,
-                SUM(CASE 
-                    WHEN (home_team_id = %(team1)s AND home_score > away_score) 
-                    OR (away_team_id = %(team1)s AND away_score > home_score) THEN 1 
-                    ELSE 0 
-                END) as team1_wins,
-                SUM(CASE 
-                    WHEN (home_team_id = %(team2)s AND home_score > away_score) 
-                    OR (away_team_id = %(team2)s AND away_score > home_score) THEN 1 
-                    ELSE 0 
-                END) as team2_wins,
-                SUM(CASE WHEN home_score = away_score THEN 1 ELSE 0 END) as draws,
-                SUM(CASE WHEN home_team_id = %(team1)s THEN home_score ELSE away_score END) as team1_goals,
-                SUM(CASE WHEN home_team_id = %(team2)s THEN home_score ELSE away_score END) as team2_goals,
-                AVG(CASE WHEN home_team_id = %(team1)s THEN home_score ELSE away_score END) as team1_avg_goals,
-                AVG(CASE WHEN home_team_id = %(team2)s THEN home_score ELSE away_score END) as team2_avg_goals
-            FROM football_matches 
-            WHERE ((home_team_id = %(team1)s AND away_team_id = %(team2)s)
-                OR (home_team_id = %(team2)s AND away_team_id = %(team1)s))
-            AND status = 'Ended'
-            """
-            
-            results = self.ch_client.execute(query, {'team1': team1_id, 'team2': team2_id})
-            if results:
-                total_matches, team1_wins, team2_wins, draws, team1_goals, team2_goals, team1_avg_goals, team2_avg_goals = results[0]
-                
-                return {
-                    'total_matches': total_matches or 0,
-                    'team1_wins': team1_wins or 0,
-                    'team2_wins': team2_wins or 0,
-                    'draws': draws or 0,
-                    'team1_goals': team1_goals or 0,
-                    'team2_goals': team2_goals or 0,
-                    'team1_avg_goals': team1_avg_goals or 0,
-                    'team2_avg_goals': team2_avg_goals or 0,
-                    'team1_win_rate': (team1_wins / total_matches * 100) if total_matches > 0 else 0,
-                    'team2_win_rate': (team2_wins / total_matches * 100) if total_matches > 0 else 0
-                }
-            return {}
+            pairs = (MatchDataLoader.pair_key(team1_id, team2_id),)
+            results = await self._execute_cached('h2h', (pairs,), MatchDataLoader.H2H_QUERY, {'pairs': pairs})
+            return MatchDataLoader.parse_h2h(results, team1_id, team2_id)['h2h']
             
         except Exception as e:
             print(f"❌ Ошибка получения статистики встреч: {e}")
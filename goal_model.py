@@ -0,0 +1,275 @@
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+import argparse
+import asyncio
+import numpy as np
+from scipy.optimize import minimize
+from storage_backends import create_storage
+from dotenv import load_dotenv
+
+
+# Тоталы, для которых считаются вероятности больше/меньше
+TOTAL_LINES = (1.5, 2.5, 3.5)
+
+
+def _poisson_pmf(rate: float, max_goals: int) -> np.ndarray:
+    """P(X = 0..max_goals) для распределения Пуассона"""
+    goals = np.arange(max_goals + 1)
+    factorials = np.cumprod(np.r_[1.0, np.arange(1, max_goals + 1)])
+    return np.exp(-rate) * rate ** goals / factorials
+
+
+def fit_dixon_coles(home_idx: np.ndarray, away_idx: np.ndarray,
+                    home_goals: np.ndarray, away_goals: np.ndarray, n_teams: int,
+                    weights: Optional[np.ndarray] = None, dixon_coles: bool = True,
+                    regularization: float = 1e-3) -> Dict[str, Any]:
+    """Подбирает силу атаки/обороны команд, домашнее преимущество и rho Диксона-Коулза.
+
+    Голы хозяев ~ Poisson(exp(attack[h] + defence[a] + home)), гостей -
+    Poisson(exp(attack[a] + defence[h])). Сумма attack фиксируется нулем,
+    небольшая L2-регуляризация стабилизирует команды с малым числом матчей.
+    """
+    weights = np.ones(len(home_goals)) if weights is None else weights
+    low_scores = {
+        (0, 0): (home_goals == 0) & (away_goals == 0),
+        (0, 1): (home_goals == 0) & (away_goals == 1),
+        (1, 0): (home_goals == 1) & (away_goals == 0),
+        (1, 1): (home_goals == 1) & (away_goals == 1)
+    }
+
+    def unpack(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, float]:
+        attack = x[:n_teams] - x[:n_teams].mean()
+        return attack, x[n_teams:2 * n_teams], x[-2], x[-1]
+
+    def negative_log_likelihood(x: np.ndarray) -> float:
+        attack, defence, home, rho = unpack(x)
+        home_rate = np.exp(attack[home_idx] + defence[away_idx] + home)
+        away_rate = np.exp(attack[away_idx] + defence[home_idx])
+
+        log_likelihood = (home_goals * np.log(home_rate) - home_rate
+                          + away_goals * np.log(away_rate) - away_rate)
+
+        if dixon_coles:
+            # Поправка Диксона-Коулза на счета 0:0, 0:1, 1:0, 1:1
+            tau = np.ones(len(home_goals))
+            tau[low_scores[(0, 0)]] = 1 - (home_rate * away_rate * rho)[low_scores[(0, 0)]]
+            tau[low_scores[(0, 1)]] = 1 + (home_rate * rho)[low_scores[(0, 1)]]
+            tau[low_scores[(1, 0)]] = 1 + (away_rate * rho)[low_scores[(1, 0)]]
+            tau[low_scores[(1, 1)]] = 1 - rho
+            log_likelihood = log_likelihood + np.log(np.maximum(tau, 1e-10))
+
+        penalty = regularization * (np.sum(attack ** 2) + np.sum(defence ** 2))
+        return -np.sum(weights * log_likelihood) + penalty
+
+    x0 = np.zeros(2 * n_teams + 2)
+    x0[-2] = 0.25
+    bounds = [(None, None)] * (2 * n_teams) + [(None, None), (-0.2, 0.2) if dixon_coles else (0.0, 0.0)]
+    result = minimize(negative_log_likelihood, x0, method='L-BFGS-B', bounds=bounds)
+
+    attack, defence, home, rho = unpack(result.x)
+    return {
+        'attack': attack,
+        'defence': defence,
+        'home_advantage': float(home),
+        'rho': float(rho),
+        'converged': bool(result.success),
+        'log_likelihood': float(-result.fun)
+    }
+
+
+class GoalModel:
+    """Модель голов Пуассона / Диксона-Коулза для лиги.
+
+    Параметры подбираются по завершенным матчам сезона (fit_league) и
+    хранятся в goal_model_params; прогноз матча - поиск параметров команд и
+    матрица вероятностей счетов, из которой точно считаются 1X2 и тоталы.
+    """
+
+    # Параметры последнего подбора по лиге
+    PARAMS_QUERY = """
+    SELECT team_id, attack, defence, home_advantage, rho, matches, fitted_at
+    FROM goal_model_params
+    WHERE tournament_id = %(tournament_id)s
+    AND season_id = %(season_id)s
+    AND fitted_at = (
+        SELECT max(fitted_at) FROM goal_model_params
+        WHERE tournament_id = %(tournament_id)s AND season_id = %(season_id)s
+    )
+    """
+
+    MATCHES_QUERY = """
+    SELECT home_team_id, away_team_id, home_score, away_score
+    FROM football_matches FINAL
+    WHERE tournament_id = %(tournament_id)s
+    AND season_id = %(season_id)s
+    AND status = 'Ended'
+    """
+
+    INSERT_QUERY = """
+    INSERT INTO goal_model_params (
+        tournament_id, season_id, team_id, attack, defence,
+        home_advantage, rho, matches, fitted_at
+    ) VALUES
+    """
+
+    # Новые параметры - новая версия данных лиги: кэш анализаторов бота перестает отдавать прежние
+    DATA_VERSION_QUERY = """
+    INSERT INTO data_version (version, source, tournament_id, season_id)
+    SELECT max(version) + 1, %(source)s, %(tournament_id)s, %(season_id)s FROM data_version
+    """
+
+    # Меньше матчей - параметры слишком неустойчивы
+    MIN_MATCHES = 20
+
+    def __init__(self, tournament_id: int, season_id: int, teams: Dict[int, Tuple[float, float]],
+                 home_advantage: float, rho: float, matches: int = 0, fitted_at: Optional[datetime] = None,
+                 max_goals: int = 10):
+        self.tournament_id = tournament_id
+        self.season_id = season_id
+        self.teams = teams  # team_id -> (attack, defence)
+        self.home_advantage = home_advantage
+        self.rho = rho
+        self.matches = matches
+        self.fitted_at = fitted_at
+        self.max_goals = max_goals
+
+    @classmethod
+    def from_rows(cls, tournament_id: int, season_id: int, rows: List[Tuple]) -> Optional['GoalModel']:
+        """Модель из строк PARAMS_QUERY (None - модель для лиги не подобрана)"""
+        if not rows:
+            return None
+        _, _, _, home_advantage, rho, matches, fitted_at = rows[0]
+        teams = {row[0]: (row[1], row[2]) for row in rows}
+        return cls(tournament_id, season_id, teams, home_advantage, rho, matches, fitted_at)
+
+    def __contains__(self, team_id: int) -> bool:
+        return team_id in self.teams
+
+    def expected_goals(self, home_team_id: int, away_team_id: int) -> Optional[Tuple[float, float]]:
+        if home_team_id not in self.teams or away_team_id not in self.teams:
+            return None
+        home_attack, home_defence = self.teams[home_team_id]
+        away_attack, away_defence = self.teams[away_team_id]
+        return (
+            float(np.exp(home_attack + away_defence + self.home_advantage)),
+            float(np.exp(away_attack + home_defence))
+        )
+
+    def score_matrix(self, home_team_id: int, away_team_id: int) -> Optional[np.ndarray]:
+        """P(хозяева забьют i, гости j), i, j = 0..max_goals"""
+        rates = self.expected_goals(home_team_id, away_team_id)
+        if rates is None:
+            return None
+        home_rate, away_rate = rates
+
+        matrix = np.outer(_poisson_pmf(home_rate, self.max_goals), _poisson_pmf(away_rate, self.max_goals))
+        matrix[0, 0] *= 1 - home_rate * away_rate * self.rho
+        matrix[0, 1] *= 1 + home_rate * self.rho
+        matrix[1, 0] *= 1 + away_rate * self.rho
+        matrix[1, 1] *= 1 - self.rho
+        return matrix / matrix.sum()
+
+    def predict(self, home_team_id: int, away_team_id: int) -> Dict[str, Any]:
+        """Ожидаемые голы, вероятности исходов и тоталов ({} - команды нет в модели)"""
+        matrix = self.score_matrix(home_team_id, away_team_id)
+        if matrix is None:
+            return {}
+
+        home_rate, away_rate = self.expected_goals(home_team_id, away_team_id)
+        goals = np.arange(self.max_goals + 1)
+        total_goals = goals[:, None] + goals[None, :]
+        best_home, best_away = np.unravel_index(np.argmax(matrix), matrix.shape)
+
+        totals = {}
+        for line in TOTAL_LINES:
+            over = float(matrix[total_goals > line].sum())
+            totals[line] = {'over': round(over * 100, 1), 'under': round((1 - over) * 100, 1)}
+
+        return {
+            'expected_home_goals': round(home_rate, 2),
+            'expected_away_goals': round(away_rate, 2),
+            'predicted_score': f"{home_rate:.1f}-{away_rate:.1f}",
+            'most_likely_score': f"{best_home}-{best_away}",
+            'probabilities': {
+                'home_win': round(float(np.tril(matrix, -1).sum()) * 100, 1),
+                'draw': round(float(np.trace(matrix)) * 100, 1),
+                'away_win': round(float(np.triu(matrix, 1).sum()) * 100, 1)
+            },
+            'totals': totals
+        }
+
+    @classmethod
+    async def load(cls, ch_client, tournament_id: int, season_id: int) -> Optional['GoalModel']:
+        try:
+            rows = await ch_client.execute(cls.PARAMS_QUERY, {
+                'tournament_id': tournament_id,
+                'season_id': season_id
+            }, query_name='goal_model')
+        except Exception as e:
+            print(f"❌ Ошибка загрузки параметров модели голов: {e}")
+            return None
+        return cls.from_rows(tournament_id, season_id, rows)
+
+    @classmethod
+    async def fit_league(cls, ch_client, tournament_id: int, season_id: int,
+                         dixon_coles: bool = True) -> Optional['GoalModel']:
+        """Подбирает модель по завершенным матчам сезона, сохраняет параметры и увеличивает версию данных лиги"""
+        rows = await ch_client.execute(cls.MATCHES_QUERY, {
+            'tournament_id': tournament_id,
+            'season_id': season_id
+        }, query_name='goal_model_matches')
+        if len(rows) < cls.MIN_MATCHES:
+            print(f"⚠️ Недостаточно матчей для модели голов: {len(rows)} < {cls.MIN_MATCHES}")
+            return None
+
+        matches = np.array(rows, dtype=np.int64)
+        team_ids, team_idx = np.unique(matches[:, :2], return_inverse=True)
+        team_idx = team_idx.reshape(-1, 2)
+
+        fitted = fit_dixon_coles(
+            team_idx[:, 0], team_idx[:, 1], matches[:, 2], matches[:, 3], len(team_ids),
+            dixon_coles=dixon_coles
+        )
+        if not fitted['converged']:
+            print("⚠️ Подбор модели голов не сошелся - сохраняется последнее приближение")
+
+        fitted_at = datetime.now().replace(microsecond=0)
+        model = cls(
+            tournament_id, season_id,
+            {int(team_id): (float(fitted['attack'][i]), float(fitted['defence'][i]))
+             for i, team_id in enumerate(team_ids)},
+            fitted['home_advantage'], fitted['rho'], len(rows), fitted_at
+        )
+
+        await ch_client.execute(cls.INSERT_QUERY, [
+            (tournament_id, season_id, team_id, attack, defence,
+             model.home_advantage, model.rho, model.matches, fitted_at)
+            for team_id, (attack, defence) in model.teams.items()
+        ], query_name='goal_model_save')
+        await ch_client.execute(cls.DATA_VERSION_QUERY, {
+            'source': f"goal model fit: {len(rows)} matches",
+            'tournament_id': tournament_id,
+            'season_id': season_id
+        }, query_name='data_version_bump')
+        print(f"✅ Модель голов подобрана по {len(rows)} матчам: {len(team_ids)} команд, "
+              f"домашнее преимущество {np.exp(model.home_advantage):.2f}, rho {model.rho:.3f}")
+        return model
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Подбор модели голов Пуассона / Диксона-Коулза по лиге')
+    parser.add_argument('--tournament', required=True, type=int, help='ID турнира')
+    parser.add_argument('--season', required=True, type=int, help='ID сезона')
+    parser.add_argument('--poisson', action='store_true', help='Без поправки Диксона-Коулза')
+    args = parser.parse_args()
+
+    ch_client = create_storage()
+    try:
+        await GoalModel.fit_league(ch_client, args.tournament, args.season, dixon_coles=not args.poisson)
+    finally:
+        ch_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,279 @@
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import asyncio
+import numpy as np
+from standings_snapshot import StandingsStore
+
+
+class LeagueMatrix:
+    """Прогнозы для всех пар команд лиги (N x N) одним векторным расчетом.
+
+    Домашние/гостевые показатели команд загружаются одним набором запросов
+    на лигу, затем прогноз счета, вероятности 1X2 и тотал желтых карточек
+    считаются матрицами: строка - хозяева, столбец - гости. Формулы те же,
+    что в calculate_match_result_prediction и calculate_yellow_cards_prediction;
+    рефери для всех пар по умолчанию средний (referee_avg_yellows).
+    Отбор строк совпадает с одиночными запросами: результативность - по турниру
+    и сезону, карточки и фолы - по сезону, личные встречи - за все время.
+    """
+
+    # Результативность и доля побед по площадкам (team_matches)
+    PERFORMANCE_QUERY = """
+    SELECT
+        team_id, venue,
+        count() as matches,
+        avg(goals_for) as avg_goals_scored,
+        avg(goals_against) as avg_goals_conceded,
+        avg(result = 'W') as win_rate
+    FROM team_matches FINAL
+    WHERE tournament_id = %(tournament_id)s
+    AND season_id = %(season_id)s
+    AND status = 'Ended'
+    GROUP BY team_id, venue
+    """
+
+    # Желтые карточки в матчах команды по ее площадке (карточки обеих сторон,
+    # последние версии строк - перезагрузка карточек матча их не удваивает)
+    YELLOWS_QUERY = """
+    SELECT
+        side_team_id, if((side_team_id = team_id) = (team_is_home = 1), 'home', 'away') as venue,
+        uniqExact(match_id) as matches_count,
+        count() as total_yellows
+    FROM football_cards FINAL
+    ARRAY JOIN [team_id, opponent_team_id] as side_team_id
+    WHERE season_id = %(season_id)s
+    AND card_type = 'yellow'
+    GROUP BY side_team_id, venue
+    """
+
+    # Фолы за матч (team_season_match_stats_agg)
+    FOULS_QUERY = """
+    SELECT team_id, sum(fouls) / sum(matches)
+    FROM team_season_match_stats_agg
+    WHERE season_id = %(season_id)s
+    AND team_id IN %(teams)s
+    GROUP BY team_id
+    HAVING sum(matches) > 0
+    """
+
+    # Желтые карточки в личных встречах пар команд лиги (как MatchDataLoader.H2H_QUERY)
+    H2H_YELLOWS_QUERY = """
+    SELECT p.team_low, p.team_high, sum(c.yellow_cards), countIf(c.yellow_cards > 0)
+    FROM (
+        SELECT match_id, team_low, team_high, status
+        FROM team_pair_matches
+        WHERE team_low IN %(teams)s
+        AND team_high IN %(teams)s
+        ORDER BY created_at DESC
+        LIMIT 1 BY match_id
+    ) p
+    LEFT JOIN (
+        SELECT match_id, count() as yellow_cards
+        FROM football_cards FINAL
+        WHERE card_type = 'yellow'
+        AND match_id IN (
+            SELECT match_id FROM team_pair_matches
+            WHERE team_low IN %(teams)s AND team_high IN %(teams)s
+        )
+        GROUP BY match_id
+    ) c ON c.match_id = p.match_id
+    WHERE p.status = 'Ended'
+    GROUP BY p.team_low, p.team_high
+    """
+
+    def __init__(self, tournament_id: int, season_id: int, team_ids: List[int],
+                 performance: Dict[Tuple[int, str], Tuple], yellows: Dict[Tuple[int, str], Tuple],
+                 fouls: Dict[int, float], h2h_yellows: Dict[Tuple[int, int], Tuple],
+                 standings: Dict[int, int], derby_pairs: Optional[Dict[Tuple[int, int], str]] = None,
+                 referee_avg_yellows: float = 3.0):
+        self.tournament_id = tournament_id
+        self.season_id = season_id
+        self.team_ids = list(team_ids)
+        self.index = {team_id: i for i, team_id in enumerate(self.team_ids)}
+        self.derby_pairs = derby_pairs or {}
+        self.referee_avg_yellows = referee_avg_yellows
+        n = len(self.team_ids)
+
+        # Векторы команд: [matches, avg_scored, avg_conceded, win_rate %] по площадкам
+        self.home = np.zeros((n, 4))
+        self.away = np.zeros((n, 4))
+        for (team_id, venue), (matches, scored, conceded, win_rate) in performance.items():
+            if team_id in self.index:
+                target = self.home if venue == 'home' else self.away
+                target[self.index[team_id]] = (matches, scored or 0, conceded or 0, (win_rate or 0) * 100)
+
+        # Желтые в матчах команды дома / в гостях (по умолчанию 2.0, как в одиночном расчете)
+        self.home_yellows = np.full(n, 2.0)
+        self.away_yellows = np.full(n, 2.0)
+        for (team_id, venue), (matches_count, total_yellows) in yellows.items():
+            if team_id in self.index and matches_count:
+                target = self.home_yellows if venue == 'home' else self.away_yellows
+                target[self.index[team_id]] = round(total_yellows / matches_count, 2)
+
+        self.fouls = np.array([round(fouls[team_id], 2) if team_id in fouls else 12.0
+                               for team_id in self.team_ids])
+
+        # Симметричные матрицы пар: желтые в личных встречах, разница позиций, дерби
+        self.h2h_yellows = np.full((n, n), 3.0)
+        for (team_low, team_high), (total_yellows, matches_count) in h2h_yellows.items():
+            if matches_count and team_low in self.index and team_high in self.index:
+                i, j = self.index[team_low], self.index[team_high]
+                self.h2h_yellows[i, j] = self.h2h_yellows[j, i] = round(total_yellows / matches_count, 2)
+
+        positions = np.array([standings.get(team_id, 0) for team_id in self.team_ids], dtype=float)
+        has_position = positions > 0
+        self.position_diff = np.where(
+            np.outer(has_position, has_position),
+            np.abs(positions[:, None] - positions[None, :]),
+            0
+        ).astype(int)
+
+        self.is_derby = np.zeros((n, n), dtype=bool)
+        for team1_id, team2_id in self.derby_pairs:
+            if team1_id in self.index and team2_id in self.index:
+                i, j = self.index[team1_id], self.index[team2_id]
+                self.is_derby[i, j] = self.is_derby[j, i] = True
+
+        self._compute()
+
+    @classmethod
+    async def load(cls, ch_client, tournament_id: int, season_id: int,
+                   standings: Optional[StandingsStore] = None,
+                   derby_pairs: Optional[Dict[Tuple[int, int], str]] = None,
+                   referee_avg_yellows: float = 3.0) -> 'LeagueMatrix':
+        """Загружает показатели всех команд лиги и считает матрицы прогнозов"""
+        params = {'tournament_id': tournament_id, 'season_id': season_id}
+        store = standings if standings is not None else StandingsStore()
+
+        snapshot, performance_rows, yellows_rows = await asyncio.gather(
+            store.get(ch_client, tournament_id, season_id),
+            ch_client.execute(cls.PERFORMANCE_QUERY, params, query_name='league_performance'),
+            ch_client.execute(cls.YELLOWS_QUERY, params, query_name='league_yellows')
+        )
+
+        # Команды лиги - из таблицы и сыгранных матчей
+        team_ids = list(snapshot.standings())
+        team_ids += sorted({row[0] for row in performance_rows} - set(team_ids))
+        if not team_ids:
+            return cls(tournament_id, season_id, [], {}, {}, {}, {}, {}, derby_pairs, referee_avg_yellows)
+
+        teams_params = {**params, 'teams': tuple(team_ids)}
+        fouls_rows, h2h_rows = await asyncio.gather(
+            ch_client.execute(cls.FOULS_QUERY, teams_params, query_name='league_fouls'),
+            ch_client.execute(cls.H2H_YELLOWS_QUERY, teams_params, query_name='league_h2h_yellows')
+        )
+
+        return cls(
+            tournament_id, season_id, team_ids,
+            performance={(row[0], row[1]): row[2:] for row in performance_rows},
+            yellows={(row[0], row[1]): row[2:] for row in yellows_rows},
+            fouls={row[0]: row[1] for row in fouls_rows},
+            h2h_yellows={(row[0], row[1]): row[2:] for row in h2h_rows},
+            standings=snapshot.standings(),
+            derby_pairs=derby_pairs,
+            referee_avg_yellows=referee_avg_yellows
+        )
+
+    def _compute(self):
+        """Векторный расчет прогнозов для всех пар (хозяева i, гости j)"""
+        home_matches, home_scored, home_conceded, home_win_rate = self.home.T
+        away_matches, away_scored, away_conceded, away_win_rate = self.away.T
+
+        # Прогноз есть, если у хозяев есть домашние матчи, у гостей - гостевые
+        self.valid = (home_matches[:, None] > 0) & (away_matches[None, :] > 0)
+        np.fill_diagonal(self.valid, False)
+
+        # Прогноз счета на основе домашних/гостевых показателей
+        self.home_goals = (home_scored[:, None] + away_conceded[None, :]) / 2
+        self.away_goals = (away_scored[None, :] + home_conceded[:, None]) / 2
+
+        # Вероятности исходов с учетом домашнего преимущества, нормализованные к 100%
+        home_win = (home_win_rate[:, None] + (100 - away_win_rate[None, :])) / 2
+        away_win = (away_win_rate[None, :] + (100 - home_win_rate[:, None])) / 2
+        draw = np.maximum(0, 100 - home_win - away_win)
+        total = home_win + draw + away_win
+        self.home_win_prob = home_win / total * 100
+        self.draw_prob = draw / total * 100
+        self.away_win_prob = away_win / total * 100
+
+        # Желтые карточки: 40% команды + 40% рефери + 20% личные встречи + контекст
+        team_component = (self.home_yellows[:, None] + self.away_yellows[None, :]) / 2 * 0.4
+        context_adjustment = (
+            np.where(self.is_derby, 0.3, 0.0)
+            + np.where(self.position_diff <= 3, 0.2, np.where(self.position_diff >= 8, 0.1, 0.0))
+        )
+        self.yellow_cards = (
+            team_component
+            + self.referee_avg_yellows * 0.4
+            + self.h2h_yellows * 0.2
+            + context_adjustment
+        )
+
+    def __contains__(self, team_id: int) -> bool:
+        return team_id in self.index
+
+    def match_result(self, home_team_id: int, away_team_id: int) -> Dict[str, Any]:
+        """Прогноз результата пары в формате calculate_match_result_prediction ({} - нет данных)"""
+        if home_team_id not in self.index or away_team_id not in self.index:
+            return {}
+        i, j = self.index[home_team_id], self.index[away_team_id]
+        if not self.valid[i, j]:
+            return {}
+
+        return {
+            'predicted_score': f"{self.home_goals[i, j]:.1f}-{self.away_goals[i, j]:.1f}",
+            'probabilities': {
+                'home_win': round(float(self.home_win_prob[i, j]), 1),
+                'draw': round(float(self.draw_prob[i, j]), 1),
+                'away_win': round(float(self.away_win_prob[i, j]), 1)
+            },
+            'home_stats': self._venue_stats(self.home[i]),
+            'away_stats': self._venue_stats(self.away[j])
+        }
+
+    @staticmethod
+    def _venue_stats(row: np.ndarray) -> Dict[str, Any]:
+        return {
+            'matches': int(row[0]),
+            'avg_goals_scored': float(row[1]),
+            'avg_goals_conceded': float(row[2]),
+            'win_rate': float(row[3])
+        }
+
+    def predicted_yellow_cards(self, home_team_id: int, away_team_id: int) -> Optional[float]:
+        """Прогноз желтых карточек пары при среднем рефери"""
+        if home_team_id not in self.index or away_team_id not in self.index or home_team_id == away_team_id:
+            return None
+        return round(float(self.yellow_cards[self.index[home_team_id], self.index[away_team_id]]), 2)
+
+    def yellow_cards_inputs(self, home_team_id: int, away_team_id: int) -> Dict[str, Any]:
+        """Командные показатели пары для calculate_yellow_cards_prediction (рефери - из данных матча)"""
+        i, j = self.index.get(home_team_id), self.index.get(away_team_id)
+        known = i is not None and j is not None
+        return {
+            'team1_home_away': {'home': {'avg_yellows': float(self.home_yellows[i]) if i is not None else 2.0}},
+            'team2_home_away': {'away': {'avg_yellows': float(self.away_yellows[j]) if j is not None else 2.0}},
+            'team1_fouls': {'avg_fouls': float(self.fouls[i]) if i is not None else 12.0},
+            'team2_fouls': {'avg_fouls': float(self.fouls[j]) if j is not None else 12.0},
+            'h2h_stats': {'avg_yellows': float(self.h2h_yellows[i, j]) if known else 3.0},
+            'position_diff': int(self.position_diff[i, j]) if known else 0
+        }
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Плоские строки прогнозов по всем парам с данными - для выгрузки"""
+        for i, j in zip(*np.nonzero(self.valid)):
+            yield {
+                'tournament_id': self.tournament_id,
+                'season_id': self.season_id,
+                'home_team_id': self.team_ids[i],
+                'away_team_id': self.team_ids[j],
+                'predicted_home_goals': round(float(self.home_goals[i, j]), 2),
+                'predicted_away_goals': round(float(self.away_goals[i, j]), 2),
+                'home_win_prob': round(float(self.home_win_prob[i, j]), 1),
+                'draw_prob': round(float(self.draw_prob[i, j]), 1),
+                'away_win_prob': round(float(self.away_win_prob[i, j]), 1),
+                'predicted_yellow_cards': round(float(self.yellow_cards[i, j]), 2),
+                'home_avg_fouls': float(self.fouls[i]),
+                'away_avg_fouls': float(self.fouls[j]),
+                'position_diff': int(self.position_diff[i, j]),
+                'is_derby': bool(self.is_derby[i, j])
+            }
@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+
+# Разделы отчета в порядке вывода полного анализа
+SECTION_ORDER = [
+    'positions',            # 🏆 ПОЗИЦИЯ В ТАБЛИЦЕ
+    'goals',                # ⚽ РЕЗУЛЬТАТИВНОСТЬ
+    'shots',                # 🎯 УДАРЫ
+    'xg',                   # 📈 РЕАЛЬНЫЙ xG АНАЛИЗ
+    'efficiency',           # 🎯 ЭФФЕКТИВНОСТЬ РЕАЛИЗАЦИИ
+    'possession',           # 📊 КОНТРОЛЬ ИГРЫ
+    'passing',              # 🔄 ТОЧНОСТЬ ПЕРЕДАЧ
+    'crosses',              # 🔄 АКТИВНОСТЬ ФЛАНГОВ
+    'long_balls',           # 🎯 ДАЛЬНИЕ АТАКИ
+    'defense',              # 🛡️ ОБОРОНА
+    'corners',              # 🎯 СТАТИСТИКА УГЛОВЫХ
+    'expected_activity',    # 📊 ОЖИДАЕМАЯ АКТИВНОСТЬ
+    'fouls',                # 🟨 АГРЕССИВНОСТЬ
+    'yellow_cards',         # 🟨 ЖЕЛТЫЕ КАРТОЧКИ
+    'opponent_cards',       # 🟨 КАРТОЧКИ У СОПЕРНИКОВ
+    'aggression',           # 📊 АНАЛИЗ АГРЕССИВНОСТИ
+    'chances_quality',      # 🎪 КАЧЕСТВО МОМЕНТОВ
+    'attack_zones',         # 🎯 АНАЛИЗ ЗОН АТАК И УЯЗВИМОСТЕЙ / 🏹 АТАКУЕТ
+    'form',                 # 📈 ФОРМА
+    'h2h',                  # 📊 ИСТОРИЯ ЛИЧНЫХ ВСТРЕЧ
+    'position_forecast',    # 🏆 ПРОГНОЗ С УЧЕТОМ ПОЗИЦИИ В ТАБЛИЦЕ
+    'recommendations',      # 💰 РЕКОМЕНДАЦИИ
+    'insights',             # 📈 КЛЮЧЕВЫЕ ИНСАЙТЫ
+    'exclusive',            # 🎲 ЭКСКЛЮЗИВНЫЕ ПРОГНОЗЫ (заголовок блока)
+    'cards_forecast',       # 🟨 АНАЛИЗ ДИСЦИПЛИНЫ С УЧЕТОМ РЕФЕРИ
+    'home_away_forecast',   # 🏠🛬 ПРОГНОЗ РЕЗУЛЬТАТА С УЧЕТОМ ДОМАШНЕГО СТАДИОНА
+]
+
+
+# Наборы данных MatchDataLoader (по одному запросу на набор):
+#   team_cache  - турнирная таблица и кэш статистики команд
+#   match_stats - xG, фланги, фолы и угловые по football_match_stats
+#   matches     - матчи сезона с желтыми карточками
+#   h2h         - итоги личных встреч и карточек в них
+#   referee     - рефери матча и его статистика в турнире
+#   goal_model  - параметры модели голов лиги (goal_model.py)
+#   league_matrix - прогнозы результата и карточек для всех пар лиги (league_matrix.py)
+DATASETS = ('team_cache', 'match_stats', 'matches', 'h2h', 'referee', 'goal_model', 'league_matrix')
+
+# Какие наборы данных нужны каждому разделу
+SECTION_DATASETS = {
+    'positions': {'team_cache'},
+    'goals': {'team_cache'},
+    'shots': {'team_cache'},
+    'xg': {'match_stats'},
+    'efficiency': {'team_cache', 'match_stats'},
+    'possession': {'team_cache'},
+    'passing': {'team_cache'},
+    'crosses': {'match_stats'},
+    'long_balls': {'match_stats'},
+    'defense': {'team_cache'},
+    'corners': {'match_stats'},
+    'expected_activity': {'match_stats'},
+    'fouls': {'team_cache'},
+    'yellow_cards': {'matches'},
+    'opponent_cards': {'matches'},
+    'aggression': {'matches'},
+    'chances_quality': {'team_cache'},
+    'attack_zones': {'team_cache'},
+    'form': {'matches'},
+    'h2h': {'h2h'},
+    'position_forecast': {'team_cache'},
+    'recommendations': {'team_cache', 'goal_model'},
+    'insights': {'team_cache', 'match_stats'},
+    'exclusive': set(),
+    'cards_forecast': {'league_matrix', 'referee'},
+    'home_away_forecast': {'league_matrix', 'goal_model'},
+}
+
+
+def required_datasets(sections: Optional[Iterable[str]] = None) -> Set[str]:
+    """Наборы данных, необходимые для расчета разделов (по умолчанию - всех)"""
+    keys = SECTION_ORDER if sections is None else sections
+    datasets = set()
+    for key in keys:
+        datasets |= SECTION_DATASETS.get(key, set())
+    return datasets
+
+
+@dataclass
+class MatchAnalysis:
+    """Результат анализа матча: данные по именованным разделам без форматирования"""
+    team1_id: int
+    team2_id: int
+    team1_name: str
+    team2_name: str
+    tournament_id: int
+    season_id: int
+    sections: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def has_section(self, key: str) -> bool:
+        return key in self.sections
+
+    def section(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.sections.get(key)
+
+    def available_sections(self, keys: Optional[List[str]] = None) -> List[str]:
+        """Разделы из keys (или все) в порядке отчета, для которых есть данные"""
+        wanted = SECTION_ORDER if keys is None else [key for key in SECTION_ORDER if key in keys]
+        return [key for key in wanted if key in self.sections]
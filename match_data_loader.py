@@ -0,0 +1,626 @@
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import asyncio
+from aggregates_cache import AggregatesCache
+from goal_model import GoalModel
+from league_matrix import LeagueMatrix
+from standings_snapshot import StandingsSnapshot, StandingsStore
+
+
+class MatchDataLoader:
+    """Пакетная загрузка всех данных для отчета по матчу.
+
+    Вместо ~25 отдельных запросов по одному показателю загружается по
+    одному пакету на набор данных (DATASET_LOADERS), каждый сразу для обеих
+    команд; наборы независимы и загружаются параллельно. Можно загрузить только часть наборов
+    данных, если отчет строится не целиком.
+    Результат - словарь (bundle) с теми же структурами, что возвращают
+    одиночные методы AdvancedFootballAnalyzer.
+
+    load_round загружает те же наборы сразу для всех матчей тура,
+    поэтому тур стоит примерно столько же, сколько один матч.
+
+    С кэшем агрегатов строки запросов переиспользуются до следующей загрузки
+    данных: таблица лиги - по турниру и сезону, статистика матчей - по
+    каждой команде, матчи, личные встречи и рефери - по набору матчей.
+    Турнирная таблица - снимок StandingsStore, общий с остальными отчетами;
+    матрица прогнозов лиги (LeagueMatrix) считается один раз на турнир и сезон.
+    """
+
+    # 1. Кэш статистики команд лиги (последние версии строк); турнирная
+    #    таблица берется из общего снимка StandingsStore
+    TEAM_STATS_QUERY = """
+    SELECT
+        team_id, matches_played, goals_scored, goals_conceded, avg_possession,
+        avg_shots, avg_shots_on_target, avg_corners,
+        avg_fouls, avg_yellow_cards, big_chances, big_chances_missed,
+        goals_inside_box, goals_outside_box, headed_goals, pass_accuracy, fast_breaks
+    FROM team_stats_cache
+    WHERE tournament_id = %(tournament_id)s
+    AND season_id = %(season_id)s
+    ORDER BY updated_at DESC
+    LIMIT 1 BY team_id
+    """
+
+    # 2. Агрегаты статистики матчей по команде и площадке из материализованной
+    #    таблицы team_season_match_stats_agg (несколько строк на команду вместо
+    #    сканирования сезона; teams - кортеж id команд)
+    MATCH_STATS_QUERY = """
+    SELECT
+        team_id, venue,
+        sum(matches) as rows_count,
+        sum(xg_sum), sum(xg_count),
+        sum(total_crosses), sum(accurate_crosses),
+        sum(total_long_balls), sum(accurate_long_balls),
+        sum(fouls),
+        sum(corners_for), sum(corners_against), sum(corners_against_matches)
+    FROM team_season_match_stats_agg
+    WHERE season_id = %(season_id)s
+    AND team_id IN %(teams)s
+    GROUP BY team_id, venue
+    """
+
+    # 3. Матчи сезона команд (teams - кортеж id) с желтыми карточками по сторонам.
+    #    Читаются из team_matches (строка на команду и матч): выборка по командам -
+    #    диапазоны первичного ключа вместо сканирования всех матчей
+    MATCHES_QUERY = """
+    SELECT
+        tm.match_id, tm.tournament_id, tm.season_id, tm.match_date,
+        tm.home_team_id, tm.away_team_id, tm.home_score, tm.away_score,
+        c.home_yellows, c.away_yellows
+    FROM (
+        SELECT
+            match_id, tournament_id, season_id, match_date,
+            if(venue = 'home', team_id, opponent_id) as home_team_id,
+            if(venue = 'home', opponent_id, team_id) as away_team_id,
+            if(venue = 'home', goals_for, goals_against) as home_score,
+            if(venue = 'home', goals_against, goals_for) as away_score
+        FROM team_matches
+        WHERE team_id IN %(teams)s
+        AND status = 'Ended'
+        AND season_id = %(season_id)s
+        ORDER BY match_date DESC, created_at DESC
+        LIMIT 1 BY match_id
+    ) tm
+    LEFT JOIN (
+        SELECT
+            match_id,
+            countIf(team_is_home = 1) as home_yellows,
+            countIf(team_is_home = 0) as away_yellows
+        FROM football_cards FINAL
+        WHERE card_type = 'yellow'
+        AND season_id = %(season_id)s
+        AND (team_id IN %(teams)s OR opponent_team_id IN %(teams)s)
+        GROUP BY match_id
+    ) c ON tm.match_id = c.match_id
+    ORDER BY tm.match_date DESC
+    """
+
+    # 4. Итоги личных встреч канонических пар (team_low < team_high) - матчи пары
+    #    по первичному ключу team_pair_matches (последняя версия строки матча)
+    #    и желтые карточки в них
+    H2H_QUERY = """
+    SELECT
+        p.team_low, p.team_high,
+        count(),
+        countIf(p.low_goals > p.high_goals),
+        countIf(p.high_goals > p.low_goals),
+        countIf(p.low_goals = p.high_goals),
+        sum(p.low_goals), sum(p.high_goals),
+        sum(c.yellow_cards), countIf(c.yellow_cards > 0)
+    FROM (
+        SELECT match_id, team_low, team_high, low_goals, high_goals, status
+        FROM team_pair_matches
+        WHERE (team_low, team_high) IN %(pairs)s
+        ORDER BY created_at DESC
+        LIMIT 1 BY match_id
+    ) p
+    LEFT JOIN (
+        SELECT match_id, count() as yellow_cards
+        FROM football_cards FINAL
+        WHERE card_type = 'yellow'
+        AND match_id IN (SELECT match_id FROM team_pair_matches WHERE (team_low, team_high) IN %(pairs)s)
+        GROUP BY match_id
+    ) c ON c.match_id = p.match_id
+    WHERE p.status = 'Ended'
+    GROUP BY p.team_low, p.team_high
+    """
+
+    # 5. Рефери, назначенные на матчи (fixtures - кортеж пар (хозяева, гости)),
+    #    и все их строки в турнире
+    REFEREE_QUERY = """
+    SELECT
+        referee_id, referee_name, referee_yellow_cards, referee_red_cards,
+        referee_yellow_red_cards, referee_games, referee_country,
+        home_team_id, away_team_id, season_id
+    FROM match_fixtures
+    WHERE tournament_id = %(tournament_id)s
+    AND referee_id IN (
+        SELECT referee_id FROM match_fixtures
+        WHERE (home_team_id, away_team_id) IN %(fixtures)s
+            AND tournament_id = %(tournament_id)s
+            AND season_id = %(season_id)s
+        ORDER BY start_timestamp DESC
+        LIMIT 1 BY home_team_id, away_team_id
+    )
+    ORDER BY start_timestamp DESC
+    """
+
+    # Набор данных -> метод загрузки строк (см. match_analysis.DATASETS)
+    DATASET_LOADERS = {
+        'team_cache': '_fetch_team_cache',
+        'match_stats': '_fetch_match_stats',
+        'matches': '_fetch_matches',
+        'h2h': '_fetch_h2h',
+        'referee': '_fetch_referee',
+        'goal_model': '_fetch_goal_model',
+        'league_matrix': '_fetch_league_matrix'
+    }
+
+    def __init__(self, ch_client, cache: Optional[AggregatesCache] = None,
+                 standings: Optional[StandingsStore] = None,
+                 derby_pairs: Optional[Dict[Tuple[int, int], str]] = None):
+        self.ch_client = ch_client
+        self.cache = cache
+        self.standings = standings if standings is not None else StandingsStore(cache)
+        self.derby_pairs = derby_pairs
+
+    async def load(self, team1_id: int, team2_id: int, tournament_id: int, season_id: int,
+                   datasets: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Загружает данные для отчета по матчу (team1 - хозяева, team2 - гости).
+
+        datasets ограничивает загрузку нужными наборами данных; по умолчанию
+        загружаются все. Ключи незагруженных наборов в bundle отсутствуют.
+        """
+        bundles = await self.load_round([(team1_id, team2_id)], tournament_id, season_id, datasets)
+        return bundles[(team1_id, team2_id)]
+
+    async def load_round(self, fixtures: List[Tuple[int, int]], tournament_id: int, season_id: int,
+                         datasets: Optional[Iterable[str]] = None) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """Загружает данные сразу для нескольких матчей турнира (пары (хозяева, гости)).
+
+        Каждый набор данных загружается одним запросом на все матчи, bundle
+        каждого матча собирается из общих строк в памяти.
+        """
+        fixtures = list(dict.fromkeys(fixtures))
+        params = {
+            'teams': tuple(dict.fromkeys(team_id for fixture in fixtures for team_id in fixture)),
+            'pairs': tuple(sorted({self.pair_key(*fixture) for fixture in fixtures})),
+            'fixtures': tuple(fixtures),
+            'tournament_id': tournament_id,
+            'season_id': season_id
+        }
+
+        names = [name for name in self.DATASET_LOADERS if datasets is None or name in datasets]
+        if self.cache is not None and names:
+            # Версия данных проверяется один раз до параллельной загрузки наборов
+            await self.cache.data_version(self.ch_client, tournament_id, season_id)
+        parts = await asyncio.gather(
+            *(getattr(self, self.DATASET_LOADERS[name])(params) for name in names)
+        )
+        rows_by_dataset = dict(zip(names, parts))
+
+        # Таблица лиги, модель голов и матрица прогнозов общие для всех матчей - разбираются один раз
+        team_cache = self.parse_team_cache(*rows_by_dataset['team_cache']) if 'team_cache' in rows_by_dataset else {}
+        league = {}
+        if 'goal_model' in rows_by_dataset:
+            league['goal_model'] = GoalModel.from_rows(tournament_id, season_id, rows_by_dataset['goal_model'])
+        if 'league_matrix' in rows_by_dataset:
+            league['league_matrix'] = rows_by_dataset['league_matrix']
+
+        bundles = {}
+        for team1_id, team2_id in fixtures:
+            bundle = {'team1_id': team1_id, 'team2_id': team2_id}
+            bundle.update(team_cache)
+            bundle.update(league)
+            if 'match_stats' in rows_by_dataset:
+                bundle.update(self.parse_match_stats(rows_by_dataset['match_stats'], team1_id, team2_id))
+            if 'matches' in rows_by_dataset:
+                bundle.update(self.parse_matches(rows_by_dataset['matches'], team1_id, team2_id,
+                                                 tournament_id, season_id))
+            if 'h2h' in rows_by_dataset:
+                bundle.update(self.parse_h2h(rows_by_dataset['h2h'], team1_id, team2_id))
+            if 'referee' in rows_by_dataset:
+                bundle.update(self.parse_referee(rows_by_dataset['referee'], team1_id, team2_id, season_id))
+            bundles[(team1_id, team2_id)] = bundle
+
+        return bundles
+
+    @staticmethod
+    def pair_key(team1_id: int, team2_id: int) -> Tuple[int, int]:
+        """Каноническая пара команд (меньший id первым) - ключ таблиц личных встреч"""
+        return min(team1_id, team2_id), max(team1_id, team2_id)
+
+    async def _execute(self, name: str, query: str, params: Dict[str, Any]) -> List[Tuple]:
+        return await self.ch_client.execute(query, params, query_name=name)
+
+    async def _execute_cached(self, name: str, key: tuple, query: str, params: Dict[str, Any]) -> List[Tuple]:
+        if self.cache is None:
+            return await self._execute(name, query, params)
+        return await self.cache.get_or_load(self.ch_client, name, key, lambda: self._execute(name, query, params),
+                                            params['tournament_id'], params['season_id'])
+
+    async def _execute_per_team(self, name: str, team_ids: Tuple[int, ...], key: tuple,
+                                query: str, params: Dict[str, Any]) -> List[Tuple]:
+        """Строки запроса по командам (team_id - первый столбец); из БД - только отсутствующие в кэше"""
+        version = (await self.cache.data_version(self.ch_client, params['tournament_id'], params['season_id'])
+                   if self.cache else None)
+        team_rows = {}
+        if version is not None:
+            for team_id in team_ids:
+                rows = self.cache.get((name, team_id, *key, version))
+                if rows is not AggregatesCache.MISSING:
+                    team_rows[team_id] = rows
+
+        missing = tuple(team_id for team_id in team_ids if team_id not in team_rows)
+        if missing:
+            rows = await self._execute(name, query, {**params, 'teams': missing})
+            for team_id in missing:
+                team_rows[team_id] = [row for row in rows if row[0] == team_id]
+                if version is not None:
+                    self.cache.set((name, team_id, *key, version), team_rows[team_id])
+
+        return [row for team_id in team_ids for row in team_rows[team_id]]
+
+    async def _fetch_team_cache(self, params: Dict[str, Any]) -> Tuple[StandingsSnapshot, List[Tuple]]:
+        """Снимок турнирной таблицы и кэш статистики"""
+        async def fetch_stats():
+            try:
+                return await self._execute_cached(
+                    'team_stats_cache', (params['tournament_id'], params['season_id']), self.TEAM_STATS_QUERY, params
+                )
+            except Exception as e:
+                print(f"❌ Ошибка пакетной загрузки кэша статистики: {e}")
+                return []
+
+        return await asyncio.gather(
+            self.standings.get(self.ch_client, params['tournament_id'], params['season_id']),
+            fetch_stats()
+        )
+
+    async def _fetch_match_stats(self, params: Dict[str, Any]) -> List[Tuple]:
+        """xG, фланги, фолы и угловые команд"""
+        try:
+            return await self._execute_per_team(
+                'match_stats', params['teams'], (params['season_id'],), self.MATCH_STATS_QUERY, params
+            )
+        except Exception as e:
+            print(f"❌ Ошибка пакетной загрузки статистики матчей: {e}")
+            return []
+
+    async def _fetch_matches(self, params: Dict[str, Any]) -> List[Tuple]:
+        """Форма, дом/выезд и желтые карточки"""
+        try:
+            return await self._execute_cached(
+                'matches', (params['season_id'], params['teams']), self.MATCHES_QUERY, params
+            )
+        except Exception as e:
+            print(f"❌ Ошибка пакетной загрузки матчей: {e}")
+            return []
+
+    async def _fetch_h2h(self, params: Dict[str, Any]) -> List[Tuple]:
+        """Итоги личных встреч и карточек в них"""
+        try:
+            return await self._execute_cached('h2h', (params['pairs'],), self.H2H_QUERY, params)
+        except Exception as e:
+            print(f"❌ Ошибка пакетной загрузки личных встреч: {e}")
+            return []
+
+    async def _fetch_referee(self, params: Dict[str, Any]) -> List[Tuple]:
+        """Рефери матчей и их статистика в турнире"""
+        try:
+            return await self._execute_cached(
+                'referee', (params['tournament_id'], params['season_id'], params['fixtures']),
+                self.REFEREE_QUERY, params
+            )
+        except Exception as e:
+            print(f"❌ Ошибка пакетной загрузки рефери: {e}")
+            return []
+
+    async def _fetch_goal_model(self, params: Dict[str, Any]) -> List[Tuple]:
+        """Параметры модели голов лиги (пусто - модель не подобрана)"""
+        try:
+            return await self._execute_cached(
+                'goal_model', (params['tournament_id'], params['season_id']), GoalModel.PARAMS_QUERY, params
+            )
+        except Exception as e:
+            print(f"❌ Ошибка пакетной загрузки модели голов: {e}")
+            return []
+
+    async def load_league_matrix(self, tournament_id: int, season_id: int) -> LeagueMatrix:
+        """Прогнозы для всех пар команд лиги (кэшируются до новой версии данных лиги)"""
+        loader = lambda: LeagueMatrix.load(
+            self.ch_client, tournament_id, season_id, self.standings, self.derby_pairs
+        )
+        if self.cache is None:
+            return await loader()
+        return await self.cache.get_or_load(self.ch_client, 'league_matrix', (tournament_id, season_id), loader,
+                                            tournament_id, season_id)
+
+    async def _fetch_league_matrix(self, params: Dict[str, Any]) -> LeagueMatrix:
+        """Матрица прогнозов лиги (пустая - при ошибке загрузки)"""
+        try:
+            return await self.load_league_matrix(params['tournament_id'], params['season_id'])
+        except Exception as e:
+            print(f"❌ Ошибка загрузки матрицы прогнозов лиги: {e}")
+            return LeagueMatrix(params['tournament_id'], params['season_id'], [], {}, {}, {}, {}, {})
+
+    @staticmethod
+    def parse_team_cache(snapshot: StandingsSnapshot, rows: List[Tuple]) -> Dict[str, Any]:
+        positions = {team_id: snapshot.team(team_id) for team_id in snapshot.standings()}
+        team_stats = {}
+
+        # Статистика - только для команд из таблицы
+        for row in rows:
+            if row[0] not in positions:
+                continue
+            team_stats[row[0]] = {
+                'matches': row[1],
+                'goalsScored': row[2],
+                'goalsConceded': row[3],
+                'averageBallPossession': row[4],
+                'shots': row[5],
+                'shotsOnTarget': row[6],
+                'corners': row[7],
+                'fouls': row[8],
+                'yellowCards': row[9],
+                'bigChances': row[10],
+                'bigChancesMissed': row[11],
+                'goalsFromInsideTheBox': row[12],
+                'goalsFromOutsideTheBox': row[13],
+                'headedGoals': row[14],
+                'accuratePassesPercentage': row[15],
+                'fastBreaks': row[16]
+            }
+
+        return {'standings': snapshot.standings(), 'positions': positions, 'team_stats': team_stats}
+
+    @staticmethod
+    def _corners_dict(corners_for: float, for_matches: int,
+                      corners_against: float, against_matches: int) -> Dict[str, Any]:
+        if not for_matches and not against_matches:
+            return {'avg_corners_for': 0, 'avg_corners_against': 0, 'corners_balance': 0}
+        avg_for = corners_for / for_matches if for_matches else 0
+        avg_against = corners_against / against_matches if against_matches else 0
+        return {
+            'avg_corners_for': round(avg_for, 1),
+            'avg_corners_against': round(avg_against, 1),
+            'corners_balance': round(avg_for - avg_against, 1)
+        }
+
+    @classmethod
+    def parse_match_stats(cls, rows: List[Tuple], team1_id: int, team2_id: int) -> Dict[str, Any]:
+        # Суммируем строки по площадкам, чтобы получить и общие, и домашние/гостевые показатели
+        totals = {}
+        corners_by_venue = {}
+
+        for (team_id, team_type, rows_count, xg_sum, xg_count,
+             crosses, accurate_crosses, long_balls, accurate_long_balls, fouls,
+             corners_for, corners_against, corners_against_matches) in rows:
+            acc = totals.setdefault(team_id, [0] * 11)
+            for i, value in enumerate((rows_count, xg_sum, xg_count, crosses, accurate_crosses,
+                                       long_balls, accurate_long_balls, fouls,
+                                       corners_for, corners_against, corners_against_matches)):
+                acc[i] += value or 0
+            corners_by_venue.setdefault(team_id, {})[team_type] = cls._corners_dict(
+                corners_for or 0, rows_count or 0, corners_against or 0, corners_against_matches or 0
+            )
+
+        xg = {}
+        crosses_longballs = {}
+        fouls_stats = {}
+        corners = {}
+
+        for team_id in (team1_id, team2_id):
+            acc = totals.get(team_id)
+            if not acc or not acc[0]:
+                xg[team_id] = 0.0
+                fouls_stats[team_id] = {'avg_fouls': 12.0}
+                corners[team_id] = {
+                    'total': cls._corners_dict(0, 0, 0, 0),
+                    'home': cls._corners_dict(0, 0, 0, 0),
+                    'away': cls._corners_dict(0, 0, 0, 0)
+                }
+                continue
+
+            rows_count = acc[0]
+            xg[team_id] = acc[1] / acc[2] if acc[2] else 0.0
+            crosses_longballs[team_id] = {
+                'total_crosses': acc[3] / rows_count,
+                'accurate_crosses': acc[4] / rows_count,
+                'total_long_balls': acc[5] / rows_count,
+                'accurate_long_balls': acc[6] / rows_count
+            }
+            fouls_stats[team_id] = {'avg_fouls': round(acc[7] / rows_count, 2)}
+
+            venues = corners_by_venue.get(team_id, {})
+            corners[team_id] = {
+                'total': cls._corners_dict(acc[8], rows_count, acc[9], acc[10]),
+                'home': venues.get('home', cls._corners_dict(0, 0, 0, 0)),
+                'away': venues.get('away', cls._corners_dict(0, 0, 0, 0))
+            }
+
+        return {
+            'xg': xg,
+            'crosses_longballs': crosses_longballs,
+            'fouls': fouls_stats,
+            'corners': corners
+        }
+
+    @staticmethod
+    def _yellow_dict(matches_count: int, total_yellows: int, default_avg: float) -> Dict[str, Any]:
+        if matches_count > 0:
+            return {
+                'matches_count': matches_count,
+                'total_yellows': total_yellows,
+                'avg_yellows': round(total_yellows / matches_count, 2)
+            }
+        return {'matches_count': 0, 'total_yellows': 0, 'avg_yellows': default_avg}
+
+    @classmethod
+    def parse_matches(cls, rows: List[Tuple], team1_id: int, team2_id: int,
+                      tournament_id: int, season_id: int) -> Dict[str, Any]:
+        form = {team1_id: [], team2_id: []}
+        performance_acc = {team1_id: {}, team2_id: {}}
+        yellow_acc = {team1_id: [0, 0], team2_id: [0, 0]}
+        venue_yellow_acc = {team1_id: {}, team2_id: {}}
+        opponent_yellow_acc = {team1_id: [0, 0], team2_id: [0, 0]}
+
+        # Строки отсортированы по дате (свежие первыми)
+        for (match_id, match_tournament_id, match_season_id, match_date,
+             home_id, away_id, home_score, away_score, home_yellows, away_yellows) in rows:
+            home_yellows = home_yellows or 0
+            away_yellows = away_yellows or 0
+            match_yellows = home_yellows + away_yellows
+
+            if match_season_id == season_id:
+                for team_id in (team1_id, team2_id):
+                    if team_id == home_id:
+                        venue = 'home'
+                        scored, conceded = home_score, away_score
+                        opponent_yellows = away_yellows
+                    elif team_id == away_id:
+                        venue = 'away'
+                        scored, conceded = away_score, home_score
+                        opponent_yellows = home_yellows
+                    else:
+                        continue
+
+                    if scored > conceded:
+                        result = 'W'
+                    elif scored == conceded:
+                        result = 'D'
+                    else:
+                        result = 'L'
+
+                    if len(form[team_id]) < 5:
+                        form[team_id].append(
+                            (match_id, home_id, away_id, home_score, away_score, match_date, result)
+                        )
+
+                    if match_tournament_id == tournament_id:
+                        acc = performance_acc[team_id].setdefault(venue, [0, 0, 0, 0])
+                        acc[0] += 1
+                        acc[1] += scored
+                        acc[2] += conceded
+                        acc[3] += 1 if result == 'W' else 0
+
+                    # Карточки учитываются только в матчах, где они были
+                    if match_yellows > 0:
+                        yellow_acc[team_id][0] += 1
+                        yellow_acc[team_id][1] += match_yellows
+                        venue_acc = venue_yellow_acc[team_id].setdefault(venue, [0, 0])
+                        venue_acc[0] += 1
+                        venue_acc[1] += match_yellows
+                    if opponent_yellows > 0:
+                        opponent_yellow_acc[team_id][0] += 1
+                        opponent_yellow_acc[team_id][1] += opponent_yellows
+
+        home_away_performance = {}
+        yellow_stats = {}
+        home_away_yellow_stats = {}
+        opponent_yellow_stats = {}
+
+        for team_id in (team1_id, team2_id):
+            performance = {'home': {}, 'away': {}}
+            for venue, (matches, scored, conceded, wins) in performance_acc[team_id].items():
+                performance[venue] = {
+                    'matches': matches,
+                    'avg_goals_scored': scored / matches,
+                    'avg_goals_conceded': conceded / matches,
+                    'win_rate': wins / matches * 100
+                }
+            home_away_performance[team_id] = performance
+
+            yellow_stats[team_id] = cls._yellow_dict(*yellow_acc[team_id], default_avg=2.0)
+
+            venue_stats = {'home': {'avg_yellows': 2.0}, 'away': {'avg_yellows': 2.0}}
+            for venue, (matches_count, total_yellows) in venue_yellow_acc[team_id].items():
+                venue_stats[venue] = cls._yellow_dict(matches_count, total_yellows, default_avg=2.0)
+            home_away_yellow_stats[team_id] = venue_stats
+
+            matches_with_cards, total_opponent_yellows = opponent_yellow_acc[team_id]
+            if matches_with_cards > 0:
+                opponent_yellow_stats[team_id] = {
+                    'total_opponent_yellows': total_opponent_yellows,
+                    'matches_with_opponent_cards': matches_with_cards,
+                    'avg_opponent_yellows': round(total_opponent_yellows / matches_with_cards, 2)
+                }
+            else:
+                opponent_yellow_stats[team_id] = {
+                    'total_opponent_yellows': 0, 'matches_with_opponent_cards': 0, 'avg_opponent_yellows': 2.0
+                }
+
+        return {
+            'form': form,
+            'home_away_performance': home_away_performance,
+            'yellow_stats': yellow_stats,
+            'home_away_yellow_stats': home_away_yellow_stats,
+            'opponent_yellow_stats': opponent_yellow_stats
+        }
+
+    @classmethod
+    def parse_h2h(cls, rows: List[Tuple], team1_id: int, team2_id: int) -> Dict[str, Any]:
+        total_matches = team1_wins = team2_wins = draws = team1_goals = team2_goals = 0
+        yellow_cards = yellow_matches = 0
+
+        pair = cls.pair_key(team1_id, team2_id)
+        pair_rows = [row for row in rows if (row[0], row[1]) == pair]
+        if pair_rows:
+            (team_low, team_high, total_matches, low_wins, high_wins, draws,
+             low_goals, high_goals, yellow_cards, yellow_matches) = pair_rows[0]
+            # Итоги хранятся для меньшего id (low) и большего (high)
+            if team1_id == team_low:
+                team1_wins, team2_wins, team1_goals, team2_goals = low_wins, high_wins, low_goals, high_goals
+            else:
+                team1_wins, team2_wins, team1_goals, team2_goals = high_wins, low_wins, high_goals, low_goals
+
+        h2h = {
+            'total_matches': total_matches,
+            'team1_wins': team1_wins,
+            'team2_wins': team2_wins,
+            'draws': draws,
+            'team1_goals': team1_goals,
+            'team2_goals': team2_goals,
+            'team1_avg_goals': team1_goals / total_matches if total_matches else 0,
+            'team2_avg_goals': team2_goals / total_matches if total_matches else 0,
+            'team1_win_rate': team1_wins / total_matches * 100 if total_matches else 0,
+            'team2_win_rate': team2_wins / total_matches * 100 if total_matches else 0
+        }
+
+        return {
+            'h2h': h2h,
+            'h2h_yellow_stats': cls._yellow_dict(yellow_matches, yellow_cards, default_avg=3.0)
+        }
+
+    @staticmethod
+    def parse_referee(rows: List[Tuple], team1_id: int, team2_id: int, season_id: int) -> Dict[str, Any]:
+        referee = {}
+        referee_yellow_stats = {'name': 'Неизвестно', 'total_yellows': 0, 'games': 0, 'avg_yellows': 3.0}
+
+        # Строки могут относиться к рефери нескольких матчей - оставляем рефери этого матча
+        referee_id = next((row[0] for row in rows
+                           if row[7] == team1_id and row[8] == team2_id and row[9] == season_id), None)
+        rows = [row for row in rows if row[0] == referee_id]
+
+        # Строки отсортированы по start_timestamp (свежие первыми)
+        for (referee_id, name, yellow_cards, red_cards, yellow_red_cards, games, country,
+             home_id, away_id, fixture_season_id) in rows:
+            if not referee and home_id == team1_id and away_id == team2_id and fixture_season_id == season_id:
+                referee = {
+                    'referee_id': referee_id,
+                    'name': name,
+                    'yellow_cards': yellow_cards,
+                    'red_cards': red_cards,
+                    'yellow_red_cards': yellow_red_cards,
+                    'games': games,
+                    'country': country
+                }
+            if referee_yellow_stats['games'] == 0 and games > 0:
+                referee_yellow_stats = {
+                    'name': name,
+                    'total_yellows': yellow_cards,
+                    'games': games,
+                    'avg_yellows': round(yellow_cards / games, 2)
+                }
+
+        return {'referee': referee, 'referee_yellow_stats': referee_yellow_stats}
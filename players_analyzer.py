@@ -1,55 +1,140 @@
 import pandas as pd
-from clickhouse_driver import Client
+import numpy as np
+from clickhouse_async import AsyncClickHouse
+from storage_backends import create_storage
 import os
 import asyncio
 from typing import Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 
 class PlayersAnalyzer:
-    def __init__(self):
-        self.ch_client = None
+    # Поля игрока в дашборде (порядок значений при сборке из столбцов запроса)
+    PLAYER_FIELDS = ('id', 'name', 'position', 'rating', 'goals', 'assists', 'shots', 'pass_accuracy',
+                     'duel_success', 'saves', 'form_trend', 'matches', 'avg_minutes')
+    # Матчей в окне тренда формы
+    TREND_MATCHES = 5
+    # Тренд игрока без достаточной истории матчей
+    STABLE_TREND = {'percent': 0, 'direction': 'stable', 'icon': '➡️'}
+
+    def __init__(self, ch_client: AsyncClickHouse = None):
+        # Общий клиент с пулом соединений передается ботом; без него создается собственный
+        self.ch_client = ch_client
+        self._owns_client = ch_client is None
     
     async def __aenter__(self):
         """Инициализация подключения при входе в контекст"""
-        self.ch_client = Client(
-            host='localhost',
-            user='username', 
-            password='password',
-            database='football_db'
-        )
+        if self.ch_client is None:
+            self.ch_client = create_storage()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Закрытие подключения при выходе из контекста"""
-        if self.ch_client:
-            self.ch_client.disconnect()
+        """Закрытие подключения при выходе из контекста (только собственного)"""
+        if self.ch_client and self._owns_client:
+            self.ch_client.close()
+            self.ch_client = None
     
     async def get_team_compact_dashboard(self, team_id: int, team_name: str, season_id: int) -> Dict:
         """Генерирует компактный дашборд формы команды"""
         try:
             # Получаем данные игроков
-            players_data = await self._get_team_players_with_form(team_id, season_id)
+            squads = await self._get_squads_with_form((team_id,), season_id)
+            return self._build_dashboard(team_name, squads.get(team_id, []))
             
-            # Группируем по позициям и рассчитываем общую форму
-            position_groups = self._group_players_by_position(players_data)
-            overall_form = self._calculate_overall_form(players_data)
+        except Exception as e:
+            print(f"❌ Ошибка создания дашборда для {team_name}: {e}")
+            return {}
+    
+    async def get_match_players_dashboard(self, home_id: int, away_id: int, season_id: int,
+                                          home_name: str = '', away_name: str = '') -> Tuple[Dict, Dict]:
+        """Дашборды формы обеих команд матча: составы читаются одним запросом по team_id IN"""
+        try:
+            squads = await self._get_squads_with_form((home_id, away_id), season_id)
+            return (
+                self._build_dashboard(home_name, squads.get(home_id, [])),
+                self._build_dashboard(away_name, squads.get(away_id, []))
+            )
             
-            return {
-                'team_name': team_name,
-                'overall_form': overall_form,
-                'positions': position_groups
-            }
+        except Exception as e:
+            print(f"❌ Ошибка создания дашбордов {home_name} - {away_name}: {e}")
+            return {}, {}
+    
+    def _build_dashboard(self, team_name: str, players_data: List[Dict]) -> Dict:
+        """Группирует игроков по позициям и рассчитывает общую форму"""
+        return {
+            'team_name': team_name,
+            'overall_form': self._calculate_overall_form(players_data),
+            'positions': self._group_players_by_position(players_data)
+        }
+    
+    async def _get_squads_with_form(self, team_ids: Tuple[int, ...], season_id: int) -> Dict[int, List[Dict]]:
+        """Игроки команд с анализом формы (только сыгравшие > 0 минут): team_id -> игроки.
+
+        Показатели и последние оценки берутся одной строкой сезонного агрегата
+        на игрока; команды, агрегаты которых еще не заполнены, считаются по
+        football_player_stats.
+        """
+        squads = await self._get_squads_from_aggregates(team_ids, season_id)
+        missing = tuple(team_id for team_id in team_ids if not squads.get(team_id))
+        if missing:
+            squads.update(await self._get_squads_from_stats(missing, season_id))
+        return squads
+    
+    async def _get_squads_from_aggregates(self, team_ids: Tuple[int, ...], season_id: int) -> Dict[int, List[Dict]]:
+        """Игроки команд из player_season_agg одним чтением по ключу: team_id -> игроки"""
+        try:
+            query = """
+            SELECT
+                a.team_id, a.player_id, a.player_name, a.position,
+                if(a.rated_matches > 0, a.rating_sum / a.rated_matches, 0) AS avg_rating,
+                a.goals, a.assists,
+                a.shots / a.matches,
+                a.pass_accuracy_sum / a.matches,
+                if(a.duel_matches > 0, a.duel_success_sum / a.duel_matches, 0),
+                a.saves / a.matches,
+                a.matches,
+                a.minutes_played / a.matches,
+                r.recent_ratings
+            FROM player_season_agg a FINAL
+            LEFT JOIN (
+                SELECT team_id, player_id, recent_ratings
+                FROM player_recent_ratings FINAL
+                WHERE season_id = %(season_id)s
+                AND team_id IN %(team_ids)s
+            ) r ON r.team_id = a.team_id AND r.player_id = a.player_id
+            WHERE a.season_id = %(season_id)s
+            AND a.team_id IN %(team_ids)s
+            AND a.matches > 0
+            ORDER BY avg_rating DESC, a.player_id
+            """
+            
+            columns = await self.ch_client.execute(
+                query, {'team_ids': tuple(team_ids), 'season_id': season_id},
+                query_name='squad_aggregates', columnar=True
+            )
+            if not columns or not len(columns[0]):
+                return {}
+            
+            # Кольцо последних оценок -> матрица игрок x матч для векторного расчета трендов
+            rings = columns[13]
+            ratings = np.full((len(rings), self.TREND_MATCHES), np.nan)
+            for row, ring in enumerate(rings):
+                ring = list(ring or [])[:self.TREND_MATCHES]
+                ratings[row, :len(ring)] = ring
+            
+            players = self._build_players(columns[1], columns[2], columns[3], columns[4:13],
+                                          self._calculate_trends(ratings))
+            return self._split_by_team(columns[0], players)
             
         except Exception as e:
-            print(f"❌ Ошибка создания дашборда для {team_name}: {e}")
+            print(f"❌ Ошибка чтения агрегатов игроков: {e}")
             return {}
     
-    async def _get_team_players_with_form(self, team_id: int, season_id: int) -> List[Dict]:
-        """Получает игроков команды с анализом формы (только сыгравшие > 0 минут)"""
+    async def _get_squads_from_stats(self, team_ids: Tuple[int, ...], season_id: int) -> Dict[int, List[Dict]]:
+        """Игроки команд по football_player_stats - пока сезонные агрегаты не заполнены"""
         try:
             query = """
             SELECT 
-                player_id, player_name, position, 
+                team_id, player_id, player_name, position, 
                 AVG(rating) as avg_rating,
                 SUM(goals) as total_goals,
                 SUM(goal_assist) as total_assists,
@@ -60,105 +145,122 @@ class PlayersAnalyzer:
                 COUNT(*) as matches_played,
                 AVG(minutes_played) as avg_minutes
             FROM football_player_stats 
-            WHERE team_id = %(team_id)s 
-            AND match_id IN (
-                SELECT match_id FROM football_matches 
-                WHERE season_id = %(season_id)s AND status = 'Ended'
-            )
+            WHERE team_id IN %(team_ids)s 
+            AND season_id = %(season_id)s
             AND minutes_played > 0  # Только те, кто выходил на поле
-            GROUP BY player_id, player_name, position
+            GROUP BY team_id, player_id, player_name, position
             HAVING COUNT(*) >= 1  # Хотя бы 1 матч с минутами
-            ORDER BY avg_rating DESC
+            ORDER BY avg_rating DESC, player_id
             """
             
-            results = self.ch_client.execute(query, {'team_id': team_id, 'season_id': season_id})
-            
-            players = []
-            for row in results:
-                player_id, name, position, rating, goals, assists, shots, pass_acc, duels, saves, matches, avg_minutes = row
-                
-                # Анализ формы
-                form_trend = await self._calculate_player_trend(player_id, season_id)
-                
-                players.append({
-                    'id': player_id,
-                    'name': name,
-                    'position': position,
-                    'rating': round(rating, 1),
-                    'goals': goals or 0,
-                    'assists': assists or 0,
-                    'shots': round(shots or 0, 1),
-                    'pass_accuracy': round(pass_acc or 0, 0),
-                    'duel_success': round(duels or 0, 0),
-                    'saves': round(saves or 0, 1),
-                    'form_trend': form_trend,
-                    'matches': matches,
-                    'avg_minutes': round(avg_minutes or 0, 0)
-                })
-            
-            return players
+            # Столбцы целиком: показатели всего состава считаются векторно, без разбора строк;
+            # тренды всех составов - одним запросом параллельно с показателями
+            columns, squad_trends = await asyncio.gather(
+                self.ch_client.execute(query, {'team_ids': tuple(team_ids), 'season_id': season_id},
+                                       query_name='team_players', columnar=True),
+                self._get_squad_trends(team_ids, season_id)
+            )
+            if not columns or not len(columns[0]):
+                return {}
+            form_trends = [squad_trends.get(player_id) or dict(self.STABLE_TREND) for player_id in columns[1]]
+            players = self._build_players(columns[1], columns[2], columns[3], columns[4:], form_trends)
+            return self._split_by_team(columns[0], players)
             
         except Exception as e:
             print(f"❌ Ошибка получения игроков: {e}")
-            return []
+            return {}
+    
+    @staticmethod
+    def _split_by_team(team_ids, players: List[Dict]) -> Dict[int, List[Dict]]:
+        """Раскладывает игроков по командам, сохраняя порядок выборки"""
+        squads = {}
+        for team_id, player in zip(team_ids, players):
+            squads.setdefault(team_id, []).append(player)
+        return squads
     
-    async def _calculate_player_trend(self, player_id: int, season_id: int) -> Dict:
-        """Исправленный расчет тренда со стрелками"""
+    def _build_players(self, player_ids, names, positions, metrics, form_trends: List[Dict]) -> List[Dict]:
+        """Словари игроков из столбцов: рейтинг, голы, передачи, удары, точность паса,
+        единоборства, сейвы, матчи и минуты (metrics - в этом порядке)"""
+        rating, goals, assists, shots, pass_acc, duels, saves, matches, avg_minutes = (
+            np.nan_to_num(np.asarray(column, dtype=float)) for column in metrics
+        )
+        players = []
+        for values in zip(
+            player_ids, names, positions,
+            np.round(rating, 1).tolist(), goals.astype(int).tolist(), assists.astype(int).tolist(),
+            np.round(shots, 1).tolist(), np.round(pass_acc).tolist(), np.round(duels).tolist(),
+            np.round(saves, 1).tolist(), form_trends, matches.astype(int).tolist(), np.round(avg_minutes).tolist()
+        ):
+            players.append(dict(zip(self.PLAYER_FIELDS, values)))
+        return players
+    
+    async def _get_squad_trends(self, team_ids: Tuple[int, ...], season_id: int) -> Dict[int, Dict]:
+        """Тренды формы всех игроков команд одним запросом: player_id -> тренд.
+
+        Оконная функция нумерует матчи каждого игрока (45+ минут) от свежего,
+        в выборку попадают последние TREND_MATCHES - как и раньше, по всем
+        командам игрока в сезоне.
+        """
         try:
             query = """
-            SELECT rating, match_date
-            FROM football_player_stats fps
-            JOIN football_matches fm ON fps.match_id = fm.match_id
-            WHERE fps.player_id = %(player_id)s 
-            AND fm.season_id = %(season_id)s
-            AND fps.minutes_played > 45
-            ORDER BY fm.match_date DESC
-            LIMIT 5
+            SELECT player_id, rating, match_rank
+            FROM (
+                SELECT
+                    player_id, rating,
+                    row_number() OVER (PARTITION BY player_id ORDER BY match_date DESC) AS match_rank
+                FROM football_player_stats
+                WHERE season_id = %(season_id)s
+                AND minutes_played > 45
+                AND player_id IN (
+                    SELECT player_id FROM football_player_stats
+                    WHERE team_id IN %(team_ids)s AND season_id = %(season_id)s AND minutes_played > 0
+                )
+            )
+            WHERE match_rank <= %(matches)s
             """
             
-            results = self.ch_client.execute(query, {'player_id': player_id, 'season_id': season_id})
-            
-            if len(results) < 3:
-                return {'percent': 0, 'direction': 'stable', 'icon': '➡️'}
-            
-            # Сравниваем последние 2 матча vs предыдущие 3 матча
-            recent_matches = [row[0] for row in results[:2]]  # 2 самых свежих
-            older_matches = [row[0] for row in results[2:5]]  # 3 предыдущих
-            
-            if len(recent_matches) < 2 or len(older_matches) < 2:
-                return {'percent': 0, 'direction': 'stable', 'icon': '➡️'}
-            
-            recent_avg = sum(recent_matches) / len(recent_matches)
-            older_avg = sum(older_matches) / len(older_matches)
-            
-            # Защита от некорректных значений
-            if older_avg < 5.0:
-                return {'percent': 0, 'direction': 'stable', 'icon': '➡️'}
-            
-            trend_percent = ((recent_avg - older_avg) / older_avg) * 100
-            
-            # Ограничение и классификация со стрелками
-            trend_percent = max(-50, min(50, trend_percent))
-            
-            if trend_percent > 10:
-                icon = '📈'
-                direction = 'up'
-            elif trend_percent < -10:
-                icon = '📉' 
-                direction = 'down'
-            else:
-                icon = '➡️'
-                direction = 'stable'
+            columns = await self.ch_client.execute(
+                query, {'team_ids': tuple(team_ids), 'season_id': season_id, 'matches': self.TREND_MATCHES},
+                query_name='squad_trends', columnar=True
+            )
+            if not columns or not len(columns[0]):
+                return {}
             
-            return {
-                'percent': round(trend_percent, 0),
-                'direction': direction,
-                'icon': icon
-            }
+            # Матрица оценок игрок x матч (от свежего), пропуски - NaN
+            player_ids, rows = np.unique(np.asarray(columns[0]), return_inverse=True)
+            ratings = np.full((len(player_ids), self.TREND_MATCHES), np.nan)
+            ratings[rows, np.asarray(columns[2], dtype=int) - 1] = np.asarray(columns[1], dtype=float)
+            return dict(zip(player_ids.tolist(), self._calculate_trends(ratings)))
             
         except Exception as e:
-            print(f"❌ Ошибка расчета тренда для игрока {player_id}: {e}")
-            return {'percent': 0, 'direction': 'stable', 'icon': '➡️'}
+            print(f"❌ Ошибка расчета трендов игроков: {e}")
+            return {}
+    
+    @classmethod
+    def _calculate_trends(cls, ratings: np.ndarray) -> List[Dict]:
+        """Тренды формы по матрице оценок (игрок x последние матчи, от свежего; NaN - нет матча).
+
+        Сравниваются 2 самых свежих матча с 3 предыдущими; тренд считается,
+        если у игрока не меньше 3 матчей, из них не меньше 2 предыдущих,
+        и средняя предыдущих не ниже 5.0.
+        """
+        played = ~np.isnan(ratings)
+        recent, older = ratings[:, :2], ratings[:, 2:cls.TREND_MATCHES]
+        older_count = played[:, 2:cls.TREND_MATCHES].sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            recent_avg = np.nansum(recent, axis=1) / played[:, :2].sum(axis=1)
+            older_avg = np.nansum(older, axis=1) / older_count
+            trend_percent = (recent_avg - older_avg) / older_avg * 100
+
+        valid = (played.sum(axis=1) >= 3) & (older_count >= 2) & (older_avg >= 5.0)
+        # Ограничение и классификация со стрелками
+        trend_percent = np.where(valid, np.clip(trend_percent, -50, 50), 0.0)
+        direction = np.select([trend_percent > 10, trend_percent < -10], ['up', 'down'], 'stable')
+        icons = {'up': '📈', 'down': '📉', 'stable': '➡️'}
+        return [
+            {'percent': percent, 'direction': trend, 'icon': icons[trend]}
+            for percent, trend in zip(np.round(trend_percent).tolist(), direction.tolist())
+        ]
     
     def _group_players_by_position(self, players: List[Dict]) -> Dict[str, List]:
         """Группирует игроков по позициям"""
@@ -176,14 +278,15 @@ class PlayersAnalyzer:
             'F': 'forwards'
         }
         
-        for player in players:
-            pos_char = player['position'][0] if player['position'] else 'M'
-            category = position_mapping.get(pos_char, 'midfielders')
-            positions[category].append(player)
+        if not players:
+            return positions
         
-        # Сортируем по рейтингу в каждой категории
-        for category in positions:
-            positions[category].sort(key=lambda x: x['rating'], reverse=True)
+        # Один устойчивый порядок по рейтингу на весь состав - внутри позиций он сохраняется
+        ratings = np.array([player['rating'] for player in players], dtype=float)
+        for index in np.argsort(-ratings, kind='stable'):
+            player = players[index]
+            pos_char = player['position'][0] if player['position'] else 'M'
+            positions[position_mapping.get(pos_char, 'midfielders')].append(player)
         
         return positions
     
@@ -192,12 +295,11 @@ class PlayersAnalyzer:
         if not players:
             return {'rating': 0, 'trend_icon': '➡️', 'trend_text': '0%'}
         
-        total_rating = sum(p['rating'] for p in players)
-        avg_rating = total_rating / len(players)
+        avg_rating = float(np.mean([p['rating'] for p in players]))
         
         # Анализ тренда команды
         trends = [p['form_trend']['percent'] for p in players if p.get('form_trend')]
-        avg_trend = sum(trends) / len(trends) if trends else 0
+        avg_trend = float(np.mean(trends)) if trends else 0
         
         # Используем стрелки вместо цветных кружков
         if avg_trend > 3:
@@ -216,7 +318,20 @@ class PlayersAnalyzer:
             'trend_text': trend_text
         }
     
-    def format_compact_dashboard(self, team_data: Dict) -> str:
+    @staticmethod
+    def format_match_dashboards(home_dashboard: Dict, away_dashboard: Dict) -> str:
+        """Блок формы игроков обеих команд для полного отчета по матчу (без подключения к базе)"""
+        return (
+            f"\n{'='*60}\n"
+            f"⭐ ДЕТАЛЬНЫЙ АНАЛИЗ ФОРМЫ ИГРОКОВ:\n"
+            f"{'='*60}\n"
+            f"{PlayersAnalyzer.format_compact_dashboard(home_dashboard)}\n"
+            f"{'='*50}\n"
+            f"{PlayersAnalyzer.format_compact_dashboard(away_dashboard)}\n"
+        )
+
+    @staticmethod
+    def format_compact_dashboard(team_data: Dict) -> str:
         """Форматирует данные в читаемый дашборд со стрелками тренда"""
         if not team_data:
             return "❌ Данные недоступны"
@@ -0,0 +1,78 @@
+from football_match_forecast import AdvancedFootballAnalyzer
+from players_analyzer import PlayersAnalyzer
+from analysis_renderer import render_header, render_section_blocks
+from clickhouse_async import AsyncClickHouse
+from storage_backends import create_storage
+from aggregates_cache import AggregatesCache
+from report_cache import ReportCache
+import argparse
+import asyncio
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def prerender_round(ch_client: AsyncClickHouse, tournament_id: int, season_id: int, round_number: int) -> int:
+    """Считает полные отчеты по всем матчам тура и сохраняет их в match_report_cache"""
+    # Версия данных лиги: загрузки других лиг не делают отчеты устаревшими
+    data_version = await AggregatesCache().data_version(ch_client, tournament_id, season_id)
+    if data_version is None:
+        print("❌ Версия данных недоступна - отчеты не сохраняются")
+        return 0
+
+    async with AdvancedFootballAnalyzer(ch_client) as analyzer:
+        analyses = await analyzer.analyze_round(tournament_id, season_id, round_number)
+        match_ids = {
+            (fixture['home_team_id'], fixture['away_team_id']): fixture['match_id']
+            for fixture in await analyzer.get_round_fixtures(tournament_id, season_id, round_number)
+        }
+    if not analyses:
+        print(f"⚠️ В туре {round_number} нет матчей")
+        return 0
+
+    reports = []
+    async with PlayersAnalyzer(ch_client) as players_analyzer:
+        for analysis in analyses:
+            if analysis.errors:
+                print(f"⚠️ {analysis.team1_name} - {analysis.team2_name}: ошибки {analysis.errors}, отчет не сохраняется")
+                continue
+
+            home_dashboard, away_dashboard = await players_analyzer.get_match_players_dashboard(
+                analysis.team1_id, analysis.team2_id, season_id, analysis.team1_name, analysis.team2_name
+            )
+            reports.append({
+                'tournament_id': tournament_id,
+                'season_id': season_id,
+                'home_team_id': analysis.team1_id,
+                'away_team_id': analysis.team2_id,
+                'data_version': data_version,
+                'match_id': match_ids.get((analysis.team1_id, analysis.team2_id), 0),
+                'header': render_header(analysis),
+                'sections': render_section_blocks(analysis),
+                'players_report': PlayersAnalyzer.format_match_dashboards(home_dashboard, away_dashboard)
+            })
+
+    saved = await ReportCache().save(ch_client, reports)
+    print(f"✅ Сохранено {saved} из {len(analyses)} отчетов тура {round_number} (версия данных {data_version})")
+    print(f"📊 Запросы ClickHouse:\n{ch_client.profiler.format_summary()}")
+    return saved
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Предварительный расчет отчетов по матчам тура')
+    parser.add_argument('--tournament', required=True, type=int, help='ID турнира')
+    parser.add_argument('--season', required=True, type=int, help='ID сезона')
+    parser.add_argument('--round', required=True, type=int, help='Номер предстоящего тура')
+    args = parser.parse_args()
+
+    print(f"🚀 Расчет отчетов тура {args.round} в {datetime.now()}")
+    ch_client = create_storage()
+    try:
+        await prerender_round(ch_client, args.tournament, args.season, args.round)
+    finally:
+        ch_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+import math
+import re
+import threading
+import time
+
+
+# Запросы текущего отчета: список, общий для всех задач asyncio.gather внутри report()
+_current_report: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar('query_report', default=None)
+
+
+def default_query_name(query: str) -> str:
+    """Имя для неименованного запроса - первая таблица после FROM / INTO"""
+    match = re.search(r'\b(?:FROM|INTO)\s+([\w.]+)', query, re.IGNORECASE)
+    return match.group(1) if match else 'query'
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Перцентиль по ближайшему рангу (values отсортированы)"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1))
+    return values[rank]
+
+
+class QueryProfiler:
+    """Профиль запросов ClickHouse по именам.
+
+    Для каждого выполненного запроса AsyncClickHouse записывает время на
+    стороне клиента, время сервера, прочитанные строки и байты (progress
+    последнего запроса соединения clickhouse_driver). По каждому имени хранится окно
+    последних window замеров - из него считаются p50/p95. Внутри report()
+    замеры дополнительно собираются в разбивку одного отчета.
+    """
+
+    def __init__(self, window: int = 500, recent_reports: int = 20):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # name -> deque замеров
+        self._totals = {}   # name -> {'count', 'errors'} за все время
+        self._reports = deque(maxlen=recent_reports)
+
+    def record(self, name: str, wall_seconds: float, rows_read: int = 0, bytes_read: int = 0,
+               server_seconds: float = 0.0, result_rows: int = 0, error: bool = False):
+        sample = {
+            'name': name,
+            'wall_ms': round(wall_seconds * 1000, 2),
+            'server_ms': round(server_seconds * 1000, 2),
+            'rows_read': rows_read,
+            'bytes_read': bytes_read,
+            'result_rows': result_rows,
+            'error': error
+        }
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = {'count': 0, 'errors': 0}
+            self._samples[name].append(sample)
+            self._totals[name]['count'] += 1
+            self._totals[name]['errors'] += int(error)
+
+        report = _current_report.get()
+        if report is not None:
+            report.append(sample)
+
+    @contextmanager
+    def report(self, label: str):
+        """Собирает замеры запросов, выполненных внутри блока (в том числе в asyncio.gather)"""
+        samples = []
+        token = _current_report.set(samples)
+        started = time.perf_counter()
+        breakdown = {'label': label, 'queries': samples}
+        try:
+            yield breakdown
+        finally:
+            _current_report.reset(token)
+            breakdown['wall_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            with self._lock:
+                self._reports.append(breakdown)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """p50/p95 времени и средние объемы чтения по именам запросов (по окну замеров)"""
+        with self._lock:
+            samples = {name: list(window) for name, window in self._samples.items()}
+            totals = {name: dict(counts) for name, counts in self._totals.items()}
+
+        result = {}
+        for name, window in samples.items():
+            wall = sorted(sample['wall_ms'] for sample in window)
+            server = sorted(sample['server_ms'] for sample in window)
+            result[name] = {
+                **totals[name],
+                'p50_ms': percentile(wall, 50),
+                'p95_ms': percentile(wall, 95),
+                'max_ms': wall[-1],
+                'server_p95_ms': percentile(server, 95),
+                'avg_rows_read': round(sum(sample['rows_read'] for sample in window) / len(window)),
+                'avg_bytes_read': round(sum(sample['bytes_read'] for sample in window) / len(window)),
+                'avg_result_rows': round(sum(sample['result_rows'] for sample in window) / len(window))
+            }
+        return result
+
+    def recent_reports(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._reports)
+
+    def format_summary(self, top: int = 15) -> str:
+        """Самые медленные запросы по p95 - для логов"""
+        summary = sorted(self.summary().items(), key=lambda item: item[1]['p95_ms'], reverse=True)
+        lines = [f"{'запрос':<32} {'n':>6} {'p50 мс':>9} {'p95 мс':>9} {'строк':>10} {'байт':>12}"]
+        for name, stats in summary[:top]:
+            lines.append(
+                f"{name:<32} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+                f"{stats['avg_rows_read']:>10} {stats['avg_bytes_read']:>12}"
+            )
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_report(breakdown: Dict[str, Any]) -> str:
+        """Разбивка одного отчета: запросы от самого долгого"""
+        queries = sorted(breakdown['queries'], key=lambda sample: sample['wall_ms'], reverse=True)
+        lines = [f"⏱️ {breakdown['label']}: {breakdown.get('wall_ms', 0):.0f} мс, {len(queries)} запросов"]
+        for sample in queries:
+            lines.append(
+                f"   {sample['name']:<32} {sample['wall_ms']:>8.1f} мс "
+                f"(сервер {sample['server_ms']:.1f}) {sample['rows_read']} строк, {sample['bytes_read']} байт"
+                + (" ❌" if sample['error'] else "")
+            )
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._reports.clear()
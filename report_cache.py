@@ -0,0 +1,93 @@
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+
+
+class ReportCache:
+    """Готовые отчеты по предстоящим матчам в таблице match_report_cache (см. README).
+
+    Отчеты заранее считает prerender_reports.py после загрузки fixtures.
+    Ключ - турнир, сезон, хозяева, гости и версия данных лиги: после новой
+    загрузки этой лиги ее старые отчеты перестают находиться, и бот считает
+    анализ как обычно, пока отчеты не будут пересчитаны.
+    Хранится текст каждого раздела отдельно, поэтому из кэша отвечают и
+    на полный отчет, и на любую подкатегорию.
+    """
+
+    GET_QUERY = """
+    SELECT header, sections, players_report
+    FROM match_report_cache
+    WHERE tournament_id = %(tournament_id)s
+    AND season_id = %(season_id)s
+    AND home_team_id = %(home_team_id)s
+    AND away_team_id = %(away_team_id)s
+    AND data_version = %(data_version)s
+    ORDER BY created_at DESC
+    LIMIT 1
+    """
+
+    INSERT_QUERY = """
+    INSERT INTO match_report_cache (
+        tournament_id, season_id, home_team_id, away_team_id, data_version,
+        match_id, header, sections, players_report, created_at
+    ) VALUES
+    """
+
+    def __init__(self):
+        self._stats = {'hits': 0, 'misses': 0, 'saved': 0}
+
+    async def get(self, ch_client, tournament_id: int, season_id: int, home_team_id: int, away_team_id: int,
+                  data_version: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Готовый отчет по матчу для текущей версии данных или None"""
+        if data_version is None:
+            return None
+        try:
+            result = await ch_client.execute(self.GET_QUERY, {
+                'tournament_id': tournament_id,
+                'season_id': season_id,
+                'home_team_id': home_team_id,
+                'away_team_id': away_team_id,
+                'data_version': data_version
+            }, query_name='report_cache_get')
+        except Exception as e:
+            print(f"❌ Ошибка чтения кэша отчетов: {e}")
+            return None
+
+        if not result:
+            self._stats['misses'] += 1
+            return None
+
+        self._stats['hits'] += 1
+        header, sections, players_report = result[0]
+        return {'header': header, 'sections': dict(sections), 'players_report': players_report}
+
+    async def save(self, ch_client, reports: List[Dict[str, Any]]) -> int:
+        """Сохраняет отчеты (словари с ключами таблицы); возвращает число сохраненных"""
+        if not reports:
+            return 0
+        try:
+            now = datetime.now()
+            data = [
+                (
+                    report['tournament_id'],
+                    report['season_id'],
+                    report['home_team_id'],
+                    report['away_team_id'],
+                    report['data_version'],
+                    report.get('match_id', 0),
+                    report['header'],
+                    report['sections'],
+                    report.get('players_report', ''),
+                    now
+                )
+                for report in reports
+            ]
+            await ch_client.execute(self.INSERT_QUERY, data, query_name='report_cache_save')
+        except Exception as e:
+            print(f"❌ Ошибка сохранения кэша отчетов: {e}")
+            return 0
+
+        self._stats['saved'] += len(reports)
+        return len(reports)
+
+    def metrics(self) -> Dict[str, Any]:
+        return dict(self._stats)
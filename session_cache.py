@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import threading
+import time
+
+
+class SessionCache:
+    """Разобранный анализ матча на время сессии пользователя в чате.
+
+    Пользователь открывает матч и переходит по разделам: каждый раздел -
+    выборка из уже посчитанного отчета (тексты разделов, заголовок,
+    дашборды игроков), без запросов к базе. Ключ - чат, матч и версия
+    данных: после загрузки тура записи старой версии перестают находиться.
+    Сессия живет ttl_seconds с последнего обращения, число записей
+    ограничено max_size (вытеснение LRU), у одного чата хранится не больше
+    max_per_chat матчей: порядок матчей чата ведется отдельно, поэтому
+    вытеснение не просматривает записи других чатов.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 30 * 60, max_per_chat: int = 3):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.max_per_chat = max_per_chat
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (chat_id, *ключ матча) -> (отчет, expires_at), последний - самый свежий
+        self._chats = {}               # chat_id -> OrderedDict ключей сессий чата в том же порядке
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evicted_lru': 0,
+            'expired': 0
+        }
+
+    def get(self, chat_id: int, key: tuple) -> Optional[Dict[str, Any]]:
+        """Отчет сессии чата по ключу матча (с версией данных) или None"""
+        now = time.monotonic()
+        session_key = (chat_id, *key)
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            report, expires_at = entry
+            if expires_at < now:
+                self._remove(session_key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            # Каждое обращение продлевает сессию
+            self._entries[session_key] = (report, now + self.ttl_seconds)
+            self._entries.move_to_end(session_key)
+            self._chats[chat_id].move_to_end(session_key)
+            self._stats['hits'] += 1
+        # Копия верхнего уровня: вызывающий код дополняет отчет (например, дашбордами), не меняя записи
+        return dict(report)
+
+    def update(self, chat_id: int, key: tuple, fields: Dict[str, Any]):
+        """Дополняет отчет сессии полями fields (создает запись, если ее нет).
+
+        Словари (тексты разделов) и множества (посчитанные разделы) сливаются
+        с уже сохраненными - разделы, досчитанные по разным переходам, не
+        затирают друг друга; остальные поля заменяются.
+        """
+        session_key = (chat_id, *key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_key)
+            report = dict(entry[0]) if entry and entry[1] >= now else {}
+            for name, value in fields.items():
+                saved = report.get(name)
+                if isinstance(value, dict) and isinstance(saved, dict):
+                    value = {**saved, **value}
+                elif isinstance(value, (set, frozenset)) and isinstance(saved, (set, frozenset)):
+                    value = frozenset(saved | value)
+                report[name] = value
+            self._entries[session_key] = (report, now + self.ttl_seconds)
+            self._entries.move_to_end(session_key)
+            chat_keys = self._chats.setdefault(chat_id, OrderedDict())
+            chat_keys[session_key] = None
+            chat_keys.move_to_end(session_key)
+            # Самые старые матчи этого чата, сверх max_per_chat
+            while len(chat_keys) > self.max_per_chat:
+                self._remove(next(iter(chat_keys)))
+                self._stats['evicted_lru'] += 1
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self._stats['evicted_lru'] += 1
+
+    def _remove(self, session_key: tuple):
+        """Удаляет запись вместе с ключом из порядка матчей ее чата (под блокировкой)"""
+        del self._entries[session_key]
+        chat_keys = self._chats[session_key[0]]
+        del chat_keys[session_key]
+        if not chat_keys:
+            del self._chats[session_key[0]]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Размер кэша и счетчики попаданий/вытеснений"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'chats': len(self._chats),
+                'hit_rate': round(self._stats['hits'] / lookups * 100, 1) if lookups else 0.0,
+                **self._stats
+            }
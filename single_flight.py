@@ -0,0 +1,48 @@
+from typing import Dict, Any, Awaitable, Callable, Hashable
+import asyncio
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных вычислений.
+
+    Пока вычисление по ключу выполняется, следующие запросы с тем же ключом
+    не запускают его заново, а ждут результат первого. После завершения
+    ключ освобождается: результат не кэшируется, исключение получают все
+    ожидавшие. Вычисление идет отдельной задачей, поэтому отмена одного
+    ожидающего не прерывает его для остальных.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Task
+        self._stats = {'started': 0, 'joined': 0, 'failed': 0}
+
+    async def run(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат loader() - общий для всех одновременных запросов с ключом key"""
+        task = self._calls.get(key)
+        if task is not None:
+            self._stats['joined'] += 1
+        else:
+            task = asyncio.ensure_future(loader())
+            self._calls[key] = task
+            self._stats['started'] += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Выполняется ли сейчас вычисление по ключу key"""
+        return key in self._calls
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if task.cancelled() or task.exception() is not None:
+            self._stats['failed'] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Выполняемые сейчас вычисления и число запущенных/присоединившихся запросов"""
+        requests = self._stats['started'] + self._stats['joined']
+        return {
+            'in_flight': len(self._calls),
+            'coalesced_rate': round(self._stats['joined'] / requests * 100, 1) if requests else 0.0,
+            **self._stats
+        }
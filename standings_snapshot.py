@@ -0,0 +1,131 @@
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+from aggregates_cache import AggregatesCache, fetch_data_versions, league_version
+
+
+class StandingsSnapshot:
+    """Турнирная таблица лиги на момент загрузки: последние строки team_positions_cache
+    по каждой команде, поиск команды по id без запросов к БД"""
+
+    # Последняя версия строки по каждой команде (таблица только дописывается)
+    QUERY = """
+    SELECT
+        team_id, position, points, goal_difference, matches_played,
+        wins, draws, losses, goals_for, goals_against,
+        form, trend, last_updated_round
+    FROM team_positions_cache
+    WHERE tournament_id = %(tournament_id)s
+    AND season_id = %(season_id)s
+    ORDER BY updated_at DESC
+    LIMIT 1 BY team_id
+    """
+
+    def __init__(self, tournament_id: int, season_id: int, rows: List[Tuple],
+                 data_version: Optional[int] = None):
+        self.tournament_id = tournament_id
+        self.season_id = season_id
+        self.data_version = data_version
+        self._teams = {}
+
+        for row in sorted(rows, key=lambda row: row[1]):
+            self._teams[row[0]] = {
+                'position': row[1],
+                'points': row[2],
+                'goal_difference': row[3],
+                'matches_played': row[4],
+                'wins': row[5],
+                'draws': row[6],
+                'losses': row[7],
+                'goals_for': row[8],
+                'goals_against': row[9],
+                'form': row[10],
+                'trend': row[11],
+                'last_updated_round': row[12]
+            }
+
+    def __len__(self) -> int:
+        return len(self._teams)
+
+    def team(self, team_id: int) -> Dict[str, Any]:
+        """Позиция и динамика команды (пустой словарь, если команды нет в таблице)"""
+        return dict(self._teams.get(team_id, {}))
+
+    def position(self, team_id: int) -> Optional[int]:
+        team = self._teams.get(team_id)
+        return team['position'] if team else None
+
+    def standings(self) -> Dict[int, int]:
+        """team_id -> позиция, в порядке таблицы"""
+        return {team_id: team['position'] for team_id, team in self._teams.items()}
+
+    def position_diff(self, team1_id: int, team2_id: int) -> Optional[int]:
+        """Разница позиций команд; None, если одной из команд нет в таблице"""
+        pos1 = self.position(team1_id)
+        pos2 = self.position(team2_id)
+        if pos1 is None or pos2 is None:
+            return None
+        return abs(pos1 - pos2)
+
+
+class StandingsStore:
+    """Снимки турнирных таблиц по (турнир, сезон), общие для всех запросов процесса.
+
+    Снимок загружается одним запросом и переиспользуется, пока не изменится
+    версия данных лиги (running_script.py увеличивает ее после каждой загрузки).
+    Версия берется из кэша агрегатов, если он передан, иначе запрашивается
+    напрямую. Если версия недоступна, снимок загружается заново на каждый запрос.
+    """
+
+    def __init__(self, cache: Optional[AggregatesCache] = None):
+        self.cache = cache
+        self._snapshots = {}  # (tournament_id, season_id) -> StandingsSnapshot
+        self._locks = {}
+        self._stats = {'hits': 0, 'loads': 0}
+
+    async def _data_version(self, ch_client, tournament_id: int, season_id: int) -> Optional[int]:
+        if self.cache is not None:
+            return await self.cache.data_version(ch_client, tournament_id, season_id)
+        try:
+            return league_version(await fetch_data_versions(ch_client), tournament_id, season_id)
+        except Exception as e:
+            print(f"❌ Ошибка получения версии данных: {e}")
+            return None
+
+    async def get(self, ch_client, tournament_id: int, season_id: int) -> StandingsSnapshot:
+        """Снимок таблицы турнира; при ошибке загрузки - пустой снимок"""
+        key = (tournament_id, season_id)
+        version = await self._data_version(ch_client, tournament_id, season_id)
+
+        snapshot = self._snapshots.get(key)
+        if version is not None and snapshot is not None and snapshot.data_version == version:
+            self._stats['hits'] += 1
+            return snapshot
+
+        # Параллельные запросы по одной лиге ждут одну загрузку
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(key)
+            if version is not None and snapshot is not None and snapshot.data_version == version:
+                self._stats['hits'] += 1
+                return snapshot
+
+            try:
+                rows = await ch_client.execute(StandingsSnapshot.QUERY, {
+                    'tournament_id': tournament_id,
+                    'season_id': season_id
+                }, query_name='standings')
+            except Exception as e:
+                print(f"❌ Ошибка загрузки турнирной таблицы {tournament_id}/{season_id}: {e}")
+                return StandingsSnapshot(tournament_id, season_id, [])
+
+            self._stats['loads'] += 1
+            snapshot = StandingsSnapshot(tournament_id, season_id, rows, version)
+            if version is not None:
+                self._snapshots[key] = snapshot
+            return snapshot
+
+    def clear(self):
+        self._snapshots.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {'leagues': len(self._snapshots), **self._stats}
@@ -0,0 +1,156 @@
+from clickhouse_async import AsyncClickHouse, ClickHousePool
+from contextlib import contextmanager
+from query_profiler import QueryProfiler
+from typing import Dict, Any, List, Optional
+import argparse
+import os
+import re
+import sys
+import threading
+
+# Встроенный клиент лежит рядом со скриптами загрузки: в образ Airflow монтируется только dags
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dags', 'scripts'))
+
+README_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'README.md')
+
+ENGINES = ('clickhouse', 'duckdb')
+
+
+def load_schema(readme_path: str = README_PATH) -> List[str]:
+    """CREATE-запросы из первого блока ```sql README - схема, с которой работает бот"""
+    with open(readme_path, encoding='utf-8') as f:
+        block = re.search(r'```sql\n(.*?)```', f.read(), re.DOTALL).group(1)
+    # Комментарии убираются до разбиения: в них встречается ';'
+    block = "\n".join(line for line in block.splitlines() if not line.strip().startswith('--'))
+    statements = []
+    for statement in block.split(';'):
+        statement = statement.strip()
+        # Однократные заполнения (INSERT ... SELECT) для пустой базы не нужны
+        if statement.upper().startswith('CREATE'):
+            statements.append(statement)
+    return statements
+
+
+class DuckDBPool:
+    """Соединения встроенной базы DuckDB с интерфейсом ClickHousePool.
+
+    Вся база - один файл (или память при path=':memory:'), сервер не нужен.
+    Каждое соединение - DuckDBClient, принимающий запросы в диалекте
+    ClickHouse, поэтому AsyncClickHouse и все анализаторы работают поверх
+    пула без изменений. Файл DuckDB одновременно открывает только один
+    процесс; read_only - для процессов, которые только читают.
+    """
+
+    def __init__(self, path: str = 'football.duckdb', max_size: int = 8, read_only: bool = False):
+        # Необязательная зависимость: нужна только встроенному хранилищу
+        from duckdb_client import DuckDBClient
+        self.path = path
+        self.max_size = max_size
+        self._root = DuckDBClient(path, read_only=read_only)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._in_use = 0
+        self._stats = {'created': 0, 'reused': 0}
+
+    @classmethod
+    def from_env(cls, **kwargs) -> 'DuckDBPool':
+        """Создает пул по переменным окружения DUCKDB_*"""
+        return cls(
+            path=os.getenv('DUCKDB_PATH', 'football.duckdb'),
+            read_only=os.getenv('DUCKDB_READ_ONLY', '') == '1',
+            **kwargs
+        )
+
+    @property
+    def client(self):
+        """Основное соединение - для загрузки схемы и данных вне пула"""
+        return self._root
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: соединение на время одного запроса"""
+        self._slots.acquire()
+        with self._lock:
+            client = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            self._stats['reused' if client else 'created'] += 1
+        try:
+            client = client or self._root.cursor()
+            yield client
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                if client is not None:
+                    self._idle.append(client)
+            self._slots.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'size': self._in_use + len(self._idle),
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                **self._stats
+            }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for client in idle:
+            client.disconnect()
+        self._root.disconnect()
+
+
+def create_storage(engine: Optional[str] = None, profiler: Optional[QueryProfiler] = None,
+                   **pool_kwargs) -> AsyncClickHouse:
+    """Хранилище по STORAGE_ENGINE: ClickHouse (по умолчанию) или встроенная DuckDB.
+
+    Оба варианта - AsyncClickHouse над пулом соединений: запросы в диалекте
+    ClickHouse, профиль запросов и метрики пула одинаковы. Пустая база
+    DuckDB создается по схеме из README.
+    """
+    engine = engine or os.getenv('STORAGE_ENGINE', 'clickhouse')
+    if engine == 'clickhouse':
+        return AsyncClickHouse(ClickHousePool.from_env(**pool_kwargs), profiler=profiler)
+    if engine != 'duckdb':
+        raise ValueError(f"Неизвестное хранилище {engine}, доступны: {', '.join(ENGINES)}")
+
+    pool = DuckDBPool.from_env(**pool_kwargs)
+    if not pool.client.tables:
+        for statement in load_schema():
+            pool.client.execute(statement)
+        print(f"✅ Создана встроенная база {pool.path}")
+    return AsyncClickHouse(pool, profiler=profiler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Встроенная база DuckDB: схема и выгрузка в Parquet')
+    parser.add_argument('--path', default=os.getenv('DUCKDB_PATH', 'football.duckdb'), help='Файл базы DuckDB')
+    parser.add_argument('--init', action='store_true', help='Создать схему из README')
+    parser.add_argument('--export', metavar='DIR', help='Выгрузить все таблицы в Parquet')
+    parser.add_argument('--import', dest='import_dir', metavar='DIR', help='Загрузить выгрузку в пустую базу')
+    args = parser.parse_args()
+
+    pool = DuckDBPool(args.path, max_size=1)
+    try:
+        if args.import_dir:
+            pool.client.import_parquet(args.import_dir)
+            print(f"✅ Загружена выгрузка {args.import_dir}: {len(pool.client.tables)} таблиц")
+        if args.init:
+            if pool.client.tables:
+                print(f"⏭️ Схема в {args.path} уже создана")
+            else:
+                for statement in load_schema():
+                    pool.client.execute(statement)
+                print(f"✅ Создана схема в {args.path}: {len(pool.client.tables)} таблиц")
+        if args.export:
+            pool.client.export_parquet(args.export)
+            print(f"✅ База {args.path} выгружена в {args.export}")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+from typing import Dict, Any, Iterator, List, Tuple
+from datetime import date, datetime, timedelta
+from storage_backends import load_schema, README_PATH
+import math
+import random
+
+
+# Составы: позиция -> (игроков в заявке, в стартовом составе)
+SQUAD_POSITIONS = {'G': (2, 1), 'D': (8, 4), 'M': (8, 4), 'F': (4, 2)}
+SUBSTITUTES = 3
+
+# Столбцы, которые заполняет генератор (остальные - значения по умолчанию из DDL)
+COLUMNS = {
+    'football_matches': (
+        'match_id', 'tournament_id', 'season_id', 'round_number', 'match_date',
+        'home_team_id', 'home_team_name', 'away_team_id', 'away_team_name',
+        'home_score', 'away_score', 'status', 'start_timestamp'
+    ),
+    'football_match_stats': (
+        'match_id', 'team_id', 'team_name', 'team_type', 'ball_possession', 'expected_goals',
+        'total_shots', 'shots_on_target', 'shots_off_target', 'corners', 'fouls', 'yellow_cards',
+        'big_chances', 'big_chances_scored', 'big_chances_missed', 'total_passes', 'accurate_passes',
+        'pass_accuracy', 'total_crosses', 'accurate_crosses', 'total_long_balls', 'accurate_long_balls',
+        'tackles', 'interceptions', 'clearances', 'tournament_id', 'season_id', 'match_date'
+    ),
+    'football_cards': (
+        'match_id', 'player_id', 'player_name', 'team_is_home', 'card_type', 'reason', 'time',
+        'added_time', 'team_id', 'opponent_team_id', 'tournament_id', 'season_id', 'match_date'
+    ),
+    'football_player_stats': (
+        'match_id', 'team_id', 'player_id', 'player_name', 'short_name', 'position', 'jersey_number',
+        'minutes_played', 'rating', 'goals', 'goal_assist', 'total_shot', 'on_target_shot',
+        'total_pass', 'accurate_pass', 'pass_accuracy', 'key_pass', 'duel_won', 'duel_lost',
+        'total_tackle', 'interception_won', 'fouls', 'was_fouled', 'saves',
+        'tournament_id', 'season_id', 'match_date'
+    ),
+    'match_fixtures': (
+        'match_id', 'round_number', 'season_id', 'start_timestamp', 'referee_id', 'referee_name',
+        'referee_yellow_cards', 'referee_red_cards', 'referee_yellow_red_cards', 'referee_games',
+        'referee_country', 'home_team_id', 'home_team_name', 'away_team_id', 'away_team_name',
+        'tournament_id', 'tournament_name', 'season_year'
+    ),
+    'team_positions_cache': (
+        'team_id', 'tournament_id', 'season_id', 'position', 'points', 'goal_difference', 'form',
+        'matches_played', 'wins', 'draws', 'losses', 'goals_for', 'goals_against', 'trend',
+        'last_updated_round', 'updated_at'
+    ),
+    'team_stats_cache': (
+        'team_id', 'tournament_id', 'season_id', 'matches_played', 'goals_scored', 'goals_conceded',
+        'avg_possession', 'avg_shots', 'avg_shots_on_target', 'avg_corners', 'avg_fouls',
+        'avg_yellow_cards', 'big_chances', 'big_chances_missed', 'goals_inside_box',
+        'goals_outside_box', 'headed_goals', 'pass_accuracy', 'fast_breaks', 'updated_at'
+    ),
+    'data_version': ('version', 'source', 'tournament_id', 'season_id')
+}
+
+
+def _poisson(rng: random.Random, rate: float) -> int:
+    """Пуассоновская случайная величина (алгоритм Кнута - rate в пределах нескольких единиц)"""
+    threshold, k, p = math.exp(-rate), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= threshold:
+            return k
+        k += 1
+
+
+def round_robin(team_ids: List[int]) -> List[List[Tuple[int, int]]]:
+    """Двухкруговой турнир методом круга: список туров из пар (хозяева, гости)"""
+    teams = list(team_ids)
+    n = len(teams)
+    first_half = []
+    for round_index in range(n - 1):
+        pairs = [(teams[i], teams[n - 1 - i]) for i in range(n // 2)]
+        # Чередование хозяев, чтобы у команд не было длинных серий дома/в гостях
+        first_half.append([(a, b) if (round_index + i) % 2 == 0 else (b, a) for i, (a, b) in enumerate(pairs)])
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return first_half + [[(b, a) for a, b in pairs] for pairs in first_half]
+
+
+class SyntheticLeague:
+    """Детерминированная синтетическая лига для бенчмарков.
+
+    Несколько сезонов двухкругового турнира: результаты, статистика матчей,
+    статистика игроков, карточки, назначения рефери, турнирная таблица и
+    кэш статистики текущего сезона. Сила команд постоянна между сезонами,
+    голы - по Пуассону, поэтому модели прогнозов получают реалистичные
+    данные. Один seed - одинаковый набор данных на любой машине.
+    """
+
+    def __init__(self, tournament_id: int = 9001, first_season_id: int = 90001, seasons: int = 3,
+                 teams: int = 16, played_rounds: int = 20, referees: int = 12, seed: int = 42):
+        if teams % 2:
+            raise ValueError("Число команд должно быть четным")
+        self.tournament_id = tournament_id
+        self.season_ids = [first_season_id + i for i in range(seasons)]
+        self.current_season_id = self.season_ids[-1]
+        self.team_ids = [100 + i for i in range(teams)]
+        self.team_names = {team_id: f"Команда {i + 1}" for i, team_id in enumerate(self.team_ids)}
+        self.rounds = 2 * (teams - 1)
+        # Хотя бы один тур остается предстоящим: по нему строятся отчеты
+        self.played_rounds = min(played_rounds, self.rounds - 1)
+        self.seed = seed
+
+        rng = random.Random(seed)
+        self.strength = {team_id: (rng.uniform(-0.35, 0.35), rng.uniform(-0.3, 0.3)) for team_id in self.team_ids}
+        self.referees = [(500 + i, f"Рефери {i + 1}", rng.uniform(3.0, 5.5)) for i in range(referees)]
+        self.squads = {}
+        player_id = 10000
+        for team_id in self.team_ids:
+            squad = []
+            for position, (count, _) in SQUAD_POSITIONS.items():
+                for _ in range(count):
+                    player_id += 1
+                    squad.append((player_id, f"Игрок {player_id}", position))
+            self.squads[team_id] = squad
+
+    @property
+    def next_round(self) -> int:
+        """Первый несыгранный тур текущего сезона"""
+        return self.played_rounds + 1
+
+    def fixtures(self, round_number: int) -> List[Tuple[int, int]]:
+        return round_robin(self.team_ids)[round_number - 1]
+
+    def generate(self) -> Dict[str, List[Tuple]]:
+        """Все строки по таблицам (в порядке COLUMNS)"""
+        rng = random.Random(self.seed + 1)
+        tables = {table: [] for table in COLUMNS}
+        schedule = round_robin(self.team_ids)
+
+        for season_index, season_id in enumerate(self.season_ids):
+            is_current = season_id == self.current_season_id
+            season_start = date(2022 + season_index, 8, 1)
+            standings = {team_id: {'W': 0, 'D': 0, 'L': 0, 'GF': 0, 'GA': 0, 'form': []} for team_id in self.team_ids}
+            season_stats = {team_id: {} for team_id in self.team_ids}
+
+            for round_number, pairs in enumerate(schedule, start=1):
+                played = not is_current or round_number <= self.played_rounds
+                for match_index, (home_id, away_id) in enumerate(pairs):
+                    match_id = season_id * 10000 + round_number * 100 + match_index
+                    match_date = season_start + timedelta(days=7 * (round_number - 1))
+                    start = datetime.combine(match_date, datetime.min.time()) + timedelta(hours=15 + match_index % 4)
+                    referee_id, referee_name, referee_rate = self.referees[rng.randrange(len(self.referees))]
+
+                    tables['match_fixtures'].append((
+                        match_id, round_number, season_id, start, referee_id, referee_name,
+                        int(referee_rate * 120), rng.randint(0, 8), rng.randint(0, 5), 120, 'Россия',
+                        home_id, self.team_names[home_id], away_id, self.team_names[away_id],
+                        self.tournament_id, 'Синтетическая лига', f"{22 + season_index}/{23 + season_index}"
+                    ))
+
+                    if not played:
+                        tables['football_matches'].append((
+                            match_id, self.tournament_id, season_id, round_number, match_date,
+                            home_id, self.team_names[home_id], away_id, self.team_names[away_id],
+                            0, 0, 'Not started', start
+                        ))
+                        continue
+
+                    home_goals, away_goals = self._score(rng, home_id, away_id)
+                    tables['football_matches'].append((
+                        match_id, self.tournament_id, season_id, round_number, match_date,
+                        home_id, self.team_names[home_id], away_id, self.team_names[away_id],
+                        home_goals, away_goals, 'Ended', start
+                    ))
+
+                    match_columns = (self.tournament_id, season_id, match_date)
+                    cards = self._cards(rng, match_id, home_id, away_id, referee_rate, match_columns)
+                    tables['football_cards'].extend(cards)
+                    for team_id, team_type, goals_for, goals_against in (
+                        (home_id, 'home', home_goals, away_goals),
+                        (away_id, 'away', away_goals, home_goals)
+                    ):
+                        yellows = sum(1 for card in cards if card[8] == team_id and card[4] == 'yellow')
+                        stats = self._match_stats(rng, match_id, team_id, team_type, goals_for, yellows, match_columns)
+                        tables['football_match_stats'].append(stats)
+                        tables['football_player_stats'].extend(
+                            self._player_stats(rng, match_id, team_id, goals_for, match_columns)
+                        )
+                        self._add_standing(standings[team_id], goals_for, goals_against)
+                        for column, value in zip(COLUMNS['football_match_stats'], stats):
+                            if isinstance(value, (int, float)) and column not in ('match_id', 'team_id'):
+                                season_stats[team_id][column] = season_stats[team_id].get(column, 0) + value
+
+            if is_current:
+                tables['team_positions_cache'].extend(self._positions(standings, season_id))
+                tables['team_stats_cache'].extend(self._team_stats(standings, season_stats, season_id))
+
+        tables['data_version'].append((1, f"synthetic seed={self.seed}", self.tournament_id, self.current_season_id))
+        return tables
+
+    def _score(self, rng: random.Random, home_id: int, away_id: int) -> Tuple[int, int]:
+        home_attack, home_defence = self.strength[home_id]
+        away_attack, away_defence = self.strength[away_id]
+        return (
+            _poisson(rng, math.exp(0.3 + home_attack + away_defence)),
+            _poisson(rng, math.exp(0.05 + away_attack + home_defence))
+        )
+
+    def _cards(self, rng: random.Random, match_id: int, home_id: int, away_id: int,
+               referee_rate: float, match_columns: Tuple) -> List[Tuple]:
+        rows = []
+        for _ in range(_poisson(rng, referee_rate)):
+            team_is_home = rng.random() < 0.45
+            team_id, opponent_id = (home_id, away_id) if team_is_home else (away_id, home_id)
+            player_id, player_name, _ = self.squads[team_id][rng.randrange(len(self.squads[team_id]))]
+            card_type = 'red' if rng.random() < 0.03 else 'yellow'
+            rows.append((
+                match_id, player_id, player_name, int(team_is_home), card_type, 'Foul',
+                rng.randint(1, 90), 0, team_id, opponent_id, *match_columns
+            ))
+        return rows
+
+    def _match_stats(self, rng: random.Random, match_id: int, team_id: int, team_type: str,
+                     goals: int, yellows: int, match_columns: Tuple) -> Tuple:
+        attack = self.strength[team_id][0]
+        shots = max(goals, int(rng.gauss(12 + attack * 10, 3)))
+        on_target = min(shots, max(goals, int(shots * rng.uniform(0.25, 0.45))))
+        big_chances = max(goals, _poisson(rng, 2.2 + attack * 2))
+        passes = int(rng.gauss(450 + attack * 200, 60))
+        accurate_passes = int(passes * rng.uniform(0.75, 0.9))
+        crosses = _poisson(rng, 16)
+        long_balls = _poisson(rng, 45)
+        return (
+            match_id, team_id, self.team_names[team_id], team_type,
+            round(min(75.0, max(25.0, rng.gauss(50 + attack * 20, 6))), 1),
+            round(max(0.1, rng.gauss(1.3 + attack * 2, 0.5)), 2),
+            shots, on_target, shots - on_target,
+            _poisson(rng, 5), _poisson(rng, 11), yellows,
+            big_chances, min(goals, big_chances), big_chances - min(goals, big_chances),
+            passes, accurate_passes, round(accurate_passes * 100 / max(passes, 1), 1),
+            crosses, int(crosses * rng.uniform(0.2, 0.35)),
+            long_balls, int(long_balls * rng.uniform(0.4, 0.6)),
+            _poisson(rng, 16), _poisson(rng, 9), _poisson(rng, 20),
+            *match_columns
+        )
+
+    def _player_stats(self, rng: random.Random, match_id: int, team_id: int, goals: int,
+                      match_columns: Tuple) -> List[Tuple]:
+        squad = self.squads[team_id]
+        lineup = []
+        for position, (_, starters) in SQUAD_POSITIONS.items():
+            candidates = [player for player in squad if player[2] == position]
+            lineup.extend(rng.sample(candidates, starters))
+        bench = [player for player in squad if player not in lineup and player[2] != 'G']
+        substitutes = rng.sample(bench, SUBSTITUTES)
+
+        scorers = [rng.choice([player for player in lineup if player[2] != 'G']) for _ in range(goals)]
+        rows = []
+        for jersey, (player_id, player_name, position) in enumerate(lineup + substitutes, start=1):
+            minutes = rng.randint(60, 90) if jersey <= len(lineup) else rng.randint(10, 30)
+            player_goals = scorers.count((player_id, player_name, position))
+            passes = _poisson(rng, 40 * minutes / 90)
+            accurate = int(passes * rng.uniform(0.7, 0.92))
+            duels_won, duels_lost = _poisson(rng, 5), _poisson(rng, 5)
+            rows.append((
+                match_id, team_id, player_id, player_name, player_name, position, jersey, minutes,
+                round(min(10.0, max(5.0, rng.gauss(6.8 + player_goals * 0.6, 0.5))), 1),
+                player_goals, int(rng.random() < 0.08),
+                _poisson(rng, 1.2 if position == 'F' else 0.5), _poisson(rng, 0.5),
+                passes, accurate, round(accurate * 100 / max(passes, 1), 1), _poisson(rng, 0.8),
+                duels_won, duels_lost, _poisson(rng, 1.5), _poisson(rng, 1.0),
+                _poisson(rng, 1.0), _poisson(rng, 1.0), _poisson(rng, 3) if position == 'G' else 0,
+                *match_columns
+            ))
+        return rows
+
+    @staticmethod
+    def _add_standing(row: Dict[str, Any], goals_for: int, goals_against: int):
+        result = 'W' if goals_for > goals_against else 'D' if goals_for == goals_against else 'L'
+        row[result] += 1
+        row['GF'] += goals_for
+        row['GA'] += goals_against
+        row['form'].append(result)
+
+    def _positions(self, standings: Dict[int, Dict[str, Any]], season_id: int) -> Iterator[Tuple]:
+        now = datetime.now().replace(microsecond=0)
+        table = sorted(
+            standings.items(),
+            key=lambda item: (3 * item[1]['W'] + item[1]['D'], item[1]['GF'] - item[1]['GA'], item[1]['GF']),
+            reverse=True
+        )
+        for position, (team_id, row) in enumerate(table, start=1):
+            yield (
+                team_id, self.tournament_id, season_id, position, 3 * row['W'] + row['D'],
+                row['GF'] - row['GA'], "".join(row['form'][-5:]), row['W'] + row['D'] + row['L'],
+                row['W'], row['D'], row['L'], row['GF'], row['GA'], 'stable', self.played_rounds, now
+            )
+
+    def _team_stats(self, standings: Dict[int, Dict[str, Any]], season_stats: Dict[int, Dict[str, float]],
+                    season_id: int) -> Iterator[Tuple]:
+        now = datetime.now().replace(microsecond=0)
+        for team_id in self.team_ids:
+            row, stats = standings[team_id], season_stats[team_id]
+            matches = row['W'] + row['D'] + row['L']
+            yield (
+                team_id, self.tournament_id, season_id, matches, row['GF'], row['GA'],
+                round(stats.get('ball_possession', 0) / max(matches, 1), 1),
+                stats.get('total_shots', 0), stats.get('shots_on_target', 0), stats.get('corners', 0),
+                stats.get('fouls', 0), stats.get('yellow_cards', 0),
+                stats.get('big_chances', 0), stats.get('big_chances_missed', 0),
+                int(row['GF'] * 0.75), int(row['GF'] * 0.15), int(row['GF'] * 0.1),
+                round(stats.get('accurate_passes', 0) * 100 / max(stats.get('total_passes', 0), 1), 1),
+                matches // 3, now
+            )
+
+
+def seed_clickhouse(client, league: SyntheticLeague, readme_path: str = README_PATH) -> Dict[str, int]:
+    """Создает схему из README в текущей базе соединения и заполняет ее данными лиги.
+
+    client - синхронный клиент clickhouse_driver, подключенный к отдельной
+    (пустой) базе стенда. Возвращает число строк по таблицам.
+    """
+    for statement in load_schema(readme_path):
+        client.execute(statement)
+
+    counts = {}
+    for table, rows in league.generate().items():
+        if rows:
+            client.execute(f"INSERT INTO {table} ({', '.join(COLUMNS[table])}) VALUES", rows)
+        counts[table] = len(rows)
+    return counts
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'dags', 'scripts')]
+
+from clickhouse_async import AsyncClickHouse
+from running_script import FootballDataOrchestrator
+from storage_backends import DuckDBPool
+from synthetic_dataset import SyntheticLeague, seed_clickhouse
+
+
+class VersionsClient:
+    """Клиент с одной таблицей data_version: версии лиг задаются в тесте, запросы считаются"""
+
+    def __init__(self, versions=None):
+        self.versions = dict(versions or {})
+        self.queries = []
+
+    async def execute(self, query, params=None, query_name=None, **kwargs):
+        self.queries.append(query_name)
+        return [(tournament_id, season_id, version) for (tournament_id, season_id), version in self.versions.items()]
+
+
+def seeded_storage(league: SyntheticLeague) -> AsyncClickHouse:
+    """Встроенная база DuckDB в памяти, заполненная синтетической лигой (с сезонными агрегатами)"""
+    pool = DuckDBPool(':memory:')
+    seed_clickhouse(pool.client, league)
+    for season_id in league.season_ids:
+        FootballDataOrchestrator('', '', '', league.tournament_id, season_id,
+                                 ch_client=pool.client).fold_match_aggregates()
+    return AsyncClickHouse(pool)
+
+
+@pytest.fixture(scope='session')
+def league():
+    return SyntheticLeague(seasons=2, teams=8, played_rounds=10)
+
+
+@pytest.fixture(scope='session')
+def storage(league):
+    """Общая база только для чтения; тесты, которые пишут в базу, создают свою через seeded_storage"""
+    ch_client = seeded_storage(league)
+    yield ch_client
+    ch_client.close()
+
+
+@pytest.fixture
+def profiler(storage):
+    storage.profiler.clear()
+    return storage.profiler
@@ -0,0 +1,168 @@
+import asyncio
+
+import aggregates_cache
+from aggregates_cache import AggregatesCache, league_version
+from conftest import VersionsClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_evicts_least_recently_used():
+    cache = AggregatesCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is AggregatesCache.MISSING
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.metrics()['evicted_lru'] == 1
+
+
+def test_ttl_expires_entries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(aggregates_cache.time, 'monotonic', clock)
+    cache = AggregatesCache(ttl_seconds=60)
+    cache.set('a', 1)
+
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 2
+    assert cache.get('a') is AggregatesCache.MISSING
+    assert cache.metrics()['expired'] == 1
+
+
+def test_get_returns_copy():
+    cache = AggregatesCache()
+    cache.set('a', {'rows': [1, 2]})
+    cache.get('a')['rows'].append(3)
+    assert cache.get('a') == {'rows': [1, 2]}
+
+
+def test_league_version_includes_all_league_loads():
+    versions = {(0, 0): 3, (203, 77142): 5, (17, 76986): 8}
+    assert league_version(versions, 203, 77142) == 5
+    assert league_version(versions, 17, 76986) == 8
+    assert league_version(versions, 35, 77333) == 3
+    # Только сезон - лига определяется им однозначно
+    assert league_version(versions, season_id=77142) == 5
+    assert league_version(versions) == 8
+    assert league_version({}, 203, 77142) == 0
+
+
+def test_other_league_load_keeps_cached_entries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(aggregates_cache.time, 'monotonic', clock)
+    client = VersionsClient({(203, 77142): 1, (17, 76986): 1})
+    cache = AggregatesCache(version_check_interval=2.0)
+    loads = []
+
+    async def get(tournament_id, season_id):
+        async def loader():
+            loads.append((tournament_id, season_id))
+            return [tournament_id]
+        return await cache.get_or_load(client, 'team_stats', (tournament_id,), loader, tournament_id, season_id)
+
+    async def scenario():
+        await get(203, 77142)
+        await get(17, 76986)
+        # Загрузка тура АПЛ
+        client.versions[(17, 76986)] = 2
+        clock.now += 3
+        await get(203, 77142)
+        await get(17, 76986)
+
+    asyncio.run(scenario())
+    assert loads == [(203, 77142), (17, 76986), (17, 76986)]
+    assert cache.metrics()['version_changes'] == 1
+
+
+def test_versions_are_checked_once_per_interval(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(aggregates_cache.time, 'monotonic', clock)
+    client = VersionsClient({(203, 77142): 4})
+    cache = AggregatesCache(version_check_interval=2.0)
+
+    async def scenario():
+        for _ in range(5):
+            assert await cache.data_version(client, 203, 77142) == 4
+        clock.now += 2
+        await cache.data_version(client, 203, 77142)
+
+    asyncio.run(scenario())
+    assert client.queries == ['data_version', 'data_version']
+
+
+def test_unavailable_version_bypasses_cache():
+    class BrokenClient:
+        async def execute(self, *args, **kwargs):
+            raise ConnectionError("нет соединения")
+
+    cache = AggregatesCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return 'value'
+
+    async def scenario():
+        for _ in range(2):
+            assert await cache.get_or_load(BrokenClient(), 'x', (), loader, 203, 77142) == 'value'
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert cache.metrics()['size'] == 0
+
+
+def test_failed_version_check_waits_for_interval(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(aggregates_cache.time, 'monotonic', clock)
+    client = VersionsClient({(203, 77142): 4})
+    cache = AggregatesCache(version_check_interval=2.0)
+    broken = []
+
+    async def execute(query, params=None, query_name=None, **kwargs):
+        broken.append(query_name)
+        raise ConnectionError("нет соединения")
+
+    async def scenario():
+        assert await cache.data_version(client, 203, 77142) == 4
+        # ClickHouse недоступен: одна неудачная проверка за интервал, действует последняя версия
+        client.execute = execute
+        clock.now += 2
+        for _ in range(5):
+            assert await cache.data_version(client, 203, 77142) == 4
+        clock.now += 2
+        assert await cache.data_version(client, 203, 77142) == 4
+
+    asyncio.run(scenario())
+    assert broken == ['data_version', 'data_version']
+    assert cache.metrics()['version_errors'] == 2
+
+
+def test_failed_first_version_check_is_not_repeated_within_interval(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(aggregates_cache.time, 'monotonic', clock)
+    queries = []
+
+    class BrokenClient:
+        async def execute(self, query, params=None, query_name=None, **kwargs):
+            queries.append(query_name)
+            raise ConnectionError("нет соединения")
+
+    cache = AggregatesCache(version_check_interval=2.0)
+
+    async def scenario():
+        for _ in range(3):
+            assert await cache.data_version(BrokenClient(), 203, 77142) is None
+        clock.now += 2
+        assert await cache.data_version(BrokenClient(), 203, 77142) is None
+
+    asyncio.run(scenario())
+    assert queries == ['data_version', 'data_version']
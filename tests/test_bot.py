@@ -0,0 +1,101 @@
+import asyncio
+import json
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+import bot
+
+MATCH = {
+    'league': 'АПЛ', 'home_team': 'Хозяева', 'away_team': 'Гости', 'home_team_id': 10,
+    'away_team_id': 20, 'tournament_id': 1, 'season_id': 2
+}
+
+
+class OfflineRequest(BaseRequest):
+    """Запросы бота без сети: getMe при инициализации приложения, ответы в чат перехватывает тест"""
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        bot_user = {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}
+        return 200, json.dumps({'ok': True, 'result': bot_user}).encode()
+
+
+def message(update_id, chat_id, text):
+    return Update(update_id, message=Message(
+        update_id, datetime.now(), Chat(chat_id, Chat.PRIVATE), from_user=User(chat_id, 'user', False), text=text
+    ))
+
+
+def test_back_to_back_updates_keep_conversation_state(storage, monkeypatch):
+    replies = []
+    release = asyncio.Event()
+
+    async def reply_text(self, text, *args, **kwargs):
+        replies.append((self.chat_id, text))
+
+    async def slow_analysis(*args, **kwargs):
+        await release.wait()
+        return 'ПОЛНЫЙ ОТЧЕТ ПО МАТЧУ'
+
+    async def seed_match(update, context):
+        context.user_data.update(MATCH)
+
+    monkeypatch.setattr(Message, 'reply_text', reply_text)
+    monkeypatch.setattr(bot, 'build_analysis_output', slow_analysis)
+    application = Application.builder().token('1:TEST').request(OfflineRequest()).build()
+    application.bot_data['clickhouse'] = storage
+    application.add_handler(TypeHandler(Update, seed_match), group=-1)
+    application.add_handler(bot.build_conversation_handler())
+
+    def texts(chat_id):
+        return [text for chat, text in replies if chat == chat_id]
+
+    async def scenario():
+        await application.initialize()
+        await application.start()
+        try:
+            await conversation()
+        finally:
+            await application.stop()
+            await application.shutdown()
+
+    async def conversation():
+        updates = iter(range(1, 100))
+
+        async def send(chat_id, text):
+            await application.process_update(message(next(updates), chat_id, text))
+            await asyncio.sleep(0)
+
+        await send(1, '🔁 Продолжить анализ')
+        # Полный отчет считается, пока приходят следующие сообщения этого и другого чата
+        await send(1, '📋 Полный отчет')
+        await send(1, '⚽ Атака')
+        await send(2, '🔁 Продолжить анализ')
+        assert texts(1)[-1] == '⏳ Анализ еще выполняется, дождитесь результата'
+        assert texts(2)[-1].startswith('🔄 ПРОДОЛЖЕНИЕ АНАЛИЗА')
+
+        async def analysis_finished():
+            while not texts(1)[-1].startswith('Анализ завершен!'):
+                await asyncio.sleep(0.01)
+
+        release.set()
+        await asyncio.wait_for(analysis_finished(), timeout=5)
+        assert any('ПОЛНЫЙ ОТЧЕТ ПО МАТЧУ' in text for text in texts(1))
+
+        # Анализ завершил диалог: раздел без входа в диалог не обрабатывается, вход работает снова
+        handled = len(replies)
+        await send(1, '⚽ Атака')
+        assert len(replies) == handled
+        await send(1, '🔁 Продолжить анализ')
+        assert texts(1)[-1].startswith('🔄 ПРОДОЛЖЕНИЕ АНАЛИЗА')
+
+    asyncio.run(scenario())
@@ -0,0 +1,124 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from aggregates_cache import AggregatesCache
+from conftest import seeded_storage
+from football_match_forecast import AdvancedFootballAnalyzer
+from goal_model import GoalModel, fit_dixon_coles
+from synthetic_dataset import SyntheticLeague
+
+N_TEAMS = 10
+HOME_ADVANTAGE = 0.3
+
+
+@pytest.fixture(scope='module')
+def season():
+    """Матчи с известными силами команд: каждая пара по 20 раз дома и в гостях"""
+    rng = np.random.default_rng(7)
+    attack = rng.normal(0, 0.3, N_TEAMS)
+    attack -= attack.mean()
+    defence = rng.normal(0, 0.2, N_TEAMS)
+
+    home_idx, away_idx = (np.array(side) for side in zip(*[
+        (home, away) for home in range(N_TEAMS) for away in range(N_TEAMS) if home != away
+    ] * 20))
+    home_goals = rng.poisson(np.exp(attack[home_idx] + defence[away_idx] + HOME_ADVANTAGE))
+    away_goals = rng.poisson(np.exp(attack[away_idx] + defence[home_idx]))
+    return attack, defence, (home_idx, away_idx, home_goals, away_goals)
+
+
+def test_fit_recovers_team_strengths(season):
+    attack, defence, matches = season
+    fitted = fit_dixon_coles(*matches, N_TEAMS)
+
+    assert fitted['converged']
+    assert fitted['home_advantage'] == pytest.approx(HOME_ADVANTAGE, abs=0.1)
+    np.testing.assert_allclose(fitted['attack'], attack, atol=0.15)
+    np.testing.assert_allclose(fitted['defence'], defence, atol=0.15)
+    assert fitted['attack'].sum() == pytest.approx(0, abs=1e-9)
+    assert -0.2 <= fitted['rho'] <= 0.2
+
+
+def test_poisson_fit_keeps_rho_zero(season):
+    _, _, matches = season
+    dixon_coles = fit_dixon_coles(*matches, N_TEAMS)
+    poisson = fit_dixon_coles(*matches, N_TEAMS, dixon_coles=False)
+
+    assert poisson['rho'] == 0
+    # Поправка на низкие счета - лишний параметр: правдоподобие не хуже модели Пуассона
+    assert dixon_coles['log_likelihood'] >= poisson['log_likelihood'] - 1e-6
+
+
+def test_prediction_is_a_distribution(season):
+    _, _, matches = season
+    fitted = fit_dixon_coles(*matches, N_TEAMS)
+    model = GoalModel(1, 2, {team: (fitted['attack'][team], fitted['defence'][team]) for team in range(N_TEAMS)},
+                      fitted['home_advantage'], fitted['rho'])
+
+    assert model.score_matrix(0, 1).sum() == pytest.approx(1)
+    prediction = model.predict(0, 1)
+    assert sum(prediction['probabilities'].values()) == pytest.approx(100, abs=0.2)
+    assert all(line['over'] + line['under'] == pytest.approx(100) for line in prediction['totals'].values())
+    strongest, weakest = int(np.argmax(fitted['attack'])), int(np.argmin(fitted['attack']))
+    assert model.predict(strongest, weakest)['expected_home_goals'] > model.predict(weakest, strongest)['expected_away_goals']
+    assert model.predict(0, N_TEAMS) == {}
+
+
+def test_fitted_league_is_saved_and_loaded():
+    league = SyntheticLeague(seasons=1, teams=8, played_rounds=6)
+    storage = seeded_storage(league)
+
+    async def scenario():
+        fitted = await GoalModel.fit_league(storage, league.tournament_id, league.current_season_id)
+        loaded = await GoalModel.load(storage, league.tournament_id, league.current_season_id)
+        return fitted, loaded
+
+    try:
+        fitted, loaded = asyncio.run(scenario())
+    finally:
+        storage.close()
+
+    assert fitted.matches == 24 and set(fitted.teams) == set(league.team_ids)
+    assert set(loaded.teams) == set(fitted.teams)
+    for team_id, strengths in fitted.teams.items():
+        assert loaded.teams[team_id] == pytest.approx(strengths)
+    assert (loaded.home_advantage, loaded.rho) == pytest.approx((fitted.home_advantage, fitted.rho))
+    home_id, away_id = league.fixtures(league.next_round)[0]
+    assert loaded.predict(home_id, away_id)['probabilities'] == fitted.predict(home_id, away_id)['probabilities']
+
+
+def test_too_few_matches_are_not_fitted():
+    league = SyntheticLeague(seasons=1, teams=6, played_rounds=4)
+    storage = seeded_storage(league)
+    try:
+        assert asyncio.run(GoalModel.fit_league(storage, league.tournament_id, league.current_season_id)) is None
+        assert asyncio.run(GoalModel.load(storage, league.tournament_id, league.current_season_id)) is None
+    finally:
+        storage.close()
+
+
+def test_refit_is_visible_to_cached_analyzer():
+    league = SyntheticLeague(seasons=1, teams=8, played_rounds=6)
+    storage = seeded_storage(league)
+    analyzer = AdvancedFootballAnalyzer(storage, AggregatesCache(version_check_interval=0))
+    key = (league.tournament_id, league.current_season_id)
+
+    async def scenario():
+        models = [await analyzer.get_goal_model(*key)]
+        for dixon_coles in (True, False):
+            await GoalModel.fit_league(storage, *key, dixon_coles=dixon_coles)
+            models.append(await analyzer.get_goal_model(*key))
+        return models
+
+    try:
+        unfitted, fitted, refitted = asyncio.run(scenario())
+    finally:
+        storage.close()
+
+    # Параметры в кэше анализатора, но каждый подбор увеличивает версию данных лиги
+    assert unfitted is None
+    assert fitted.rho != 0
+    assert refitted.rho == 0
+    assert analyzer.cache.metrics()['version_changes'] == 2
@@ -0,0 +1,93 @@
+import asyncio
+import csv
+import io
+
+import pytest
+
+from export_league_matrix import export_league_matrix
+from football_match_forecast import AdvancedFootballAnalyzer
+from league_matrix import LeagueMatrix
+from match_data_loader import MatchDataLoader
+
+
+@pytest.fixture(scope='module')
+def matrix(storage, league):
+    return asyncio.run(AdvancedFootballAnalyzer(storage).get_league_matrix(
+        league.tournament_id, league.current_season_id))
+
+
+def test_match_result_equals_scalar_prediction(storage, league, matrix):
+    tournament_id, season_id = league.tournament_id, league.current_season_id
+    analyzer = AdvancedFootballAnalyzer(storage)
+
+    async def scalar(home_id, away_id):
+        home, away = await asyncio.gather(
+            analyzer.get_team_home_away_performance(home_id, tournament_id, season_id),
+            analyzer.get_team_home_away_performance(away_id, tournament_id, season_id)
+        )
+        return analyzer.calculate_match_result_prediction(home, away)
+
+    async def scenario():
+        return await asyncio.gather(*(scalar(*pair) for pair in pairs))
+
+    pairs = [(home_id, away_id) for home_id in league.team_ids for away_id in league.team_ids if home_id != away_id]
+    expected = asyncio.run(scenario())
+    for pair, prediction in zip(pairs, expected):
+        result = matrix.match_result(*pair)
+        assert result['predicted_score'] == prediction['predicted_score']
+        assert result['probabilities'] == prediction['probabilities']
+        for side in ('home_stats', 'away_stats'):
+            assert result[side] == pytest.approx(prediction[side])
+
+
+def test_yellow_cards_inputs_equal_scalar_queries(storage, league, matrix):
+    season_id = league.current_season_id
+    analyzer = AdvancedFootballAnalyzer(storage)
+    home_id, away_id = league.fixtures(league.next_round)[0]
+
+    async def scalar():
+        return await asyncio.gather(
+            analyzer._get_team_home_away_yellow_stats(home_id, season_id),
+            analyzer._get_team_home_away_yellow_stats(away_id, season_id),
+            analyzer._get_team_fouls_stats(home_id, season_id),
+            analyzer._get_team_fouls_stats(away_id, season_id),
+            analyzer._get_h2h_yellow_stats(home_id, away_id),
+            analyzer._get_position_diff(home_id, away_id, league.tournament_id, season_id)
+        )
+
+    team1_home_away, team2_home_away, team1_fouls, team2_fouls, h2h_stats, position_diff = asyncio.run(scalar())
+    inputs = matrix.yellow_cards_inputs(home_id, away_id)
+    assert inputs['team1_home_away']['home']['avg_yellows'] == team1_home_away['home']['avg_yellows']
+    assert inputs['team2_home_away']['away']['avg_yellows'] == team2_home_away['away']['avg_yellows']
+    assert inputs['team1_fouls'] == team1_fouls and inputs['team2_fouls'] == team2_fouls
+    assert inputs['h2h_stats']['avg_yellows'] == h2h_stats['avg_yellows']
+    assert inputs['position_diff'] == position_diff
+
+
+def test_unknown_teams_use_scalar_defaults(league, matrix):
+    assert matrix.match_result(league.team_ids[0], 1) == {}
+    assert matrix.predicted_yellow_cards(league.team_ids[0], league.team_ids[0]) is None
+    assert matrix.yellow_cards_inputs(1, 2)['h2h_stats'] == {'avg_yellows': 3.0}
+    empty = LeagueMatrix(league.tournament_id, league.current_season_id, [], {}, {}, {}, {}, {})
+    assert list(empty.records()) == []
+
+
+def test_round_loads_one_matrix(storage, league, profiler):
+    fixtures = league.fixtures(league.next_round)
+    bundles = asyncio.run(MatchDataLoader(storage).load_round(
+        fixtures, league.tournament_id, league.current_season_id, datasets=['league_matrix']))
+
+    assert profiler.summary()['league_performance']['count'] == 1
+    for fixture in fixtures:
+        assert bundles[fixture]['league_matrix'].match_result(*fixture)
+    records = list(bundles[fixtures[0]]['league_matrix'].records())
+    assert len(records) == len(league.team_ids) * (len(league.team_ids) - 1)
+
+
+def test_export_writes_all_pairs(storage, league):
+    output = io.StringIO()
+    exported = asyncio.run(export_league_matrix(storage, league.tournament_id, league.current_season_id, output))
+
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert exported == len(rows) == len(league.team_ids) * (len(league.team_ids) - 1)
+    assert {'home_team_id', 'away_team_id', 'home_win_prob', 'predicted_yellow_cards'} <= set(rows[0])
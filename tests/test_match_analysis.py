@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from football_match_forecast import AdvancedFootballAnalyzer
+from match_analysis import SECTION_DATASETS, SECTION_ORDER, required_datasets
+
+# Запросы, которыми загружается каждый набор данных (query_name профилировщика)
+DATASET_QUERIES = {
+    'team_cache': {'standings', 'team_stats_cache'},
+    'match_stats': {'match_stats'},
+    'matches': {'matches'},
+    'h2h': {'h2h'},
+    'referee': {'referee'},
+    'goal_model': {'goal_model'},
+    'league_matrix': {'standings', 'league_performance', 'league_yellows', 'league_fouls', 'league_h2h_yellows'}
+}
+
+
+@pytest.mark.parametrize('section', SECTION_ORDER)
+def test_section_issues_only_its_dataset_queries(storage, league, profiler, section):
+    home_id, away_id = league.fixtures(league.next_round)[0]
+    analysis = asyncio.run(AdvancedFootballAnalyzer(storage).get_match_analysis(
+        home_id, away_id, 'Хозяева', 'Гости', league.tournament_id, league.current_season_id, sections=[section]
+    ))
+
+    expected = set().union(*(DATASET_QUERIES[name] for name in SECTION_DATASETS[section]))
+    assert set(profiler.summary()) - {'data_version'} == expected
+    assert set(analysis.sections) <= {section}
+
+
+def test_full_report_loads_every_dataset_once(storage, league, profiler):
+    home_id, away_id = league.fixtures(league.next_round)[0]
+    asyncio.run(AdvancedFootballAnalyzer(storage).get_match_analysis(
+        home_id, away_id, 'Хозяева', 'Гости', league.tournament_id, league.current_season_id
+    ))
+
+    counts = {name: stats['count'] for name, stats in profiler.summary().items()}
+    expected = set().union(*(DATASET_QUERIES[name] for name in required_datasets()))
+    assert set(counts) - {'data_version'} == expected
+    # Таблица лиги общая для кэша команд и матрицы прогнозов
+    assert counts['standings'] == 1
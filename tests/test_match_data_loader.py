@@ -0,0 +1,46 @@
+import asyncio
+
+from aggregates_cache import AggregatesCache
+from football_match_forecast import AdvancedFootballAnalyzer
+from match_data_loader import MatchDataLoader
+from standings_snapshot import StandingsStore
+
+
+def test_bundle_matches_single_queries(storage, league):
+    tournament_id, season_id = league.tournament_id, league.current_season_id
+    home_id, away_id = league.fixtures(league.next_round)[0]
+    analyzer = AdvancedFootballAnalyzer(storage)
+
+    async def scenario():
+        bundle = await MatchDataLoader(storage).load(home_id, away_id, tournament_id, season_id)
+        assert bundle['standings'] == await analyzer.get_current_standings(tournament_id, season_id)
+        for team_id in (home_id, away_id):
+            assert bundle['positions'][team_id] == await analyzer.get_team_position_from_db(
+                team_id, tournament_id, season_id)
+            assert bundle['team_stats'][team_id] == await analyzer.get_team_stats_from_db(
+                team_id, tournament_id, season_id)
+            assert bundle['home_away_performance'][team_id] == await analyzer.get_team_home_away_performance(
+                team_id, tournament_id, season_id)
+        assert (bundle['xg'][home_id], bundle['xg'][away_id]) == await analyzer.get_team_xg_from_db(
+            home_id, away_id, season_id)
+
+    asyncio.run(scenario())
+
+
+def test_standings_come_from_shared_store(storage, league, profiler):
+    tournament_id, season_id = league.tournament_id, league.current_season_id
+    cache = AggregatesCache()
+    standings = StandingsStore(cache)
+    loader = MatchDataLoader(storage, cache, standings)
+
+    async def scenario():
+        await standings.get(storage, tournament_id, season_id)
+        return await loader.load_round(league.fixtures(league.next_round), tournament_id, season_id,
+                                       datasets=['team_cache'])
+
+    bundles = asyncio.run(scenario())
+    counts = {name: stats['count'] for name, stats in profiler.summary().items()}
+    # Таблица загружена один раз - снимок общий для загрузчика и остальных отчетов
+    assert counts['standings'] == 1
+    assert counts['team_stats_cache'] == 1
+    assert all(len(bundle['standings']) == len(league.team_ids) for bundle in bundles.values())
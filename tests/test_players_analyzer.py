@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from clickhouse_async import AsyncClickHouse
+from players_analyzer import PlayersAnalyzer
+from running_script import FootballDataOrchestrator
+from storage_backends import DuckDBPool
+from synthetic_dataset import COLUMNS, SyntheticLeague, seed_clickhouse
+
+PLAYER_COLUMNS = COLUMNS['football_player_stats']
+
+
+def player_rows(client, where, params):
+    rows = client.execute(f"SELECT {', '.join(PLAYER_COLUMNS)} FROM football_player_stats FINAL "
+                          f"WHERE {where} ORDER BY match_date", params)
+    return [dict(zip(PLAYER_COLUMNS, row)) for row in rows]
+
+
+def insert_player_rows(client, rows):
+    client.execute(f"INSERT INTO football_player_stats ({', '.join(PLAYER_COLUMNS)}, created_at) VALUES",
+                   [tuple(row[column] for column in PLAYER_COLUMNS) + (datetime.now(),) for row in rows])
+
+
+@pytest.fixture
+def squads():
+    """Своя база: до свертки агрегатов у игрока команды A есть матч без оценки,
+    а у другого игрока A - матч за команду B"""
+    league = SyntheticLeague(seasons=1, teams=4, played_rounds=8)
+    pool = DuckDBPool(':memory:')
+    client = pool.client
+    seed_clickhouse(client, league)
+    season_id = league.current_season_id
+    team_a, team_b = league.team_ids[:2]
+
+    regulars = [row[0] for row in client.execute("""
+        SELECT player_id FROM football_player_stats FINAL
+        WHERE team_id = %(team)s AND minutes_played > 45
+        GROUP BY player_id HAVING count() >= 5
+        ORDER BY count() DESC, player_id
+        """, {'team': team_a})]
+    unrated, transferred = regulars[:2]
+
+    first = player_rows(client, "team_id = %(team)s AND player_id = %(player)s", {'team': team_a, 'player': unrated})[0]
+    insert_player_rows(client, [{**first, 'rating': 0}])
+    last = player_rows(client, "team_id = %(team)s", {'team': team_b})[-1]
+    insert_player_rows(client, [{**last, 'player_id': transferred, 'minutes_played': 90, 'rating': 10.0}])
+
+    FootballDataOrchestrator('', '', '', league.tournament_id, season_id, ch_client=client).fold_match_aggregates()
+    storage = AsyncClickHouse(pool)
+    yield storage, season_id, (team_a, team_b), unrated, transferred
+    storage.close()
+
+
+def load_squads(storage, team_ids, season_id):
+    return asyncio.run(PlayersAnalyzer(storage)._get_squads_with_form(team_ids, season_id))
+
+
+def find_player(squad, player_id):
+    return next(player for player in squad if player['id'] == player_id)
+
+
+def team_ring(client, team_id, player_id):
+    rows = player_rows(client, "team_id = %(team)s AND player_id = %(player)s AND minutes_played > 45",
+                       {'team': team_id, 'player': player_id})
+    return [float(row['rating']) for row in reversed(rows)][:PlayersAnalyzer.TREND_MATCHES]
+
+
+def test_average_rating_counts_only_rated_matches(squads):
+    storage, season_id, (team_a, _), unrated, _ = squads
+    ratings = [float(row['rating']) for row in player_rows(
+        storage.pool.client, "team_id = %(team)s AND player_id = %(player)s AND minutes_played > 0",
+        {'team': team_a, 'player': unrated})]
+
+    player = find_player(load_squads(storage, (team_a,), season_id)[team_a], unrated)
+    assert 0.0 in ratings
+    assert player['rating'] == round(np.mean([rating for rating in ratings if rating > 0]), 1)
+    assert player['rating'] > round(np.mean(ratings), 1)
+
+
+def test_trends_are_per_team(squads):
+    storage, season_id, (team_a, team_b), _, transferred = squads
+    client = storage.pool.client
+    loaded = load_squads(storage, (team_a, team_b), season_id)
+
+    for team_id in (team_a, team_b):
+        ring = team_ring(client, team_id, transferred)
+        ratings = np.full((1, PlayersAnalyzer.TREND_MATCHES), np.nan)
+        ratings[0, :len(ring)] = ring
+        assert find_player(loaded[team_id], transferred)['form_trend'] == PlayersAnalyzer._calculate_trends(ratings)[0]
+    assert find_player(loaded[team_b], transferred)['matches'] == 1
+
+
+def test_latest_folded_ring_wins(squads):
+    storage, season_id, (team_a, _), unrated, _ = squads
+    client = storage.pool.client
+    before = find_player(load_squads(storage, (team_a,), season_id)[team_a], unrated)
+
+    # Устаревшее кольцо, вставленное после свежего, не заменяет его
+    client.execute(
+        "INSERT INTO player_recent_ratings (season_id, team_id, player_id, recent_ratings, folded_at) VALUES",
+        [(season_id, team_a, unrated, [1.0] * PlayersAnalyzer.TREND_MATCHES, datetime.now() - timedelta(days=1))]
+    )
+    ring = client.execute("SELECT recent_ratings FROM player_recent_ratings FINAL "
+                          "WHERE team_id = %(team)s AND player_id = %(player)s", {'team': team_a, 'player': unrated})
+    assert [list(row[0]) for row in ring] == [pytest.approx(team_ring(client, team_a, unrated))]
+    assert find_player(load_squads(storage, (team_a,), season_id)[team_a], unrated) == before
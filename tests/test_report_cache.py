@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from aggregates_cache import AggregatesCache
+from conftest import seeded_storage
+from prerender_reports import prerender_round
+from report_cache import ReportCache
+from synthetic_dataset import SyntheticLeague
+
+
+@pytest.fixture(scope='module')
+def prerendered():
+    league = SyntheticLeague(seasons=1, teams=6, played_rounds=6)
+    ch_client = seeded_storage(league)
+    saved = asyncio.run(prerender_round(ch_client, league.tournament_id, league.current_season_id, league.next_round))
+    yield ch_client, league, saved
+    ch_client.close()
+
+
+def _get(ch_client, league, home_id, away_id, version):
+    return asyncio.run(ReportCache().get(
+        ch_client, league.tournament_id, league.current_season_id, home_id, away_id, version
+    ))
+
+
+def _league_version(ch_client, league):
+    return asyncio.run(AggregatesCache().data_version(ch_client, league.tournament_id, league.current_season_id))
+
+
+def test_prerendered_round_is_found_by_league_version(prerendered):
+    ch_client, league, saved = prerendered
+    fixtures = league.fixtures(league.next_round)
+    assert saved == len(fixtures)
+
+    report = _get(ch_client, league, *fixtures[0], _league_version(ch_client, league))
+    assert report['header']
+    assert report['sections'] and all(report['sections'].values())
+    assert report['players_report']
+
+
+def test_report_of_other_version_is_not_returned(prerendered):
+    ch_client, league, _ = prerendered
+    home_id, away_id = league.fixtures(league.next_round)[0]
+    version = _league_version(ch_client, league)
+
+    assert _get(ch_client, league, home_id, away_id, version + 1) is None
+    assert _get(ch_client, league, home_id, away_id, None) is None
+    # Пара в обратном порядке - другой матч
+    assert _get(ch_client, league, away_id, home_id, version) is None
+
+
+def test_other_league_load_keeps_reports(prerendered):
+    ch_client, league, _ = prerendered
+    home_id, away_id = league.fixtures(league.next_round)[0]
+    version = _league_version(ch_client, league)
+
+    asyncio.run(ch_client.execute(
+        "INSERT INTO data_version (version, source, tournament_id, season_id) VALUES",
+        [(version + 10, 'другая лига', league.tournament_id + 1, league.current_season_id + 100)]
+    ))
+    assert _league_version(ch_client, league) == version
+    assert _get(ch_client, league, home_id, away_id, version) is not None
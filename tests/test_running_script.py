@@ -0,0 +1,149 @@
+import asyncio
+import re
+
+import pytest
+
+from conftest import seeded_storage
+from football_match_forecast import AdvancedFootballAnalyzer
+from match_data_loader import MatchDataLoader
+from running_script import FootballDataOrchestrator
+from synthetic_dataset import SyntheticLeague
+
+MATCH_STATS_AGG = """
+SELECT season_id, team_id, venue, sum(matches), sum(fouls), sum(corners_for), sum(corners_against)
+FROM team_season_match_stats_agg
+GROUP BY season_id, team_id, venue
+ORDER BY season_id, team_id, venue
+"""
+
+
+@pytest.fixture
+def loaded():
+    """Своя база: тесты перезагружают тур"""
+    league = SyntheticLeague(seasons=2, teams=6, played_rounds=4)
+    storage = seeded_storage(league)
+    orchestrator = FootballDataOrchestrator('', '', '', league.tournament_id, league.current_season_id,
+                                            ch_client=storage.pool.client)
+    yield league, storage, orchestrator
+    storage.close()
+
+
+def round_matches(client, season_id, round_number):
+    columns = ('match_id', 'tournament_id', 'season_id', 'round_number', 'match_date', 'home_team_id',
+               'home_team_name', 'away_team_id', 'away_team_name', 'home_score', 'away_score',
+               'status', 'start_timestamp')
+    rows = client.execute(f"SELECT {', '.join(columns)} FROM football_matches FINAL "
+                          f"WHERE season_id = %(season)s AND round_number = %(round)s ORDER BY match_id",
+                          {'season': season_id, 'round': round_number})
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def test_reloaded_round_is_folded_once(loaded):
+    league, storage, orchestrator = loaded
+    client = storage.pool.client
+    before = client.execute(MATCH_STATS_AGG)
+    stats_rows = client.execute("SELECT count() FROM football_match_stats FINAL")[0][0]
+    matches = round_matches(client, league.current_season_id, league.played_rounds)
+
+    # Повторная загрузка тура: те же матчи и статистика, затем агрегаты тура
+    orchestrator._insert_matches(matches)
+    columns = ('match_id', 'team_id', 'team_name', 'team_type', 'fouls', 'corners', 'expected_goals')
+    for match in matches:
+        rows = client.execute(f"SELECT {', '.join(columns)} FROM football_match_stats FINAL "
+                              f"WHERE match_id = %(match_id)s", {'match_id': match['match_id']})
+        orchestrator._insert_match_stats(
+            [{**dict(zip(columns, row)), 'created_at': match['start_timestamp']} for row in rows], match
+        )
+    orchestrator.fold_match_aggregates([match['match_id'] for match in matches])
+
+    assert client.execute(MATCH_STATS_AGG) == before
+    assert client.execute("SELECT count() FROM football_match_stats FINAL")[0][0] == stats_rows
+
+
+def test_match_stats_aggregates_equal_source_rows(loaded):
+    league, storage, orchestrator = loaded
+    client = storage.pool.client
+    expected = client.execute("""
+    SELECT s.season_id, s.team_id, s.team_type, count(), sum(s.fouls), sum(s.corners), sum(o.corners)
+    FROM football_match_stats s
+    INNER JOIN football_match_stats o ON o.match_id = s.match_id AND o.team_id != s.team_id
+    GROUP BY s.season_id, s.team_id, s.team_type
+    ORDER BY s.season_id, s.team_id, s.team_type
+    """)
+    assert [tuple(row) for row in client.execute(MATCH_STATS_AGG)] == [tuple(row) for row in expected]
+
+
+def test_reloaded_matches_and_cards_keep_head_to_head(loaded):
+    league, storage, orchestrator = loaded
+    client = storage.pool.client
+    fixtures = league.fixtures(league.played_rounds)
+
+    def head_to_head():
+        bundles = asyncio.run(MatchDataLoader(storage).load_round(
+            fixtures, league.tournament_id, league.current_season_id, datasets=['h2h']))
+        return {fixture: (bundle['h2h'], bundle['h2h_yellow_stats']) for fixture, bundle in bundles.items()}
+
+    before = head_to_head()
+    assert any(h2h['total_matches'] > 1 and cards['matches_count'] for h2h, cards in before.values())
+
+    matches = round_matches(client, league.current_season_id, league.played_rounds)
+    orchestrator._insert_matches(matches)
+    columns = ('match_id', 'player_id', 'player_name', 'team_is_home', 'card_type', 'reason', 'time', 'added_time')
+    for match in matches:
+        rows = client.execute(f"SELECT {', '.join(columns)} FROM football_cards FINAL "
+                              f"WHERE match_id = %(match_id)s", {'match_id': match['match_id']})
+        orchestrator._insert_cards([dict(zip(columns, row)) for row in rows], match)
+
+    assert head_to_head() == before
+
+
+class RecordingClient:
+    """Клиент, запоминающий тексты запросов к базе"""
+
+    def __init__(self, ch_client):
+        self.ch_client = ch_client
+        self.queries = []
+
+    async def execute(self, query, *args, **kwargs):
+        self.queries.append(query)
+        return await self.ch_client.execute(query, *args, **kwargs)
+
+
+def test_reloaded_cards_keep_team_yellow_averages(loaded):
+    league, storage, orchestrator = loaded
+    client = storage.pool.client
+    tournament_id, season_id = league.tournament_id, league.current_season_id
+    fixtures = league.fixtures(league.played_rounds)
+
+    async def yellow_stats(ch_client):
+        analyzer = AdvancedFootballAnalyzer(ch_client)
+        teams = [team_id for fixture in fixtures for team_id in fixture]
+        single = await asyncio.gather(*(
+            getter(team_id, season_id)
+            for team_id in teams
+            for getter in (analyzer._get_team_yellow_stats, analyzer._get_team_home_away_yellow_stats,
+                           analyzer.get_opponent_yellow_cards_stats)
+        ))
+        bundles = await MatchDataLoader(ch_client).load_round(fixtures, tournament_id, season_id,
+                                                              datasets=['matches', 'league_matrix'])
+        matrix = bundles[fixtures[0]]['league_matrix']
+        return (
+            single,
+            {fixture: {key: value for key, value in bundle.items() if 'yellow' in key}
+             for fixture, bundle in bundles.items()},
+            [matrix.yellow_cards_inputs(*fixture) for fixture in fixtures]
+        )
+
+    recording = RecordingClient(storage)
+    before = asyncio.run(yellow_stats(recording))
+    # Все чтения карточек - по последним версиям строк, без дублей несмерженных вставок
+    card_queries = [query for query in recording.queries if 'football_cards' in query]
+    assert card_queries and not any(re.search(r'football_cards(?! FINAL)', query) for query in card_queries)
+
+    columns = ('match_id', 'player_id', 'player_name', 'team_is_home', 'card_type', 'reason', 'time', 'added_time')
+    for match in round_matches(client, season_id, league.played_rounds):
+        rows = client.execute(f"SELECT {', '.join(columns)} FROM football_cards FINAL "
+                              f"WHERE match_id = %(match_id)s", {'match_id': match['match_id']})
+        orchestrator._insert_cards([dict(zip(columns, row)) for row in rows], match)
+
+    assert asyncio.run(yellow_stats(storage)) == before
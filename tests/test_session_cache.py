@@ -0,0 +1,159 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import session_cache
+from aggregates_cache import AggregatesCache
+from bot import load_match_report
+from report_cache import ReportCache
+from session_cache import SessionCache
+from single_flight import SingleFlight
+from standings_snapshot import StandingsStore
+
+FIXTURE = (1, 2, 10, 20, 7)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_session_expires_after_ttl_since_last_access(clock):
+    sessions = SessionCache(ttl_seconds=60)
+    sessions.update(1, FIXTURE, {'header': 'h'})
+
+    clock[0] += 50
+    assert sessions.get(1, FIXTURE) == {'header': 'h'}
+    # Обращение продлило сессию
+    clock[0] += 50
+    assert sessions.get(1, FIXTURE) == {'header': 'h'}
+    clock[0] += 61
+    assert sessions.get(1, FIXTURE) is None
+    assert sessions.metrics()['expired'] == 1
+    assert sessions.metrics()['chats'] == 0
+
+
+def test_least_recent_session_is_evicted(clock):
+    sessions = SessionCache(max_size=2)
+    for chat_id in (1, 2):
+        sessions.update(chat_id, FIXTURE, {'header': chat_id})
+    sessions.get(1, FIXTURE)
+    sessions.update(3, FIXTURE, {'header': 3})
+
+    assert sessions.get(2, FIXTURE) is None
+    assert sessions.get(1, FIXTURE) and sessions.get(3, FIXTURE)
+    assert sessions.metrics()['evicted_lru'] == 1
+
+
+def test_chat_keeps_only_its_recent_matches(clock):
+    sessions = SessionCache(max_per_chat=2)
+    sessions.update(2, FIXTURE, {'header': 'other'})
+    fixtures = [FIXTURE[:2] + (home_id,) + FIXTURE[3:] for home_id in (11, 12, 13)]
+    for fixture in fixtures:
+        sessions.update(1, fixture, {'header': fixture})
+    sessions.get(1, fixtures[1])
+    sessions.update(1, FIXTURE, {'header': 'new'})
+
+    assert [sessions.get(1, fixture) is not None for fixture in fixtures] == [False, True, False]
+    assert sessions.get(1, FIXTURE) and sessions.get(2, FIXTURE)
+    assert sessions.metrics()['chats'] == 2
+
+
+def test_update_merges_sections(clock):
+    sessions = SessionCache()
+    sessions.update(1, FIXTURE, {'sections': {'goals': 'g'}, 'computed_sections': frozenset({'goals', 'xg'})})
+    sessions.update(1, FIXTURE, {'sections': {'shots': 's'}, 'computed_sections': frozenset({'shots'})})
+    sessions.update(1, FIXTURE, {'dashboards': ({}, {})})
+
+    assert sessions.get(1, FIXTURE) == {
+        'sections': {'goals': 'g', 'shots': 's'},
+        'computed_sections': frozenset({'goals', 'xg', 'shots'}),
+        'dashboards': ({}, {})
+    }
+
+
+@pytest.fixture
+def context(storage):
+    cache = AggregatesCache()
+    return SimpleNamespace(bot_data={
+        'clickhouse': storage,
+        'aggregates_cache': cache,
+        'standings': StandingsStore(cache),
+        'report_cache': ReportCache(),
+        'analysis_flights': SingleFlight(),
+        'session_cache': SessionCache()
+    })
+
+
+def open_report(context, league, chat_id, sections):
+    home_id, away_id = league.fixtures(league.next_round)[0]
+    return load_match_report(context, chat_id, 'Хозяева', 'Гости', home_id, away_id,
+                             league.tournament_id, league.current_season_id, sections)
+
+
+def open_sections(context, league, *requests, chat_ids=None):
+    async def scenario():
+        return await asyncio.gather(*(
+            open_report(context, league, chat_id, sections)
+            for chat_id, sections in zip(chat_ids or [1] * len(requests), requests)
+        ))
+
+    return asyncio.run(scenario())
+
+
+def test_session_computes_only_missing_sections(context, league, profiler):
+    goals, = open_sections(context, league, ['goals'])
+    assert set(goals['sections']) == {'goals'}
+    assert 'match_stats' not in profiler.summary()
+
+    profiler.clear()
+    report, = open_sections(context, league, ['goals', 'corners'])
+    assert set(report['sections']) == {'goals', 'corners'}
+    assert report['sections']['goals'] == goals['sections']['goals']
+    assert 'match_stats' in profiler.summary() and 'standings' not in profiler.summary()
+
+    profiler.clear()
+    open_sections(context, league, ['corners'], ['goals'])
+    # Оба раздела уже в сессии: запросы только за версией данных
+    assert set(profiler.summary()) <= {'data_version'}
+
+
+def test_concurrent_section_sets_are_not_coalesced(context, league):
+    goals, corners = open_sections(context, league, ['goals'], ['corners'])
+
+    assert set(goals['sections']) == {'goals'} and set(corners['sections']) == {'corners'}
+    assert context.bot_data['analysis_flights'].metrics()['joined'] == 0
+    merged, = open_sections(context, league, ['goals', 'corners'])
+    assert merged['computed_sections'] >= {'goals', 'corners'}
+
+
+def test_same_section_sets_are_coalesced_across_chats(context, league):
+    # В сессиях чатов разные разделы, а недостающие из запрошенных (в другом порядке) - одни и те же
+    open_sections(context, league, ['shots'], ['corners'], chat_ids=[1, 2])
+    first, second = open_sections(context, league, ['yellow_cards', 'goals'], ['goals', 'yellow_cards', 'corners'],
+                                  chat_ids=[1, 2])
+
+    assert context.bot_data['analysis_flights'].metrics()['joined'] == 1
+    assert first['sections']['goals'] == second['sections']['goals']
+    assert first['computed_sections'] == {'shots', 'goals', 'yellow_cards'}
+    assert second['computed_sections'] == {'corners', 'goals', 'yellow_cards'}
+
+
+def test_section_request_joins_full_report_in_flight(context, league):
+    flights = context.bot_data['analysis_flights']
+
+    async def scenario():
+        full = asyncio.ensure_future(open_report(context, league, 1, None))
+        while not flights.metrics()['in_flight']:
+            await asyncio.sleep(0.001)
+        goals = await open_report(context, league, 2, ['goals'])
+        return await full, goals
+
+    full, goals = asyncio.run(scenario())
+    assert flights.metrics()['started'] == 1 and flights.metrics()['joined'] == 1
+    assert goals['sections']['goals'] == full['sections']['goals']
+    # Чат получил весь посчитанный отчет: остальные разделы берутся из сессии
+    assert goals['computed_sections'] == full['computed_sections']
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    flights = SingleFlight()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'report': len(calls)}
+
+    async def scenario():
+        first = asyncio.ensure_future(flights.run(('report', 1), loader))
+        await asyncio.sleep(0)
+        assert flights.in_flight(('report', 1)) and not flights.in_flight(('report', 2))
+        return await asyncio.gather(first, *(flights.run(('report', 1), loader) for _ in range(4)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.metrics() == {'in_flight': 0, 'coalesced_rate': 80.0, 'started': 1, 'joined': 4, 'failed': 0}
+
+
+def test_result_is_not_cached_after_completion():
+    flights = SingleFlight()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        results = [await flights.run('key', loader), await flights.run('key', loader)]
+        assert not flights.in_flight('key')
+        return results
+
+    assert asyncio.run(scenario()) == [1, 2]
+    assert flights.metrics()['joined'] == 0
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def scenario():
+        return await asyncio.gather(
+            flights.run(('report', 'goals'), lambda: asyncio.sleep(0.01, result='goals')),
+            flights.run(('report', 'corners'), lambda: asyncio.sleep(0.01, result='corners'))
+        )
+
+    assert asyncio.run(scenario()) == ['goals', 'corners']
+    assert flights.metrics()['started'] == 2
+
+
+def test_cancelled_waiter_does_not_cancel_computation():
+    flights = SingleFlight()
+
+    async def scenario():
+        done = asyncio.Event()
+
+        async def loader():
+            await done.wait()
+            return 'report'
+
+        first = asyncio.ensure_future(flights.run('key', loader))
+        second = asyncio.ensure_future(flights.run('key', loader))
+        await asyncio.sleep(0)
+        # Пользователь ушел, не дождавшись: его ожидание отменяется, расчет продолжается для остальных
+        first.cancel()
+        await asyncio.sleep(0)
+        done.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == 'report'
+    assert flights.metrics()['failed'] == 0
+
+
+def test_error_reaches_every_waiter_and_frees_key():
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ConnectionError('ClickHouse недоступен')
+
+    async def scenario():
+        results = await asyncio.gather(*(flights.run('key', failing) for _ in range(3)), return_exceptions=True)
+        return results, await flights.run('key', lambda: asyncio.sleep(0, result='ok'))
+
+    results, retry = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert retry == 'ok'
+    assert flights.metrics()['failed'] == 1 and flights.metrics()['in_flight'] == 0
@@ -0,0 +1,90 @@
+import asyncio
+
+from conftest import VersionsClient
+from standings_snapshot import StandingsSnapshot, StandingsStore
+
+LEAGUE = (1, 2)
+# team_id, position, points, goal_difference, matches_played, wins, draws, losses,
+# goals_for, goals_against, form, trend, last_updated_round
+ROWS = [
+    (30, 3, 10, -2, 8, 3, 1, 4, 9, 11, 'LLWDW', 'stable', 8),
+    (10, 1, 19, 9, 8, 6, 1, 1, 18, 9, 'WWWDW', 'up', 8),
+    (20, 2, 15, 3, 8, 5, 0, 3, 14, 11, 'WLWLW', 'down', 8),
+]
+
+
+class StandingsClient(VersionsClient):
+    """Версии лиг и строки таблицы; ошибка версии имитирует недоступный data_version"""
+
+    def __init__(self, versions=None, version_error=False):
+        super().__init__(versions)
+        self.version_error = version_error
+
+    async def execute(self, query, params=None, query_name=None, **kwargs):
+        if query_name == 'standings':
+            self.queries.append(query_name)
+            return ROWS
+        if self.version_error:
+            raise ConnectionError('data_version недоступна')
+        return await super().execute(query, params, query_name, **kwargs)
+
+
+def test_snapshot_orders_teams_by_position():
+    snapshot = StandingsSnapshot(*LEAGUE, ROWS, data_version=1)
+
+    assert len(snapshot) == 3
+    assert snapshot.standings() == {10: 1, 20: 2, 30: 3}
+    assert snapshot.team(20)['points'] == 15 and snapshot.team(20)['trend'] == 'down'
+    assert snapshot.position_diff(30, 10) == 2
+    assert snapshot.team(99) == {} and snapshot.position(99) is None
+    assert snapshot.position_diff(10, 99) is None
+
+
+def test_snapshot_from_storage_matches_positions_cache(storage, league):
+    tournament_id, season_id = league.tournament_id, league.current_season_id
+    snapshot = asyncio.run(StandingsStore().get(storage, tournament_id, season_id))
+
+    assert sorted(snapshot.standings().values()) == list(range(1, len(league.team_ids) + 1))
+    assert set(snapshot.standings()) == set(league.team_ids)
+    assert list(snapshot.standings().values()) == sorted(snapshot.standings().values())
+
+
+def test_store_reloads_only_on_new_data_version():
+    client = StandingsClient({LEAGUE: 1})
+    store = StandingsStore()
+
+    async def scenario():
+        first = await store.get(client, *LEAGUE)
+        assert await store.get(client, *LEAGUE) is first
+        client.versions[LEAGUE] = 2
+        second = await store.get(client, *LEAGUE)
+        assert second is not first and second.data_version == 2
+
+    asyncio.run(scenario())
+    assert client.queries.count('standings') == 2
+    assert store.metrics() == {'leagues': 1, 'hits': 1, 'loads': 2}
+
+
+def test_concurrent_requests_share_one_load():
+    client = StandingsClient({LEAGUE: 1})
+    store = StandingsStore()
+
+    async def scenario():
+        return await asyncio.gather(*(store.get(client, *LEAGUE) for _ in range(5)))
+
+    snapshots = asyncio.run(scenario())
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert client.queries.count('standings') == 1
+
+
+def test_snapshot_without_data_version_is_not_kept():
+    client = StandingsClient(version_error=True)
+    store = StandingsStore()
+
+    async def scenario():
+        for _ in range(2):
+            assert len(await store.get(client, *LEAGUE)) == 3
+
+    asyncio.run(scenario())
+    assert client.queries.count('standings') == 2
+    assert store.metrics()['leagues'] == 0